@@ -0,0 +1,5 @@
+# Núcleo compartilhado pelas páginas do Attention Analysis Hub.
+#
+# As páginas em `pages/` continuam sendo scripts Streamlit independentes;
+# este pacote reúne apenas o código reaproveitado entre elas e pelos
+# scripts executados fora do Streamlit.
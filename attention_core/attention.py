@@ -0,0 +1,354 @@
+# ============================================================
+# Extração de atenções (BERT / RoBERTa)
+# ============================================================
+#
+# Funções compartilhadas pelas páginas de análise de atenção e pela
+# execução em lote (`python -m attention_core.cli`).
+
+import numpy as np
+import torch
+from torch import nn
+from transformers import BertModel, BertTokenizerFast, RobertaModel, RobertaTokenizerFast
+from transformers.pytorch_utils import apply_chunking_to_forward
+
+from attention_core.table_writer import attention_table
+
+
+# Tokenizer rápido da família do modelo (BERT ou RoBERTa).
+def load_tokenizer(model_name):
+    if "roberta" in model_name.lower():
+        return RobertaTokenizerFast.from_pretrained(model_name)
+    return BertTokenizerFast.from_pretrained(model_name)
+
+
+# Função para carregar o tokenizer e o modelo. `quantize=True` aplica a
+# quantização dinâmica int8 (ver `attention_core.cpu_inference`); o modelo
+# fica na CPU independentemente de `device`.
+def load_model_and_tokenizer(model_name, device=None, quantize=False):
+    tokenizer = load_tokenizer(model_name)
+    model_class = RobertaModel if "roberta" in model_name.lower() else BertModel
+    model = model_class.from_pretrained(model_name, output_attentions=True)
+    if quantize:
+        from attention_core.cpu_inference import quantize_dynamic_int8
+
+        model = quantize_dynamic_int8(model.eval())
+    elif device is not None:
+        model = model.to(device)
+    return tokenizer, model
+
+
+# Atenções das `num_layers` primeiras camadas, executando apenas essas
+# camadas. Os módulos do modelo são chamados diretamente (embeddings,
+# atenção e feed-forward de cada camada do encoder), sem cópias nem
+# ganchos: o modelo compartilhado pelo registro não é alterado. As
+# probabilidades vêm da própria atenção "eager" da camada, que as devolve
+# junto com a saída; a última camada dispensa o feed-forward.
+def truncated_attentions(model, inputs, num_layers):
+    input_ids = inputs["input_ids"]
+    hidden = model.embeddings(input_ids=input_ids, token_type_ids=inputs.get("token_type_ids"))
+    mask = inputs.get("attention_mask")
+    if mask is None:
+        mask = torch.ones_like(input_ids)
+    additive_mask = (1.0 - mask[:, None, None, :].to(hidden.dtype)) * torch.finfo(hidden.dtype).min
+
+    attentions = []
+    layers = list(model.encoder.layer)[:num_layers]
+    for i, layer in enumerate(layers):
+        attention_output, probabilities = layer.attention(hidden, additive_mask)
+        attentions.append(probabilities)
+        if i + 1 < len(layers):
+            hidden = apply_chunking_to_forward(
+                layer.feed_forward_chunk, layer.chunk_size_feed_forward, layer.seq_len_dim, attention_output
+            )
+    return tuple(attentions)
+
+
+# A passagem limitada vale para encoders no formato BERT/RoBERTa
+# (`embeddings` + `encoder.layer`) com atenção "eager" (a única que devolve
+# as probabilidades) e posições absolutas; os demais modelos executam a
+# passagem completa.
+def supports_truncation(model):
+    config = getattr(model, "config", None)
+    return (
+        isinstance(model, nn.Module)
+        and hasattr(model, "embeddings")
+        and hasattr(getattr(model, "encoder", None), "layer")
+        and getattr(config, "_attn_implementation", None) == "eager"
+        and getattr(config, "position_embedding_type", "absolute") == "absolute"
+    )
+
+
+# Passagem do modelo que para na camada `max_layer` (a partir de 1) e
+# devolve só as atenções das cabeças `heads` (índices a partir de 0). Nos
+# modelos PyTorch suportados (`supports_truncation`), as camadas seguintes
+# não são executadas; nos demais e no backend ONNX
+# (`attention_core.onnx_backend`), o modelo é executado inteiro e as
+# camadas excedentes são descartadas.
+def forward_attentions(model, inputs, max_layer=None, heads=None):
+    if max_layer is not None and supports_truncation(model) and max_layer < len(model.encoder.layer):
+        attentions = truncated_attentions(model, inputs, max_layer)
+    else:
+        attentions = model(**inputs).attentions
+        if max_layer is not None:
+            attentions = attentions[:max_layer]
+    if heads is not None:
+        heads = list(heads)
+        attentions = tuple(layer[:, heads] for layer in attentions)
+    return attentions
+
+
+# Agregações aceitas no agrupamento de subpalavras em palavras.
+SUBWORD_AGGREGATIONS = ("mean", "sum")
+
+
+# Índice da palavra de cada subpalavra. Com `word_ids` (tokenizers rápidos,
+# derivado do mesmo alinhamento do `offset_mapping`), peças de uma mesma
+# palavra compartilham o índice; sem ele, vale a marcação "##". Tokens
+# especiais ([CLS], [SEP]) são palavras próprias.
+def word_index(tokenized_text, word_ids=None):
+    index = []
+    word = -1
+    previous = None
+    for pos, token in enumerate(tokenized_text):
+        if word_ids is None:
+            continues = pos > 0 and token.startswith("##")
+        else:
+            continues = word_ids[pos] is not None and word_ids[pos] == previous
+            previous = word_ids[pos]
+        if not continues:
+            word += 1
+        index.append(word)
+    return index
+
+
+# Reconstrói palavras a partir das subpalavras: rótulo sem "##" e offsets
+# cobrindo da primeira à última peça.
+def merge_subwords(tokenized_text, offsets, index=None):
+    index = word_index(tokenized_text) if index is None else index
+    filtered_tokens = []
+    filtered_offsets = []
+
+    for token, offset, word in zip(tokenized_text, offsets, index):
+        if word < len(filtered_tokens):
+            filtered_tokens[-1] += token.replace("##", "")
+            filtered_offsets[-1][1] = offset[1]
+        else:
+            filtered_tokens.append(token)
+            filtered_offsets.append(list(offset))
+
+    return filtered_tokens, filtered_offsets
+
+
+# Matrizes de pertinência (lote, palavras, subpalavras): 1 onde a subpalavra
+# pertence à palavra. Linhas e colunas além do comprimento de cada sentença
+# ficam zeradas, de modo que o padding do lote não contribui.
+def membership_matrix(indices, n_subwords=None):
+    n_subwords = max(map(len, indices)) if n_subwords is None else n_subwords
+    n_words = max(index[-1] + 1 for index in indices)
+    membership = torch.zeros(len(indices), n_words, n_subwords)
+    for b, index in enumerate(indices):
+        membership[b, index, torch.arange(len(index))] = 1.0
+    return membership
+
+
+# Agrupa as atenções de subpalavras em palavras com um único produto de
+# matrizes sobre o tensor empilhado (camadas, lote, cabeças, S, S):
+#
+#   palavras = De @ A @ Para
+#
+# `Para` soma as colunas de cada palavra (atenção recebida pela palavra
+# inteira); `De` combina as linhas das suas peças pela média ou pela soma.
+# Com "mean", cada linha continua somando 1.
+def pool_attentions(attentions, membership, aggregation="mean"):
+    if aggregation not in SUBWORD_AGGREGATIONS:
+        raise ValueError(f"Agregação inválida: '{aggregation}'. Use uma de {SUBWORD_AGGREGATIONS}.")
+    stacked = torch.stack(attentions)
+    membership = membership.to(device=stacked.device, dtype=stacked.dtype).unsqueeze(1)
+    to_word = membership.transpose(-1, -2)
+    from_word = membership
+    if aggregation == "mean":
+        from_word = membership / membership.sum(dim=-1, keepdim=True).clamp(min=1)
+    return tuple(from_word @ stacked @ to_word)
+
+
+# Função para analisar a sentença e atenções. Com `aggregation` ("mean" ou
+# "sum"), as atenções são agrupadas por palavra e alinhadas aos rótulos;
+# com None, tokens e atenções ficam no nível de subpalavra. `max_layer` e
+# `heads` restringem a extração (ver `forward_attentions`).
+def analyze_attention(sentence, tokenizer, model, aggregation="mean", max_layer=None, heads=None):
+    inputs = tokenizer(sentence, return_tensors='pt', add_special_tokens=True, return_offsets_mapping=True)
+    tokenized_text = tokenizer.convert_ids_to_tokens(inputs['input_ids'][0])
+    offsets = inputs['offset_mapping'][0].tolist()
+
+    with torch.no_grad():
+        model_inputs = {k: v.to(model.device) for k, v in inputs.items() if k != 'offset_mapping'}
+        attentions = forward_attentions(model, model_inputs, max_layer, heads)
+
+    if aggregation is None:
+        return tokenized_text, [list(offset) for offset in offsets], attentions
+
+    index = word_index(tokenized_text, inputs.word_ids(0))
+    filtered_tokens, filtered_offsets = merge_subwords(tokenized_text, offsets, index)
+    with torch.no_grad():
+        attentions = pool_attentions(attentions, membership_matrix([index]), aggregation)
+    return filtered_tokens, filtered_offsets, attentions
+
+
+# Passagens do modelo por lote para `sentences`. As sentenças são agrupadas
+# por comprimento (ordenadas pelo número de subpalavras) para minimizar o
+# padding; a máscara de atenção isola os tokens de padding. Gera, por lote,
+# (índices das sentenças, codificações, subpalavras, atenções com padding).
+@torch.no_grad()
+def _iter_batches(sentences, tokenizer, model, batch_size, max_layer=None, heads=None):
+    encodings = tokenizer(sentences, add_special_tokens=True, return_offsets_mapping=True)
+    model_keys = [k for k in encodings.keys() if k != "offset_mapping"]
+    lengths = [len(ids) for ids in encodings["input_ids"]]
+    order = sorted(range(len(sentences)), key=lengths.__getitem__)
+
+    for start in range(0, len(order), batch_size):
+        bucket = order[start:start + batch_size]
+        features = [{k: encodings[k][i] for k in model_keys} for i in bucket]
+        batch = tokenizer.pad(features, padding=True, return_tensors="pt")
+        tokenized = [tokenizer.convert_ids_to_tokens(encodings["input_ids"][i]) for i in bucket]
+        attentions = forward_attentions(
+            model, {k: v.to(model.device) for k, v in batch.items()}, max_layer, heads
+        )
+        yield bucket, encodings, tokenized, attentions
+
+
+# Mesmo resultado de `analyze_attention` para várias sentenças, com uma
+# passagem do modelo por lote. O agrupamento em palavras é feito para o
+# lote inteiro de uma vez, e as atenções de cada sentença são recortadas de
+# volta ao seu comprimento real.
+def analyze_attention_batch(sentences, tokenizer, model, batch_size=16, aggregation="mean", max_layer=None, heads=None):
+    sentences = list(sentences)
+    if not sentences:
+        return []
+
+    results = [None] * len(sentences)
+    for bucket, encodings, tokenized, attentions in _iter_batches(
+        sentences, tokenizer, model, batch_size, max_layer, heads
+    ):
+        if aggregation is not None:
+            indices = [word_index(tokens, encodings.word_ids(i)) for tokens, i in zip(tokenized, bucket)]
+            with torch.no_grad():
+                membership = membership_matrix(indices, attentions[0].shape[-1])
+                attentions = pool_attentions(attentions, membership, aggregation)
+
+        for row, i in enumerate(bucket):
+            if aggregation is None:
+                tokens = tokenized[row]
+                offsets = [list(offset) for offset in encodings["offset_mapping"][i]]
+            else:
+                tokens, offsets = merge_subwords(tokenized[row], encodings["offset_mapping"][i], indices[row])
+            n = len(tokens)
+            # clone(): não mantém vivo o tensor do lote inteiro (com padding)
+            results[i] = (tokens, offsets, tuple(layer[row:row + 1, :, :n, :n].clone() for layer in attentions))
+
+    return results
+
+
+# Início da `occurrence`-ésima ocorrência (a partir de 0) de `form` como
+# palavra inteira em `text`, ou -1.
+def _find_form(text, form, occurrence=0):
+    start = -1
+    while occurrence >= 0:
+        start = text.find(form, start + 1)
+        if start < 0:
+            return -1
+        end = start + len(form)
+        if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+            occurrence -= 1
+    return start
+
+
+# Posição da palavra do modelo que contém a forma UD `form`, localizada
+# pelo `offset_mapping` (independe de o modelo ser cased ou uncased), ou
+# None se a forma não aparece no texto da sentença.
+def resolve_word(sentence, word_offsets, form, occurrence=0):
+    start = _find_form(sentence, form, occurrence)
+    if start < 0:
+        return None
+    for position, (a, b) in enumerate(word_offsets):
+        if a <= start < b:
+            return position
+    return None
+
+
+# Atenção de cada par (origem -> destino) em todas as camadas e cabeças,
+# sem montar as matrizes n x n por palavra: as posições dos pares são
+# resolvidas uma vez e apenas as linhas/colunas necessárias são agrupadas,
+# em uma única operação sobre o tensor empilhado de subpalavras.
+#
+# `pairs[i]` lista tuplas (padrão, forma de origem, forma de destino[,
+# ocorrência da origem, ocorrência do destino]) para `sentences[i]`.
+# Devolve, por sentença, (pares resolvidos, array (camadas, cabeças,
+# pares)); pares cujas formas não são encontradas no texto são omitidos.
+def analyze_pairs_batch(sentences, pairs, tokenizer, model, batch_size=16, aggregation="mean", max_layer=None, heads=None):
+    if aggregation not in SUBWORD_AGGREGATIONS:
+        raise ValueError(f"A extração de pares requer agregação por palavra: {SUBWORD_AGGREGATIONS}.")
+    sentences = list(sentences)
+    if not sentences:
+        return []
+
+    results = [None] * len(sentences)
+    for bucket, encodings, tokenized, attentions in _iter_batches(
+        sentences, tokenizer, model, batch_size, max_layer, heads
+    ):
+        for row, i in enumerate(bucket):
+            index = word_index(tokenized[row], encodings.word_ids(i))
+            _, word_offsets = merge_subwords(tokenized[row], encodings["offset_mapping"][i], index)
+
+            resolved, origins, destinations = [], [], []
+            for pair in pairs[i]:
+                pattern, origin, destination = pair[:3]
+                occurrences = tuple(pair[3:5]) or (0, 0)
+                o = resolve_word(sentences[i], word_offsets, origin, occurrences[0])
+                d = resolve_word(sentences[i], word_offsets, destination, occurrences[1])
+                if o is not None and d is not None:
+                    resolved.append((pattern, origin, destination))
+                    origins.append(o)
+                    destinations.append(d)
+
+            n = len(index)
+            num_layers, num_heads = len(attentions), attentions[0].shape[1]
+            if not resolved:
+                results[i] = (resolved, np.empty((num_layers, num_heads, 0), dtype=np.float32))
+                continue
+
+            with torch.no_grad():
+                membership = membership_matrix([index])[0].to(attentions[0].device, attentions[0].dtype)
+                from_word = membership[origins]
+                if aggregation == "mean":
+                    from_word = from_word / from_word.sum(dim=-1, keepdim=True)
+                to_word = membership[destinations]
+                stacked = torch.stack([layer[row, :, :n, :n] for layer in attentions])
+                values = torch.einsum("ps,lhst,pt->lhp", from_word, stacked, to_word)
+            results[i] = (resolved, values.cpu().float().numpy())
+
+    return results
+
+
+# Agrupa linhas (sentença, regra) por sentença, na ordem da primeira
+# ocorrência: cada sentença passa pelo modelo uma única vez, e o resultado
+# é replicado para todas as suas regras.
+def group_rules_by_sentence(rows):
+    grouped = {}
+    for sentence, rule in rows:
+        grouped.setdefault(sentence, []).append(rule)
+    return grouped
+
+
+# Atenções de uma sentença empilhadas em um único array (camadas, cabeças,
+# n, n), restritas aos primeiros `n` tokens.
+def stack_attentions(attentions, n=None):
+    stacked = torch.stack([layer[0] for layer in attentions]).detach().cpu().float().numpy()
+    if n is not None:
+        stacked = stacked[:, :, :n, :n]
+    return stacked
+
+
+# Tabela longa (Token, Layer, Head, Attended Token, Attention Value) das
+# atenções de uma sentença; ver `attention_table`.
+def create_attention_df(tokens, offsets, attentions, layer_head=True):
+    return attention_table(tokens, stack_attentions(attentions, len(tokens)), layer_head)
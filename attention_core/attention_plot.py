@@ -0,0 +1,85 @@
+# ============================================================
+# Gráficos de atenção por cabeça (bipartido e mapas de calor)
+# ============================================================
+#
+# Tokens à esquerda (origem) e à direita (destino), com uma aresta por par
+# (i, j) cuja opacidade é o peso de atenção. Todas as arestas de uma cabeça
+# formam uma única `LineCollection`, com cores RGBA por aresta, em vez de
+# um artista do Matplotlib por par: o custo de desenho deixa de crescer com
+# n² chamadas de `plt.plot`.
+#
+# Os mapas de calor são desenhados camada a camada a partir do array
+# empilhado (camadas, cabeças, n, n), uma imagem por cabeça.
+
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
+
+WIDTH = 3
+WORD_HEIGHT = 1
+PAD = 0.1
+
+
+# Segmentos (k, 2, 2) e cores RGBA (k, 4) das arestas de uma matriz de
+# atenção n × n. Arestas com peso até `threshold` (inclusive as de peso
+# zero, invisíveis) são omitidas; aquelas em que origem ou destino está em
+# `highlight_words` recebem `highlight_color`.
+def attention_edges(words, attn, color="blue", threshold=0.0, highlight_words=(), highlight_color="red"):
+    attn = np.clip(np.asarray(attn, dtype=np.float64), 0.0, 1.0)
+    source, target = np.nonzero(attn > threshold)
+    y = -WORD_HEIGHT * np.arange(len(words), dtype=np.float64)
+
+    segments = np.empty((len(source), 2, 2))
+    segments[:, 0, 0] = PAD
+    segments[:, 1, 0] = WIDTH - PAD
+    segments[:, 0, 1] = y[source]
+    segments[:, 1, 1] = y[target]
+
+    colors = np.tile(to_rgba(color), (len(source), 1))
+    if highlight_words:
+        highlighted = np.isin(np.asarray(words, dtype=object), list(highlight_words))
+        colors[highlighted[source] | highlighted[target]] = to_rgba(highlight_color)
+    colors[:, 3] = attn[source, target]
+    return segments, colors
+
+
+# Figura de uma cabeça: rótulos dos tokens nos dois lados e as arestas.
+def attention_figure(words, attn, title, color="blue", threshold=0.0, highlight_words=(), figsize=(5, 6)):
+    fig = Figure(figsize=figsize)
+    ax = fig.add_subplot()
+    ax.set_title(title)
+    ax.axis("off")
+
+    for position, word in enumerate(words):
+        ax.text(0, -position * WORD_HEIGHT, word, ha="right", va="center")
+        ax.text(WIDTH, -position * WORD_HEIGHT, word, ha="left", va="center")
+
+    segments, colors = attention_edges(words, attn, color, threshold, highlight_words)
+    ax.add_collection(LineCollection(segments, colors=colors, linewidths=1))
+    ax.set_xlim(0, WIDTH)
+    ax.set_ylim(-WORD_HEIGHT * (len(words) - 1) - 0.5, 0.5)
+    return fig
+
+
+# Mapas de calor de todas as cabeças de uma camada, a partir do array
+# (cabeças, n, n) da camada (ver `stack_attentions`). Cada cabeça é uma
+# única imagem (`imshow`) com a escala de cores ajustada aos próprios
+# valores, como nos heatmaps do seaborn.
+def layer_heatmaps(tokens, layer_attn, layer, cols=3, cmap="YlGnBu", cell_size=4):
+    num_heads = len(layer_attn)
+    rows = -(-num_heads // cols)
+    fig = Figure(figsize=(cols * cell_size, rows * cell_size))
+    axes = fig.subplots(rows, cols, squeeze=False).ravel()
+    ticks = np.arange(len(tokens))
+
+    for head, ax in enumerate(axes):
+        if head >= num_heads:
+            ax.set_visible(False)
+            continue
+        ax.imshow(layer_attn[head], cmap=cmap, interpolation="nearest", aspect="auto")
+        ax.set_title(f"Layer {layer + 1} | Head {head + 1}", fontsize=8)
+        ax.set_xticks(ticks, tokens, rotation=45, ha="right", fontsize=6)
+        ax.set_yticks(ticks, tokens, fontsize=6)
+    fig.subplots_adjust(left=0.08, right=0.98, top=1 - 0.12 / rows, bottom=0.3 / rows, wspace=0.35, hspace=0.45)
+    return fig
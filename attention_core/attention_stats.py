@@ -0,0 +1,182 @@
+# ============================================================
+# Acumuladores incrementais por (regra | sentença) × camada × cabeça
+# ============================================================
+#
+# Mantidos durante a extração, à medida que cada sentença é processada:
+# para cada regra e para cada sentença, um cubo camadas × cabeças com
+#
+#   count   número de valores de atenção considerados
+#   sum     soma dos valores
+#   sumsq   soma dos quadrados
+#   max     maior valor
+#
+# O critério é o mesmo do heatmap da página 7 sobre a tabela longa: valores
+# arredondados a 4 casas e iguais a zero são ignorados, e cada linha
+# (sentença, regra) conta uma vez. Médias, variâncias e máximos saem do
+# cubo sem reler as atenções. Os acumuladores de várias partes (blocos de
+# um trabalho, fragmentos) são combinados com `merge`.
+#
+# O cubo é gravado ao lado dos resultados: `analise.csv.gz` ->
+# `analise.stats.npz` (ver `stats_path`).
+
+import os
+
+import numpy as np
+
+from attention_core.corpus_cache import _pack_strings, _unpack_strings
+
+STATS_SUFFIX = ".stats.npz"
+ACCUMULATORS = ("count", "sum", "sumsq", "max")
+STATISTICS = ("mean", "std", "var", "max", "count")
+_RESULT_EXTENSIONS = (".csv.gz", ".csv", ".parquet", ".npz")
+
+
+# Caminho do cubo correspondente a um arquivo de resultados.
+def stats_path(results_path):
+    if results_path.endswith(STATS_SUFFIX):
+        return results_path
+    for ext in _RESULT_EXTENSIONS:
+        if results_path.endswith(ext):
+            return results_path[:-len(ext)] + STATS_SUFFIX
+    return results_path + STATS_SUFFIX
+
+
+# Acumuladores (4, camadas, cabeças) de uma sentença a partir do array
+# (camadas, cabeças, n, n) de `stack_attentions`.
+def sentence_accumulators(values):
+    values = np.round(np.asarray(values, dtype=np.float32), 4).astype(np.float64)
+    positive = values > 0
+    kept = np.where(positive, values, 0.0)
+    return np.stack([
+        positive.sum(axis=(2, 3)),
+        kept.sum(axis=(2, 3)),
+        (kept * kept).sum(axis=(2, 3)),
+        np.where(positive, values, -np.inf).max(axis=(2, 3)),
+    ])
+
+
+def _combine(target, summary, weight=1):
+    target[:3] += weight * summary[:3]
+    np.maximum(target[3], summary[3], out=target[3])
+
+
+class _Table:
+    def __init__(self, keys=(), cubes=None):
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.cubes = list(cubes) if cubes is not None else []
+
+    def add(self, key, summary, weight=1):
+        i = self.index.get(key)
+        if i is None:
+            i = self.index[key] = len(self.keys)
+            self.keys.append(key)
+            empty = np.zeros_like(summary)
+            empty[3] = -np.inf
+            self.cubes.append(empty)
+        _combine(self.cubes[i], summary, weight)
+
+
+class AttentionStats:
+    def __init__(self):
+        self.num_layers = self.num_heads = None
+        self._rules = _Table()
+        self._sentences = _Table()
+
+    @property
+    def rules(self):
+        return self._rules.keys
+
+    @property
+    def sentences(self):
+        return self._sentences.keys
+
+    def __len__(self):
+        return len(self._sentences.keys)
+
+    # Acrescenta uma sentença com as regras das suas linhas; `values` é o
+    # array (camadas, cabeças, n, n) da sentença.
+    def add(self, sentence, values, rules):
+        summary = sentence_accumulators(values)
+        if self.num_layers is None:
+            self.num_layers, self.num_heads = summary.shape[1:]
+        elif summary.shape[1:] != (self.num_layers, self.num_heads):
+            raise ValueError(f"Camadas/cabeças {summary.shape[1:]} diferem de {(self.num_layers, self.num_heads)}.")
+        self._sentences.add(sentence, summary, len(rules))
+        for rule in rules:
+            self._rules.add(rule, summary)
+
+    # Soma os acumuladores de `other` (ex.: outro bloco da mesma extração).
+    def merge(self, other):
+        for table, other_table in ((self._rules, other._rules), (self._sentences, other._sentences)):
+            for key, cube in zip(other_table.keys, other_table.cubes):
+                if self.num_layers is None:
+                    self.num_layers, self.num_heads = cube.shape[1:]
+                table.add(key, cube)
+        return self
+
+    # Estatística `name` (ver STATISTICS) por camada × cabeça para uma regra
+    # (`rule`) ou sentença (`sentence`). Com `layers` (início, fim), apenas
+    # a faixa de camadas, contadas a partir de 1. NaN onde não há valores.
+    def statistic(self, name, rule=None, sentence=None, layers=None):
+        if name not in STATISTICS:
+            raise ValueError(f"Estatística inválida: '{name}'. Use uma de {STATISTICS}.")
+        table, key = (self._rules, rule) if sentence is None else (self._sentences, sentence)
+        count, total, squares, maximum = table.cubes[table.index[key]]
+        if layers is not None:
+            window = slice(layers[0] - 1, layers[1])
+            count, total, squares, maximum = count[window], total[window], squares[window], maximum[window]
+        if name == "count":
+            return count.copy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count, np.nan)
+            if name == "mean":
+                return mean
+            if name == "max":
+                return np.where(count > 0, maximum, np.nan)
+            var = np.maximum(squares / count - mean * mean, 0.0)
+            return var if name == "var" else np.sqrt(var)
+
+    def save(self, path):
+        shape = (0, len(ACCUMULATORS), self.num_layers or 0, self.num_heads or 0)
+        arrays = {
+            "rule_cubes": np.stack(self._rules.cubes) if self._rules.cubes else np.empty(shape),
+            "sentence_cubes": np.stack(self._sentences.cubes) if self._sentences.cubes else np.empty(shape),
+        }
+        arrays["rules_blob"], arrays["rules_offsets"] = _pack_strings(self._rules.keys)
+        arrays["sentences_blob"], arrays["sentences_offsets"] = _pack_strings(self._sentences.keys)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+
+    # `source`: caminho ou arquivo binário (ex.: UploadedFile do Streamlit).
+    @classmethod
+    def load(cls, source):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        stats = cls()
+        with np.load(source, allow_pickle=False) as data:
+            rule_cubes, sentence_cubes = data["rule_cubes"], data["sentence_cubes"]
+            stats._rules = _Table(_unpack_strings(data["rules_blob"], data["rules_offsets"]), rule_cubes)
+            stats._sentences = _Table(
+                _unpack_strings(data["sentences_blob"], data["sentences_offsets"]), sentence_cubes
+            )
+        stats.num_layers, stats.num_heads = rule_cubes.shape[2:]
+        return stats
+
+    @classmethod
+    def merged(cls, paths):
+        stats = cls()
+        for path in paths:
+            stats.merge(cls.load(path))
+        return stats
+
+    # Cubo calculado a partir de um armazenamento compacto (`AttentionStore`)
+    # já gravado, lendo cada sentença uma vez.
+    @classmethod
+    def from_store(cls, store):
+        stats = cls()
+        for index in range(len(store)):
+            stats.add(store.sentences[index], store.sentence_attentions(index), store.row_rules(index))
+        return stats
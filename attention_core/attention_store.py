@@ -0,0 +1,300 @@
+# ============================================================
+# Armazenamento compacto de atenções extraídas
+# ============================================================
+#
+# Alternativa binária à tabela longa de `analise_sentencas_todos_padroes`:
+# um único `.npz` com
+#
+#   attentions          float16, os tensores (camadas, cabeças, n, n) de
+#                       todas as sentenças, concatenados
+#   attention_offsets   início de cada sentença em `attentions`
+#   token_offsets       início dos rótulos de cada sentença em `tokens`
+#   row_sentence,       linhas (sentença, regra) do CSV equivalente; cada
+#   row_rule            sentença é guardada uma única vez, mesmo com várias
+#                       regras
+#   sentences, tokens,  strings empacotadas (bytes UTF-8 + offsets)
+#   rules, meta
+#
+# Comparado ao CSV, que repete sentença, regra e rótulos em cada célula de
+# cada cabeça, o arquivo fica duas ordens de grandeza menor. A tabela longa
+# é reconstruída sob demanda (`AttentionStore.iter_tables`, `to_table`),
+# com os valores na precisão de float16.
+#
+# `AttentionStore.open` mapeia os tensores e os rótulos dos tokens
+# diretamente do arquivo (np.memmap sobre os membros não comprimidos do
+# `.npz`): abrir um resultado de vários GB lê apenas os índices, e cada
+# sentença, regra ou faixa de camadas consultada lê só os bytes que usa.
+#
+# Conversão pela linha de comando:
+#
+#     python -m attention_core.attention_store resultados/analise.npz \
+#         --output resultados/analise_sentencas_todos_padroes.csv.gz
+
+import argparse
+import os
+import struct
+import sys
+import threading
+import zipfile
+
+import numpy as np
+
+from attention_core.corpus_cache import _pack_strings, _unpack_strings
+from attention_core.table_writer import TABLE_FORMATS, TableWriter, attention_table
+
+STORE_FORMAT = "npz"
+STORE_DTYPE = np.float16
+
+# Membros mapeados em memória por `AttentionStore.open`; os demais (índices)
+# são pequenos e lidos inteiros.
+MAPPED_MEMBERS = ("attentions", "tokens_blob")
+
+_ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+
+# np.memmap sobre o array `name` de um `.npz` gravado sem compressão.
+def _memmap_member(path, name):
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(f"{name}.npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"'{name}' está comprimido em {path} e não pode ser mapeado.")
+
+    with open(path, "rb") as f:
+        f.seek(info.header_offset)
+        header = _ZIP_LOCAL_HEADER.unpack(f.read(_ZIP_LOCAL_HEADER.size))
+        name_length, extra_length = header[-2:]
+        f.seek(info.header_offset + _ZIP_LOCAL_HEADER.size + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    if not int(np.prod(shape)):
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortran_order else "C")
+
+
+class AttentionStoreWriter:
+    def __init__(self, path, model="", aggregation=""):
+        self.path = path
+        self.meta = [model or "", aggregation or ""]
+        self.sentences = []
+        self.tokens = []
+        self.token_offsets = [0]
+        self.attention_offsets = [0]
+        self.row_sentence = []
+        self.row_rule = []
+        self.rules = {}
+        self.shape = None
+        self.rows = 0
+        # Os tensores vão direto para um arquivo temporário; só os metadados
+        # ficam em memória até `close`.
+        self._raw_path = f"{path}.{os.getpid()}.{threading.get_ident()}.raw"
+        self._raw = open(self._raw_path, "wb")
+
+    # Acrescenta uma sentença: `values` é o array (camadas, cabeças, n, n)
+    # de `stack_attentions`, `rules` as regras das linhas da sentença.
+    def add(self, sentence, tokens, values, rules):
+        values = np.ascontiguousarray(values, dtype=STORE_DTYPE)
+        n = len(tokens)
+        if values.shape[2:] != (n, n):
+            raise ValueError(f"Atenções {values.shape} não correspondem a {n} tokens.")
+        if self.shape is None:
+            self.shape = values.shape[:2]
+        elif values.shape[:2] != self.shape:
+            raise ValueError(f"Camadas/cabeças {values.shape[:2]} diferem de {self.shape}.")
+
+        index = len(self.sentences)
+        self.sentences.append(sentence)
+        self.tokens.extend(tokens)
+        self.token_offsets.append(len(self.tokens))
+        values.tofile(self._raw)
+        self.attention_offsets.append(self.attention_offsets[-1] + values.size)
+        for rule in rules:
+            self.row_sentence.append(index)
+            self.row_rule.append(self.rules.setdefault(rule, len(self.rules)))
+        self.rows += len(rules)
+
+    def close(self):
+        if self._raw is None:
+            return
+        self._raw.close()
+        self._raw = None
+        try:
+            size = self.attention_offsets[-1]
+            if size:
+                attentions = np.memmap(self._raw_path, dtype=STORE_DTYPE, mode="r", shape=(size,))
+            else:
+                attentions = np.empty(0, dtype=STORE_DTYPE)
+            arrays = {
+                "attentions": attentions,
+                "attention_offsets": np.asarray(self.attention_offsets, dtype=np.int64),
+                "token_offsets": np.asarray(self.token_offsets, dtype=np.int64),
+                "row_sentence": np.asarray(self.row_sentence, dtype=np.int32),
+                "row_rule": np.asarray(self.row_rule, dtype=np.int32),
+                "shape": np.asarray(self.shape or (0, 0), dtype=np.int64),
+            }
+            for name, values in (
+                ("sentences", self.sentences), ("tokens", self.tokens),
+                ("rules", list(self.rules)), ("meta", self.meta),
+            ):
+                arrays[f"{name}_blob"], arrays[f"{name}_offsets"] = _pack_strings(values)
+
+            # Sem compressão: os tensores podem ser lidos diretamente do arquivo.
+            tmp_path = f"{self._raw_path}.npz"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arrays)
+            del arrays, attentions
+            os.replace(tmp_path, self.path)
+        finally:
+            os.remove(self._raw_path)
+
+    # Descarta o que foi acrescentado sem gravar o `.npz`, para execuções
+    # interrompidas: um armazenamento com só parte das sentenças não deve
+    # parecer um resultado completo.
+    def abort(self):
+        if self._raw is None:
+            return
+        self._raw.close()
+        self._raw = None
+        os.remove(self._raw_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+# Junta vários armazenamentos (ex.: partes de uma extração) em um único
+# `.npz`, na ordem de `paths`. Devolve o número de linhas (sentença, regra).
+def merge_stores(paths, output_path, model="", aggregation=""):
+    with AttentionStoreWriter(output_path, model, aggregation) as writer:
+        for path in paths:
+            store = AttentionStore.open(path)
+            for i in range(len(store)):
+                writer.add(store.sentences[i], store.sentence_tokens(i), store.sentence_attentions(i), store.row_rules(i))
+    return writer.rows
+
+
+class AttentionStore:
+    def __init__(self, arrays):
+        self.attentions = arrays["attentions"]
+        self.attention_offsets = arrays["attention_offsets"]
+        self.token_offsets = arrays["token_offsets"]
+        self.row_sentence = arrays["row_sentence"]
+        self.row_rule = arrays["row_rule"]
+        self.num_layers, self.num_heads = (int(x) for x in arrays["shape"])
+        self.sentences = _unpack_strings(arrays["sentences_blob"], arrays["sentences_offsets"])
+        # Rótulos decodificados por sentença, sob demanda
+        self._tokens_blob = arrays["tokens_blob"]
+        self._tokens_bounds = arrays["tokens_offsets"]
+        self.rules = _unpack_strings(arrays["rules_blob"], arrays["rules_offsets"])
+        self.model, self.aggregation = _unpack_strings(arrays["meta_blob"], arrays["meta_offsets"])
+
+    # `source`: caminho ou arquivo binário (ex.: UploadedFile do Streamlit).
+    @classmethod
+    def load(cls, source):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        with np.load(source, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    # Abre um `.npz` em disco com tensores e rótulos mapeados em memória.
+    @classmethod
+    def open(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files if name not in MAPPED_MEMBERS}
+        for name in MAPPED_MEMBERS:
+            arrays[name] = _memmap_member(path, name)
+        return cls(arrays)
+
+    def __len__(self):
+        return len(self.sentences)
+
+    @property
+    def n_rows(self):
+        return len(self.row_sentence)
+
+    def sentence_tokens(self, index):
+        bounds = self._tokens_bounds[self.token_offsets[index]:self.token_offsets[index + 1] + 1]
+        return _unpack_strings(self._tokens_blob[bounds[0]:bounds[-1]], bounds - bounds[0])
+
+    # Array (camadas, cabeças, n, n) em float16 da sentença `index`;
+    # `layers` = (primeira, última), a partir de 1, restringe às camadas da
+    # faixa. Com o arquivo mapeado, só essa faixa é lida do disco.
+    def sentence_attentions(self, index, layers=None):
+        n = int(self.token_offsets[index + 1] - self.token_offsets[index])
+        a, b = self.attention_offsets[index], self.attention_offsets[index + 1]
+        values = self.attentions[a:b].reshape(self.num_layers, self.num_heads, n, n)
+        if layers is not None:
+            values = values[layers[0] - 1:layers[1]]
+        return values
+
+    # Linhas (índice da sentença, regra), na ordem do CSV equivalente.
+    def rows(self):
+        for sentence, rule in zip(self.row_sentence.tolist(), self.row_rule.tolist()):
+            yield sentence, self.rules[rule]
+
+    # Regras distintas da sentença `index`.
+    def rules_of(self, index):
+        return list(dict.fromkeys(self.row_rules(index)))
+
+    # Regra de cada linha da sentença `index`, com repetições (uma por linha
+    # do CSV equivalente).
+    def row_rules(self, index):
+        return [self.rules[r] for r in self.row_rule[self.rows_for_sentence(index)].tolist()]
+
+    # Índices das linhas de uma sentença.
+    def rows_for_sentence(self, index):
+        return np.flatnonzero(self.row_sentence == index)
+
+    def sentence_df(self, index, layer_head=True, layers=None):
+        first_layer = 1 if layers is None else layers[0]
+        return attention_table(
+            self.sentence_tokens(index), self.sentence_attentions(index, layers), layer_head, first_layer
+        )
+
+    # Tabelas por linha (sentença, regra), iguais às do download da página 5.
+    def iter_tables(self, rows=None):
+        rows = range(self.n_rows) if rows is None else rows
+        cached_index, cached_df = None, None
+        for row in rows:
+            index = int(self.row_sentence[row])
+            if index != cached_index:
+                cached_index, cached_df = index, self.sentence_df(index)
+            yield cached_df.assign(sentence=self.sentences[index], rule=self.rules[self.row_rule[row]])
+
+    def to_table(self, path, fmt="csv", rows=None):
+        with TableWriter(path, fmt) as writer:
+            for df in self.iter_tables(rows):
+                writer.write(df)
+        return writer.rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m attention_core.attention_store",
+        description="Converte um armazenamento compacto de atenções (.npz) na tabela longa.",
+    )
+    parser.add_argument("store", help="arquivo .npz de entrada")
+    parser.add_argument("--output", required=True, help="tabela de saída")
+    parser.add_argument("--format", choices=TABLE_FORMATS, default=None, help="formato da saída (padrão: pela extensão)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fmt = args.format or next((f for f in sorted(TABLE_FORMATS, key=len, reverse=True) if args.output.endswith(f".{f}")), "csv")
+    rows = AttentionStore.load(args.store).to_table(args.output, fmt)
+    print(f"{rows} linhas de atenção em {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
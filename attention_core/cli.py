@@ -0,0 +1,239 @@
+# ============================================================
+# Execução em lote: classificar -> extrair padrões -> atenções
+# ============================================================
+#
+# Mesmo fluxo das páginas "Classificar Sentenças" e "Análise de Regras
+# BERT", sem Streamlit:
+#
+#     python -m attention_core.cli data/pt_bosque-ud-train.conllu \
+#         --output-dir resultados/ --model neuralmind/bert-base-portuguese-cased \
+#         --workers 4 --batch-size 32 --format csv.gz
+#
+# Gera `checar_tokens.csv` (padrões governante–dependente) e a tabela de
+# atenções por (sentença, regra) no formato do download da página 5. Com
+# `--mode pairs`, gera apenas a atenção de cada par origem -> destino em
+# todas as camadas e cabeças (`analise_atencao_pares`, no formato de
+# `exemplo_analise_atencao.csv`). No modo completo, grava também o cubo de
+# estatísticas por regra/sentença × camada × cabeça (`.stats.npz`, ver
+# `attention_core.attention_stats`).
+
+import argparse
+import os
+import sys
+import time
+
+from attention_core.attention_stats import AttentionStats, stats_path
+from attention_core.attention_store import STORE_FORMAT, AttentionStoreWriter
+from attention_core.conllu_stream import ExportWriter, iter_classified, open_conllu
+from attention_core.parallel import iter_classified_parallel
+from attention_core.table_writer import TABLE_FORMATS, TableWriter, pair_table
+from attention_core.ud_rules import compile_rules, rule_specs
+
+DEFAULT_MODEL = "neuralmind/bert-base-portuguese-cased"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m attention_core.cli",
+        description="Classifica um corpus CoNLL-U, extrai padrões governante–dependente e as atenções do modelo.",
+    )
+    parser.add_argument("conllu", help="arquivo .conllu de entrada")
+    parser.add_argument("--output-dir", default="resultados", help="diretório de saída (padrão: resultados)")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"modelo Hugging Face (padrão: {DEFAULT_MODEL})")
+    parser.add_argument("--workers", type=int, default=1, help="processos para a classificação do corpus")
+    parser.add_argument("--batch-size", type=int, default=32, help="sentenças por passagem do modelo (inferência em lote) e por escrita")
+    parser.add_argument("--format", choices=TABLE_FORMATS + (STORE_FORMAT,), default="csv", help="formato da tabela de atenções (npz: armazenamento compacto)")
+    parser.add_argument("--max-sentences", type=int, default=None, help="limita o número de sentenças distintas analisadas")
+    parser.add_argument("--threads", type=int, default=None, help="threads intra-op do PyTorch na CPU")
+    parser.add_argument("--interop-threads", type=int, default=None, help="threads inter-op do PyTorch na CPU")
+    parser.add_argument("--quantize", action="store_true", help="quantização dinâmica int8 das camadas lineares (CPU)")
+    parser.add_argument(
+        "--backend", choices=("torch", "onnx"), default="torch",
+        help="backend de extração; onnx exporta o modelo uma vez (cache em disco) e executa no ONNX Runtime (CPU)",
+    )
+    parser.add_argument("--device", default=None, help="dispositivo do PyTorch (padrão: cuda se disponível)")
+    parser.add_argument("--aggregation", choices=["mean", "sum", "none"], default="mean", help="agregação das subpalavras em palavras (none: atenções por subpalavra)")
+    parser.add_argument("--mode", choices=["full", "pairs"], default="full", help="full: tabela n x n por cabeça; pairs: apenas os pares governante–dependente")
+    parser.add_argument("--skip-attention", action="store_true", help="apenas classifica e gera checar_tokens.csv")
+    args = parser.parse_args(argv)
+    if args.mode == "pairs" and (args.format == STORE_FORMAT or args.aggregation == "none"):
+        parser.error("--mode pairs requer --format csv/csv.gz/parquet e agregação por palavra")
+    if args.backend == "onnx" and args.quantize:
+        parser.error("--quantize se aplica apenas ao backend torch")
+    return args
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+# Ocorrência (a partir de 0) da forma do token `token_id` entre as palavras
+# anteriores do texto da sentença, como `resolve_word` as conta: as partes
+# de um token multipalavra não aparecem no texto e dão lugar à forma do
+# próprio token multipalavra. Desambigua formas repetidas na extração de
+# pares.
+def _occurrence(tree, token_id):
+    form = tree.forms[tree.ids.index(token_id)]
+    covered = {i for first, last, _ in tree.multiword for i in range(first, last + 1)}
+    words = sum(1 for i, f in zip(tree.ids, tree.forms) if i < token_id and f == form and i not in covered)
+    return words + sum(1 for _, last, f in tree.multiword if last < token_id and f == form)
+
+
+# Etapa 1: classificação e padrões; devolve uma tupla por padrão: (sentença,
+# regra, sent_id, origem, destino, ocorrência da origem, do destino).
+def classify_corpus(path, tokens_path, workers):
+    pattern_rows = []
+    n_sentences = 0
+    with open(tokens_path, "w", encoding="utf-8", newline="") as f, open_conllu(path) as stream:
+        writer = ExportWriter(f)
+        if workers > 1:
+            classified = iter_classified_parallel(stream, rule_specs, workers)
+        else:
+            classified = iter_classified(stream, compile_rules())
+        for tree, rows, found in classified:
+            n_sentences += 1
+            if rows:
+                writer.write_patterns(found)
+                pattern_rows.extend(
+                    (
+                        p["Sentence"], p["Pattern"], p["Sentence ID"], p["Origin Token"], p["Destination Token"],
+                        _occurrence(tree, p["Origin ID"]), _occurrence(tree, p["Destination ID"]),
+                    )
+                    for p in found
+                )
+    log(f"{n_sentences} sentenças lidas, {len(pattern_rows)} padrões em {tokens_path}")
+    return pattern_rows
+
+
+# Modelo e tokenizer com o dispositivo e as threads da linha de comando.
+def load_model(args):
+    import torch
+
+    from attention_core.attention import load_model_and_tokenizer
+    from attention_core.cpu_inference import set_cpu_threads
+
+    intra_op, inter_op = set_cpu_threads(args.threads, args.interop_threads)
+    if args.backend == "onnx":
+        from attention_core.onnx_backend import load_onnx_model
+
+        tokenizer, model = load_onnx_model(args.model, num_threads=intra_op)
+        log(f"Modelo {args.model} carregado no ONNX Runtime (cpu, {intra_op} threads)")
+        return tokenizer, model
+    if args.quantize:
+        tokenizer, model = load_model_and_tokenizer(args.model, quantize=True)
+        log(f"Modelo {args.model} carregado em cpu (int8 dinâmico, {intra_op}/{inter_op} threads)")
+        return tokenizer, model
+
+    device = torch.device(args.device or ("cuda" if torch.cuda.is_available() else "cpu"))
+    tokenizer, model = load_model_and_tokenizer(args.model, device=device)
+    log(f"Modelo {args.model} carregado em {device}")
+    return tokenizer, model
+
+
+# Etapa 2: atenções por (sentença, regra), como o botão "Analisar Todas as
+# Sentenças Selecionadas" da página 5.
+def extract_attentions(pattern_rows, args, output_path):
+    from attention_core.attention import (
+        analyze_attention_batch,
+        create_attention_df,
+        group_rules_by_sentence,
+        stack_attentions,
+    )
+
+    tokenizer, model = load_model(args)
+    aggregation = None if args.aggregation == "none" else args.aggregation
+    rules_by_sentence = group_rules_by_sentence((row[0], row[1]) for row in pattern_rows)
+    sentences = list(rules_by_sentence)
+    if args.max_sentences is not None:
+        sentences = sentences[:args.max_sentences]
+    log(f"{len(sentences)} sentenças distintas para {sum(len(rules_by_sentence[s]) for s in sentences)} linhas")
+
+    compact = args.format == STORE_FORMAT
+    if compact:
+        writer = AttentionStoreWriter(output_path, args.model, aggregation)
+    else:
+        writer = TableWriter(output_path, args.format)
+    stats = AttentionStats()
+
+    start = time.perf_counter()
+    with writer:
+        for first in range(0, len(sentences), args.batch_size):
+            batch = sentences[first:first + args.batch_size]
+            analyses = analyze_attention_batch(batch, tokenizer, model, args.batch_size, aggregation)
+            for sentence, (tokens, offsets, attentions) in zip(batch, analyses):
+                values = stack_attentions(attentions, len(tokens))
+                stats.add(sentence, values, rules_by_sentence[sentence])
+                if compact:
+                    writer.add(sentence, tokens, values, rules_by_sentence[sentence])
+                    continue
+                sentence_df = create_attention_df(tokens, offsets, attentions)
+                for rule in rules_by_sentence[sentence]:
+                    writer.write(sentence_df.assign(sentence=sentence, rule=rule))
+
+            done = first + len(batch)
+            elapsed = time.perf_counter() - start
+            log(f"{done}/{len(sentences)} sentenças ({done / elapsed:.1f} sentenças/s)")
+
+    if compact:
+        log(f"{writer.rows} linhas (sentença, regra) em {output_path}")
+    else:
+        log(f"{writer.rows} linhas de atenção em {output_path}")
+    stats.save(stats_path(output_path))
+    log(f"Médias por regra/sentença × camada × cabeça em {stats_path(output_path)}")
+
+
+# Etapa 2 (--mode pairs): atenção de cada par origem -> destino, sem as
+# tabelas n x n.
+def extract_pair_attentions(pattern_rows, args, output_path):
+    from attention_core.attention import analyze_pairs_batch
+
+    tokenizer, model = load_model(args)
+
+    pairs_by_sentence, sent_ids = {}, {}
+    for sentence, rule, sent_id, origin, destination, origin_occ, destination_occ in pattern_rows:
+        sent_ids.setdefault(sentence, sent_id)
+        pairs_by_sentence.setdefault(sentence, {})[(rule, origin, destination, origin_occ, destination_occ)] = None
+    sentences = list(pairs_by_sentence)
+    if args.max_sentences is not None:
+        sentences = sentences[:args.max_sentences]
+    n_requested = sum(len(pairs_by_sentence[s]) for s in sentences)
+    log(f"{len(sentences)} sentenças distintas para {n_requested} pares")
+
+    start = time.perf_counter()
+    n_resolved = 0
+    with TableWriter(output_path, args.format) as writer:
+        for first in range(0, len(sentences), args.batch_size):
+            batch = sentences[first:first + args.batch_size]
+            pairs = [list(pairs_by_sentence[sentence]) for sentence in batch]
+            analyses = analyze_pairs_batch(batch, pairs, tokenizer, model, args.batch_size, args.aggregation)
+            for sentence, (resolved, values) in zip(batch, analyses):
+                n_resolved += len(resolved)
+                if resolved:
+                    writer.write(pair_table(sent_ids[sentence], sentence, resolved, values))
+
+            done = first + len(batch)
+            elapsed = time.perf_counter() - start
+            log(f"{done}/{len(sentences)} sentenças ({done / elapsed:.1f} sentenças/s)")
+
+    log(f"{n_resolved}/{n_requested} pares localizados no texto; {writer.rows} linhas em {output_path}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    tokens_path = os.path.join(args.output_dir, "checar_tokens.csv")
+    pattern_rows = classify_corpus(args.conllu, tokens_path, args.workers)
+
+    if not args.skip_attention and pattern_rows:
+        if args.mode == "pairs":
+            output_path = os.path.join(args.output_dir, f"analise_atencao_pares.{args.format}")
+            extract_pair_attentions(pattern_rows, args, output_path)
+        else:
+            output_path = os.path.join(args.output_dir, f"analise_sentencas_todos_padroes.{args.format}")
+            extract_attentions(pattern_rows, args, output_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# ============================================================
+# Leitura incremental de arquivos CoNLL-U
+# ============================================================
+#
+# O arquivo é decodificado aos poucos (TextIOWrapper) e cada sentença é
+# convertida em SentenceTree, classificada e descartada antes da próxima,
+# de modo que a memória usada não depende do tamanho do treebank.
+
+import csv
+import io
+from contextlib import contextmanager
+
+from conllu import parse_incr
+
+from attention_core.ud_tree import SentenceTree
+
+# Colunas de `checar_tokens.csv`, consumido pelas páginas de atenção.
+EXPORT_COLUMNS = ["sentence", "rule", "token_origem", "token_destino", "tokens_to_check"]
+
+
+# Abre `source` como texto decodificado sob demanda. Aceita um caminho, um
+# arquivo binário (ex.: UploadedFile do Streamlit) ou um arquivo de texto.
+@contextmanager
+def open_conllu(source, encoding="utf-8"):
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, encoding=encoding) as f:
+            yield f
+    elif isinstance(source, io.TextIOBase):
+        yield source
+    else:
+        source.seek(0)
+        stream = io.TextIOWrapper(source, encoding=encoding)
+        try:
+            yield stream
+        finally:
+            # Devolve o arquivo binário sem fechá-lo: o Streamlit reaproveita
+            # o mesmo objeto entre execuções da página.
+            stream.detach()
+
+
+# `start` é o índice da primeira sentença do fluxo no corpus completo (usado
+# no sent_id padrão quando o arquivo é lido em fragmentos).
+def iter_trees(stream, start=0):
+    for idx, sentence in enumerate(parse_incr(stream), start):
+        yield SentenceTree.from_tokenlist(sentence, idx)
+
+
+# Gera (árvore, linhas de classificação, linhas de padrões) por sentença.
+def iter_classified(stream, evaluator, start=0):
+    for tree in iter_trees(stream, start):
+        rows, found = evaluator(tree)
+        yield tree, rows, found
+
+
+# Linha de `checar_tokens.csv` para um padrão governante–dependente.
+def export_row(pattern):
+    origem = pattern["Origin Token"]
+    destino = pattern["Destination Token"]
+    return [
+        pattern["Sentence"],
+        pattern["Pattern"],
+        origem,
+        destino,
+        str([f'"{origem}"', f'"{destino}"']),
+    ]
+
+
+# Escreve linhas de `checar_tokens.csv` à medida que são produzidas, no
+# mesmo formato de `DataFrame.to_csv(index=False)`.
+class ExportWriter:
+    def __init__(self, f):
+        self._writer = csv.writer(f, lineterminator="\n")
+        self._writer.writerow(EXPORT_COLUMNS)
+        self.rows = 0
+
+    def write_patterns(self, patterns):
+        for pattern in patterns:
+            self._writer.writerow(export_row(pattern))
+        self.rows += len(patterns)
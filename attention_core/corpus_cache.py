@@ -0,0 +1,288 @@
+# ============================================================
+# Cache de corpora analisados, indexado pelo hash do conteúdo
+# ============================================================
+#
+# Um corpus já analisado é guardado em forma colunar: arrays de tokens
+# (id, head e códigos de vocabulário para form/upos/deprel), os tokens
+# multipalavra (primeiro e último id, forma) e offsets de sentença para
+# ambos, em um único `.npz` por arquivo, nomeado pelo SHA-256 do
+# conteúdo. Reabrir o mesmo arquivo — em outra execução da página ou outra
+# sessão — reconstrói as SentenceTrees a partir dos arrays, sem decodificar
+# nem analisar o CoNLL-U novamente. O diretório tem tamanho máximo e os
+# arquivos menos usados recentemente são removidos primeiro.
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from attention_core.ud_tree import SentenceTree
+
+CACHE_DIR = os.environ.get("ATTENTION_CORPUS_CACHE", os.path.join(".cache", "corpora"))
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+MEMORY_ENTRIES = 2
+
+_CHUNK = 1 << 20
+
+
+# SHA-256 do conteúdo de um caminho ou de um arquivo binário em memória.
+def content_hash(source):
+    digest = hashlib.sha256()
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK), b""):
+                digest.update(chunk)
+    elif hasattr(source, "getbuffer"):
+        digest.update(source.getbuffer())
+    else:
+        source.seek(0)
+        for chunk in iter(lambda: source.read(_CHUNK), b""):
+            digest.update(chunk)
+        source.seek(0)
+    return digest.hexdigest()
+
+
+# Lista de strings -> (bytes UTF-8 concatenados, offsets).
+def _pack_strings(values):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(e) for e in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(blob, offsets):
+    data = blob.tobytes()
+    return [data[a:b].decode("utf-8") for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+class _Vocabulary:
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class ColumnarCorpus:
+    COLUMNS = ("ids", "heads", "forms", "upos", "deprels")
+
+    # `multiword`: "offsets" por sentença, "ranges" (k, 2) com o primeiro e
+    # o último id de cada token multipalavra e as suas "forms".
+    def __init__(self, sent_ids, texts, offsets, ids, heads, codes, vocabularies, multiword):
+        self.sent_ids = sent_ids
+        self.texts = texts
+        self.offsets = offsets
+        self.ids = ids
+        self.heads = heads
+        self.codes = codes
+        self.vocabularies = vocabularies
+        self.multiword = multiword
+
+    def __len__(self):
+        return len(self.sent_ids)
+
+    @property
+    def n_tokens(self):
+        return int(self.offsets[-1])
+
+    @classmethod
+    def from_trees(cls, trees):
+        sent_ids, texts, lengths = [], [], []
+        ids, heads = [], []
+        vocabularies = {name: _Vocabulary() for name in ("forms", "upos", "deprels")}
+        codes = {name: [] for name in vocabularies}
+        multiword_lengths, multiword_ranges, multiword_forms = [], [], []
+
+        for tree in trees:
+            sent_ids.append(tree.sent_id)
+            texts.append(tree.text)
+            lengths.append(len(tree))
+            ids.extend(tree.ids)
+            heads.extend(tree.heads)
+            for name, vocab in vocabularies.items():
+                codes[name].extend(vocab.encode(v) for v in getattr(tree, name))
+            multiword_lengths.append(len(tree.multiword))
+            for first, last, form in tree.multiword:
+                multiword_ranges.append((first, last))
+                multiword_forms.append(form)
+
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths, dtype=np.int64)
+        multiword_offsets = np.zeros(len(multiword_lengths) + 1, dtype=np.int64)
+        multiword_offsets[1:] = np.cumsum(multiword_lengths, dtype=np.int64)
+        return cls(
+            sent_ids,
+            texts,
+            offsets,
+            np.asarray(ids, dtype=np.int32),
+            np.asarray(heads, dtype=np.int32),
+            {name: np.asarray(c, dtype=np.int32) for name, c in codes.items()},
+            {name: vocab.values for name, vocab in vocabularies.items()},
+            {
+                "offsets": multiword_offsets,
+                "ranges": np.asarray(multiword_ranges, dtype=np.int32).reshape(-1, 2),
+                "forms": multiword_forms,
+            },
+        )
+
+    # Reconstrói as SentenceTrees, na ordem original do arquivo.
+    def trees(self):
+        bounds = self.offsets.tolist()
+        ids = self.ids.tolist()
+        heads = self.heads.tolist()
+        columns = {
+            name: [vocab[c] for c in self.codes[name].tolist()]
+            for name, vocab in self.vocabularies.items()
+        }
+        multiword_bounds = self.multiword["offsets"].tolist()
+        multiword = [
+            (first, last, form)
+            for (first, last), form in zip(self.multiword["ranges"].tolist(), self.multiword["forms"])
+        ]
+        for i, (sent_id, text) in enumerate(zip(self.sent_ids, self.texts)):
+            a, b = bounds[i], bounds[i + 1]
+            yield SentenceTree(
+                sent_id, text, ids[a:b],
+                columns["forms"][a:b], columns["upos"][a:b], columns["deprels"][a:b],
+                heads[a:b], tuple(multiword[multiword_bounds[i]:multiword_bounds[i + 1]]),
+            )
+
+    def save(self, path):
+        arrays = {"offsets": self.offsets, "ids": self.ids, "heads": self.heads}
+        for prefix, values in (("sent_ids", self.sent_ids), ("texts", self.texts)):
+            arrays[f"{prefix}_blob"], arrays[f"{prefix}_offsets"] = _pack_strings(values)
+        for name, vocab in self.vocabularies.items():
+            arrays[f"{name}_codes"] = self.codes[name]
+            arrays[f"{name}_vocab_blob"], arrays[f"{name}_vocab_offsets"] = _pack_strings(vocab)
+        arrays["multiword_offsets"] = self.multiword["offsets"]
+        arrays["multiword_ranges"] = self.multiword["ranges"]
+        arrays["multiword_forms_blob"], arrays["multiword_forms_offsets"] = _pack_strings(self.multiword["forms"])
+
+        # Escrita atômica: outra sessão pode estar lendo o mesmo hash.
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            vocab_names = ("forms", "upos", "deprels")
+            return cls(
+                _unpack_strings(data["sent_ids_blob"], data["sent_ids_offsets"]),
+                _unpack_strings(data["texts_blob"], data["texts_offsets"]),
+                data["offsets"],
+                data["ids"],
+                data["heads"],
+                {name: data[f"{name}_codes"] for name in vocab_names},
+                {
+                    name: _unpack_strings(data[f"{name}_vocab_blob"], data[f"{name}_vocab_offsets"])
+                    for name in vocab_names
+                },
+                {
+                    "offsets": data["multiword_offsets"],
+                    "ranges": data["multiword_ranges"],
+                    "forms": _unpack_strings(data["multiword_forms_blob"], data["multiword_forms_offsets"]),
+                },
+            )
+
+
+class CorpusCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, memory_entries=MEMORY_ENTRIES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._path_digests = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.directory, f"{digest}.npz")
+
+    # Hash do conteúdo; para caminhos, reaproveitado enquanto o arquivo não
+    # muda (tamanho e mtime), evitando reler treebanks grandes a cada rerun.
+    def digest(self, source):
+        if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+            stat = os.stat(source)
+            key = (os.path.abspath(source), stat.st_size, stat.st_mtime_ns)
+            with self._lock:
+                digest = self._path_digests.get(key)
+            if digest is None:
+                digest = content_hash(source)
+                with self._lock:
+                    self._path_digests[key] = digest
+            return digest
+        return content_hash(source)
+
+    def get(self, digest):
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                return self._memory[digest]
+
+        # Arquivos gravados por versões anteriores (sem algum dos arrays)
+        # contam como ausentes: o corpus é analisado e gravado de novo.
+        path = self._path(digest)
+        try:
+            corpus = ColumnarCorpus.load(path)
+            os.utime(path)  # marca como usado recentemente para a evicção
+        except (FileNotFoundError, ValueError, KeyError, OSError):
+            return None
+
+        self._remember(digest, corpus)
+        return corpus
+
+    def put(self, digest, corpus):
+        corpus.save(self._path(digest))
+        self._remember(digest, corpus)
+        self.evict()
+
+    def _remember(self, digest, corpus):
+        with self._lock:
+            self._memory[digest] = corpus
+            self._memory.move_to_end(digest)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    # Remove os arquivos menos usados até o diretório caber em `max_bytes`.
+    def evict(self, max_bytes=None):
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def size_bytes(self):
+        return sum(
+            os.path.getsize(os.path.join(self.directory, name))
+            for name in os.listdir(self.directory) if name.endswith(".npz")
+        )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        self.evict(max_bytes=0)
@@ -0,0 +1,117 @@
+# ============================================================
+# Índice invertido sobre deprel/upos de um corpus colunar
+# ============================================================
+#
+# Construído uma vez por corpus a partir dos arrays de ColumnarCorpus:
+#
+#   deprel -> tokens com a relação
+#   upos -> tokens com a classe
+#   (upos do governante, deprel) -> tokens dependentes
+#
+# Tokens são identificados pela posição global no corpus (offset da
+# sentença + posição na sentença). Consultas são respondidas apenas com
+# buscas nesses arrays, sem reavaliar regras sobre o corpus.
+#
+# Sintaxe das consultas (termos separados por espaço, todos obrigatórios e
+# satisfeitos pelo mesmo token):
+#
+#   deprel=nsubj:pass   token com a relação
+#   upos=ADV            token com a classe
+#   VERB>nsubj:pass     token com a relação cujo governante tem a classe
+
+import numpy as np
+
+QUERY_HELP = (
+    "Termos separados por espaço, todos satisfeitos pelo mesmo token: deprel=REL, "
+    "upos=CLASSE ou CLASSE>REL (classe do governante > relação)."
+)
+
+
+# Agrupa `items` (posições globais) pelos códigos em `codes`.
+def _group_by_code(codes, n_codes, items=None):
+    items = np.arange(len(codes)) if items is None else items
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(n_codes + 1))
+    sorted_items = items[order]
+    return [sorted_items[bounds[c]:bounds[c + 1]] for c in range(n_codes)]
+
+
+class CorpusIndex:
+    def __init__(self, corpus):
+        self.corpus = corpus
+        offsets = np.asarray(corpus.offsets)
+        lengths = np.diff(offsets)
+        heads = np.asarray(corpus.heads, dtype=np.int64)
+        upos = np.asarray(corpus.codes["upos"], dtype=np.int64)
+        deprels = np.asarray(corpus.codes["deprels"], dtype=np.int64)
+
+        self.sentence_of = np.repeat(np.arange(len(lengths)), lengths)
+        has_head = heads > 0
+        self.head_of = np.where(has_head, offsets[self.sentence_of] + heads - 1, -1)
+
+        self._upos_codes = {u: i for i, u in enumerate(corpus.vocabularies["upos"])}
+        self._deprel_codes = {d: i for i, d in enumerate(corpus.vocabularies["deprels"])}
+        n_upos, n_deprels = len(self._upos_codes), len(self._deprel_codes)
+
+        self.tokens_by_deprel = _group_by_code(deprels, n_deprels)
+        self.tokens_by_upos = _group_by_code(upos, n_upos)
+
+        dependents = np.flatnonzero(has_head)
+        pair_codes = upos[self.head_of[dependents]] * n_deprels + deprels[dependents]
+        self.tokens_by_pair = {
+            divmod(code, n_deprels): tokens
+            for code, tokens in enumerate(_group_by_code(pair_codes, n_upos * n_deprels, dependents))
+            if len(tokens)
+        }
+
+    # Tokens (posições globais, ordenadas) que satisfazem um termo da consulta.
+    def _term_tokens(self, term):
+        empty = np.empty(0, dtype=np.int64)
+        if term.startswith("deprel="):
+            code = self._deprel_codes.get(term[len("deprel="):])
+            return empty if code is None else self.tokens_by_deprel[code]
+        if term.startswith("upos="):
+            code = self._upos_codes.get(term[len("upos="):])
+            return empty if code is None else self.tokens_by_upos[code]
+        if ">" in term:
+            head_upos, deprel = term.split(">", 1)
+            key = (self._upos_codes.get(head_upos), self._deprel_codes.get(deprel))
+            return self.tokens_by_pair.get(key, empty)
+        raise ValueError(f"Termo inválido: '{term}'. {QUERY_HELP}")
+
+    # Devolve (sentenças com algum token que satisfaz todos os termos, esses
+    # tokens), ambos ordenados. Os termos são de token: a interseção é feita
+    # sobre as posições globais, que já separam os tokens de cada sentença.
+    def query(self, text):
+        terms = text.split()
+        if not terms:
+            raise ValueError(QUERY_HELP)
+
+        matches = [self._term_tokens(term) for term in terms]
+        tokens = matches[0]
+        for term_tokens in matches[1:]:
+            tokens = np.intersect1d(tokens, term_tokens, assume_unique=True)
+        return np.unique(self.sentence_of[tokens]), tokens
+
+    # Linhas no formato dos padrões da página (dependente -> governante),
+    # apenas para tokens que têm governante.
+    def pattern_rows(self, tokens, rule):
+        corpus = self.corpus
+        forms = corpus.vocabularies["forms"]
+        form_codes = corpus.codes["forms"]
+        rows = []
+        for tok in tokens.tolist():
+            head = int(self.head_of[tok])
+            if head < 0:
+                continue
+            sent = int(self.sentence_of[tok])
+            rows.append({
+                "Sentence ID": corpus.sent_ids[sent],
+                "Sentence": corpus.texts[sent],
+                "Pattern": rule,
+                "Origin Token": forms[form_codes[tok]],
+                "Origin ID": int(corpus.ids[tok]),
+                "Destination Token": forms[form_codes[head]],
+                "Destination ID": int(corpus.heads[tok]),
+            })
+        return rows
@@ -0,0 +1,97 @@
+# ============================================================
+# Inferência otimizada para CPU: int8 dinâmico e threads
+# ============================================================
+#
+# Modo opcional para implantações sem GPU:
+#
+#   - quantização dinâmica int8 das camadas lineares (pesos em int8,
+#     ativações quantizadas a cada chamada); embeddings, LayerNorm e o
+#     softmax das atenções continuam em fp32;
+#   - número de threads intra-op (dentro de cada operação) e inter-op
+#     (entre operações independentes) do PyTorch;
+#   - relatório de desvio das atenções em relação ao modelo fp32 em um
+#     conjunto de sentenças de referência, com o ganho de tempo medido, para
+#     decidir se a aproximação é aceitável na análise.
+
+import time
+
+import numpy as np
+import torch
+from torch import nn
+
+from attention_core.attention import analyze_attention_batch, stack_attentions
+
+# Sentenças de referência (estilo Bosque) para o relatório de desvio.
+REFERENCE_SENTENCES = [
+    "O presidente anunciou ontem um novo plano econômico para o país.",
+    "A comissão entregou o relatório aos deputados na sessão de quarta-feira.",
+    "Os eleitores que participaram da pesquisa querem mudanças no governo.",
+    "Segundo o jornal, a empresa foi vendida por um valor bem abaixo do esperado.",
+    "Ela se lembrou de que tinha deixado as chaves em casa.",
+    "O projeto, aprovado pela Câmara, ainda precisa ser votado no Senado.",
+    "Quando chegou ao aeroporto, o voo já tinha sido cancelado.",
+    "Os pesquisadores acreditam que a doença pode ser controlada rapidamente.",
+]
+
+
+# Cópia do modelo com as camadas lineares quantizadas em int8 (apenas CPU).
+def quantize_dynamic_int8(model):
+    model = model.to("cpu")
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+# Ajusta as threads do PyTorch no processo. O número de threads inter-op só
+# pode ser definido antes da primeira operação paralela; depois disso a
+# mudança é ignorada. Devolve os valores em vigor (intra, inter).
+def set_cpu_threads(intra_op=None, inter_op=None):
+    if intra_op:
+        torch.set_num_threads(int(intra_op))
+    if inter_op and inter_op != torch.get_num_interop_threads():
+        try:
+            torch.set_num_interop_threads(int(inter_op))
+        except RuntimeError:
+            pass
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
+
+def _timed_batch(sentences, tokenizer, model, batch_size, aggregation):
+    analyze_attention_batch(sentences[:1], tokenizer, model, 1, aggregation)  # aquecimento
+    start = time.perf_counter()
+    results = analyze_attention_batch(sentences, tokenizer, model, batch_size, aggregation)
+    return results, time.perf_counter() - start
+
+
+# Compara as atenções de `model` com as de `reference_model` (fp32) nas
+# mesmas sentenças. Além das diferenças absolutas, informa em que fração
+# das linhas (camada, cabeça, token) o token mais atendido é o mesmo.
+def attention_drift(tokenizer, reference_model, model, sentences=None, batch_size=8, aggregation="mean"):
+    sentences = list(REFERENCE_SENTENCES if sentences is None else sentences)
+    reference, reference_seconds = _timed_batch(sentences, tokenizer, reference_model, batch_size, aggregation)
+    candidate, seconds = _timed_batch(sentences, tokenizer, model, batch_size, aggregation)
+
+    max_abs = 0.0
+    abs_sum = None
+    cells = 0
+    same_argmax = rows = 0
+    for (tokens, _, expected), (_, _, actual) in zip(reference, candidate):
+        expected = stack_attentions(expected, len(tokens))
+        actual = stack_attentions(actual, len(tokens))
+        diff = np.abs(actual - expected)
+        max_abs = max(max_abs, float(diff.max()))
+        layer_sum = diff.sum(axis=(1, 2, 3))
+        abs_sum = layer_sum if abs_sum is None else abs_sum + layer_sum
+        cells += diff[0].size
+        same_argmax += int((actual.argmax(axis=-1) == expected.argmax(axis=-1)).sum())
+        rows += expected.shape[0] * expected.shape[1] * expected.shape[2]
+
+    per_layer = abs_sum / cells
+    return {
+        "sentences": len(sentences),
+        "max_abs": max_abs,
+        "mean_abs": float(per_layer.mean()),
+        "per_layer_mean_abs": per_layer.tolist(),
+        "argmax_agreement": same_argmax / rows,
+        "reference_seconds": reference_seconds,
+        "seconds": seconds,
+        "speedup": reference_seconds / seconds if seconds else float("inf"),
+    }
@@ -0,0 +1,344 @@
+# ============================================================
+# Fila de trabalhos de extração em segundo plano
+# ============================================================
+#
+# A extração em lote da página de regras roda em uma thread de trabalho do
+# processo do Streamlit, fora do script da página: reruns e desconexões do
+# navegador não interrompem o trabalho. Os trabalhos são executados um de
+# cada vez, na ordem de envio.
+#
+# Cada trabalho tem um diretório próprio em JOBS_DIR:
+#
+#   job.json           parâmetros, sentenças, progresso e estado
+#   part-00000.npz     atenções de cada bloco concluído (modo completo)
+#   part-00000.stats.npz   estatísticas por regra/sentença × camada × cabeça
+#                      do bloco (modo completo)
+#   part-00000.csv     tabela de pares de cada bloco concluído (modo pares)
+#   analise_*.csv[.gz] tabela completa, acrescida a cada bloco concluído
+#
+# As sentenças são processadas em blocos de `checkpoint_every`; ao fim de
+# cada bloco, a parte é gravada, as suas linhas são acrescentadas à tabela
+# exportada e `job.json` registra quantas sentenças já foram concluídas e o
+# tamanho da tabela nesse ponto. Um trabalho interrompido (cancelado ou com
+# o processo encerrado) é retomado a partir da primeira sentença sem parte
+# gravada, com a tabela cortada no tamanho do último checkpoint.
+
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from attention_core.attention import analyze_attention_batch, analyze_pairs_batch, stack_attentions
+from attention_core.attention_stats import AttentionStats, stats_path
+from attention_core.attention_store import STORE_FORMAT, AttentionStore, AttentionStoreWriter, merge_stores
+from attention_core.table_writer import TableWriter, pair_table
+
+JOBS_DIR = os.environ.get("ATTENTION_JOBS_DIR", os.path.join("resultados", "jobs"))
+JOB_MODES = ("full", "pairs")
+EXPORT_FORMATS = ("csv", "csv.gz")
+ACTIVE_STATES = ("queued", "running")
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class ExtractionJob:
+    def __init__(self, directory, state):
+        self.directory = directory
+        self.state = state
+        # Progresso da execução atual, para a taxa de sentenças por segundo.
+        self._run_started = None
+        self._run_first = 0
+
+    # `spec`: model, backend, quantized, aggregation, mode, batch_size,
+    # checkpoint_every, sentences e items (por sentença: regras no modo
+    # completo; (regra, origem, destino) no modo pares) e, opcionalmente,
+    # export_format (um de EXPORT_FORMATS; padrão "csv").
+    @classmethod
+    def create(cls, jobs_dir, spec):
+        if spec["mode"] not in JOB_MODES:
+            raise ValueError(f"Modo inválido: '{spec['mode']}'. Use um de {JOB_MODES}.")
+        if spec.get("export_format", "csv") not in EXPORT_FORMATS:
+            raise ValueError(f"Formato inválido: '{spec['export_format']}'. Use um de {EXPORT_FORMATS}.")
+        if len(spec["sentences"]) != len(spec["items"]):
+            raise ValueError("`sentences` e `items` devem ter o mesmo comprimento.")
+        job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        directory = os.path.join(jobs_dir, job_id)
+        os.makedirs(directory)
+        state = dict(
+            spec,
+            id=job_id,
+            status="queued",
+            completed=0,
+            parts=[],
+            rows=0,
+            export_format=spec.get("export_format", "csv"),
+            export_rows=0,
+            export_bytes=0,
+            error=None,
+            elapsed=0.0,
+            created_at=time.time(),
+        )
+        job = cls(directory, state)
+        job.save()
+        return job
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "job.json"), encoding="utf-8") as f:
+            return cls(directory, json.load(f))
+
+    @property
+    def id(self):
+        return self.state["id"]
+
+    @property
+    def status(self):
+        return self.state["status"]
+
+    @property
+    def total(self):
+        return len(self.state["sentences"])
+
+    @property
+    def completed(self):
+        return self.state["completed"]
+
+    @property
+    def finished(self):
+        return self.status == "done"
+
+    # Sentenças por segundo na execução atual (0 antes do primeiro bloco).
+    @property
+    def rate(self):
+        if self._run_started is None or self.status != "running":
+            return 0.0
+        elapsed = time.perf_counter() - self._run_started
+        return (self.completed - self._run_first) / elapsed if elapsed > 0 else 0.0
+
+    def save(self):
+        self.state["updated_at"] = time.time()
+        _write_json(os.path.join(self.directory, "job.json"), self.state)
+
+    def set_status(self, status, error=None):
+        self.state["status"] = status
+        self.state["error"] = error
+        self.save()
+
+    # Tabela completa exportada, no diretório do trabalho.
+    @property
+    def export_path(self):
+        name = "analise_atencao_pares" if self.state["mode"] == "pairs" else "analise_sentencas_todos_padroes"
+        return os.path.join(self.directory, f"{name}.{self.state['export_format']}")
+
+    def _part_path(self, index):
+        ext = STORE_FORMAT if self.state["mode"] == "full" else "csv"
+        return os.path.join(self.directory, f"part-{index:05d}.{ext}")
+
+    # Processa os blocos pendentes; para entre blocos quando `stop` é
+    # sinalizado, deixando o trabalho retomável.
+    def run(self, tokenizer, model, stop=None):
+        spec = self.state
+        step = max(int(spec["checkpoint_every"]), 1)
+        self._run_started, self._run_first = time.perf_counter(), self.completed
+        self.set_status("running")
+        try:
+            while self.completed < self.total:
+                if stop is not None and stop.is_set():
+                    self.set_status("interrupted")
+                    return
+                started = time.perf_counter()
+                start = self.completed
+                sentences = spec["sentences"][start:start + step]
+                items = spec["items"][start:start + step]
+                path = self._part_path(len(spec["parts"]))
+                rows = self._write_part(path, start, sentences, items, tokenizer, model)
+                self._append_export(path)
+
+                spec["parts"].append(os.path.basename(path))
+                spec["completed"] = start + len(sentences)
+                spec["rows"] += rows
+                spec["elapsed"] += time.perf_counter() - started
+                self.save()
+        except Exception as e:
+            self.set_status("failed", f"{type(e).__name__}: {e}")
+            raise
+        self.set_status("done")
+
+    def _write_part(self, path, start, sentences, items, tokenizer, model):
+        spec = self.state
+        batch_size, aggregation = int(spec["batch_size"]), spec["aggregation"]
+        tmp_path = f"{path}.tmp"
+        if spec["mode"] == "pairs":
+            pairs = [[tuple(pair) for pair in sentence_pairs] for sentence_pairs in items]
+            analyses = analyze_pairs_batch(sentences, pairs, tokenizer, model, batch_size, aggregation)
+            tables = [
+                pair_table(start + i + 1, sentence, resolved, values)
+                for i, (sentence, (resolved, values)) in enumerate(zip(sentences, analyses))
+            ]
+            # Tabelas vazias (nenhum par encontrado) mudariam os tipos das colunas.
+            part = pd.concat([t for t in tables if len(t)] or tables[:1], ignore_index=True)
+            part.to_csv(tmp_path, index=False)
+            rows = len(part)
+            spec["pairs_found"] = spec.get("pairs_found", 0) + sum(len(resolved) for resolved, _ in analyses)
+        else:
+            analyses = analyze_attention_batch(sentences, tokenizer, model, batch_size, aggregation)
+            stats = AttentionStats()
+            with AttentionStoreWriter(tmp_path, spec["model"], aggregation) as writer:
+                for sentence, rules, (tokens, _, attentions) in zip(sentences, items, analyses):
+                    values = stack_attentions(attentions, len(tokens))
+                    writer.add(sentence, tokens, values, rules)
+                    stats.add(sentence, values, rules)
+            stats.save(stats_path(path))
+            rows = writer.rows
+        os.replace(tmp_path, path)
+        return rows
+
+    # Acrescenta as linhas de uma parte à tabela exportada. Linhas gravadas
+    # depois do último checkpoint (processo encerrado no meio do bloco) são
+    # descartadas antes.
+    def _append_export(self, part_path):
+        spec = self.state
+        path = self.export_path
+        if os.path.isfile(path):
+            os.truncate(path, spec["export_bytes"])
+        with TableWriter(path, spec["export_format"], append=True) as writer:
+            for df in self._part_tables(part_path):
+                writer.write(df)
+        spec["export_rows"] += writer.rows
+        spec["export_bytes"] = os.path.getsize(path)
+
+    def _part_tables(self, path):
+        if self.state["mode"] == "pairs":
+            # Formas como "NA", "NULL" ou "nan" são tokens, não valores ausentes.
+            yield pd.read_csv(path, keep_default_na=False, na_values=[])
+        else:
+            yield from AttentionStore.open(path).iter_tables()
+
+    def part_paths(self):
+        return [os.path.join(self.directory, name) for name in self.state["parts"]]
+
+    # Tabelas das partes concluídas, na ordem das sentenças: a tabela longa
+    # (sentença, regra) no modo completo, a tabela de pares no modo pares.
+    def iter_tables(self):
+        for path in self.part_paths():
+            yield from self._part_tables(path)
+
+    # Primeiras `max_rows` linhas da tabela, lidas só das primeiras partes.
+    def preview(self, max_rows):
+        chunks, n = [], 0
+        for df in self.iter_tables():
+            chunks.append(df.head(max_rows - n))
+            n += len(chunks[-1])
+            if n >= max_rows:
+                break
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    # Cubo de estatísticas das partes concluídas (modo completo), somando o
+    # `.stats.npz` gravado com cada parte.
+    def stats(self):
+        return AttentionStats.merged(stats_path(path) for path in self.part_paths())
+
+    # Junta as partes do modo completo em um único `.npz`.
+    def write_store(self, path):
+        return merge_stores(self.part_paths(), path, self.state["model"], self.state["aggregation"])
+
+
+class JobManager:
+    def __init__(self, jobs_dir=JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        self._live = {}
+        self._stops = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def submit(self, spec, tokenizer, model):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        job = ExtractionJob.create(self.jobs_dir, spec)
+        self._enqueue(job, tokenizer, model)
+        return job
+
+    # Retoma um trabalho interrompido ou com falha a partir do último bloco
+    # gravado. `tokenizer` e `model` devem corresponder a `job.state["model"]`.
+    def resume(self, job_id, tokenizer, model):
+        job = self.get(job_id)
+        if job.status in ACTIVE_STATES or job.finished:
+            return job
+        job.set_status("queued")
+        self._enqueue(job, tokenizer, model)
+        return job
+
+    def cancel(self, job_id):
+        with self._lock:
+            stop = self._stops.get(job_id)
+        if stop is not None:
+            stop.set()
+
+    def delete(self, job_id):
+        if self.is_live(job_id):
+            raise RuntimeError("Cancele o trabalho antes de removê-lo.")
+        shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+
+    def is_live(self, job_id):
+        with self._lock:
+            return job_id in self._live
+
+    # Trabalho em execução/na fila neste processo ou lido do disco. Um
+    # trabalho ativo no disco que não está vivo aqui foi interrompido com o
+    # processo que o executava.
+    def get(self, job_id):
+        with self._lock:
+            job = self._live.get(job_id)
+        if job is not None:
+            return job
+        job = ExtractionJob.load(os.path.join(self.jobs_dir, job_id))
+        if job.status in ACTIVE_STATES:
+            job.state["status"] = "interrupted"
+        return job
+
+    # Todos os trabalhos, do mais recente para o mais antigo.
+    def jobs(self):
+        if not os.path.isdir(self.jobs_dir):
+            return []
+        found = []
+        for job_id in sorted(os.listdir(self.jobs_dir), reverse=True):
+            if os.path.isfile(os.path.join(self.jobs_dir, job_id, "job.json")):
+                found.append(self.get(job_id))
+        return found
+
+    def _enqueue(self, job, tokenizer, model):
+        with self._lock:
+            self._live[job.id] = job
+            self._stops[job.id] = threading.Event()
+            self._queue.put((job, tokenizer, model))
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name="extraction-jobs", daemon=True)
+                self._worker.start()
+
+    def _work(self):
+        while True:
+            job, tokenizer, model = self._queue.get()
+            with self._lock:
+                stop = self._stops[job.id]
+            try:
+                if stop.is_set():
+                    job.set_status("interrupted")
+                else:
+                    job.run(tokenizer, model, stop)
+            except Exception:
+                pass  # erro registrado em job.json pelo próprio trabalho
+            finally:
+                with self._lock:
+                    self._live.pop(job.id, None)
+                    self._stops.pop(job.id, None)
+                self._queue.task_done()
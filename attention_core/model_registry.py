@@ -0,0 +1,169 @@
+# ============================================================
+# Registro compartilhado de modelos carregados
+# ============================================================
+#
+# Uma única instância por processo (ver `attention_core.st_models`) mantém
+# os pares (tokenizer, modelo) já carregados, reaproveitados entre reruns,
+# páginas e sessões. O número de modelos residentes é limitado: ao exceder
+# o limite, o modelo usado há mais tempo é descarregado.
+#
+# O lock do registro protege apenas o dicionário e a ordem de uso. Cada
+# chave em carregamento tem o seu próprio lock: pedidos do mesmo modelo
+# esperam a carga em curso, enquanto os demais modelos (já residentes ou
+# não) seguem sem esperar pelo `from_pretrained` ou pela exportação ONNX.
+
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import torch
+
+from attention_core.attention import load_model_and_tokenizer
+
+MAX_MODELS = int(os.environ.get("ATTENTION_MAX_MODELS", "2"))
+BACKENDS = ("torch", "onnx")
+
+
+# Memória ocupada pelos tensores do modelo, em bytes. Usa o state_dict para
+# incluir os pesos empacotados das camadas quantizadas, que não aparecem
+# em `parameters()`; modelos ONNX informam o tamanho do grafo.
+def model_memory_bytes(model):
+    if not isinstance(model, torch.nn.Module):
+        return model.memory_bytes
+    total = 0
+    for value in model.state_dict().values():
+        for t in value if isinstance(value, tuple) else (value,):
+            if isinstance(t, torch.Tensor):
+                total += t.numel() * t.element_size()
+    return total
+
+
+class ModelRegistry:
+    def __init__(self, max_models=MAX_MODELS, loader=load_model_and_tokenizer):
+        self.max_models = max_models
+        self._loader = loader
+        self._models = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    # Modelos quantizados (int8) e grafos ONNX, sempre na CPU, são entradas
+    # próprias, ao lado da versão fp32 do mesmo modelo.
+    @staticmethod
+    def _key(model_name, device, quantized=False, backend="torch"):
+        if backend == "onnx":
+            return model_name, "onnx-cpu"
+        if quantized:
+            return model_name, "cpu-int8"
+        return model_name, str(device) if device is not None else "cpu"
+
+    def get(self, model_name, device=None, quantized=False, backend="torch"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend inválido: '{backend}'. Use um de {BACKENDS}.")
+        key = self._key(model_name, device, quantized, backend)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                return self._touch(key, entry)
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        with loading:
+            # Outra thread pode ter concluído a carga enquanto esta esperava.
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    return self._touch(key, entry)
+            try:
+                tokenizer, model = self._load(model_name, device, quantized, backend)
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+            entry = {
+                "tokenizer": tokenizer,
+                "model": model,
+                "memory_bytes": model_memory_bytes(model),
+                "loaded_at": time.time(),
+            }
+            with self._lock:
+                self._models[key] = entry
+                self._loading.pop(key, None)
+                result = self._touch(key, entry)
+                evicted = self._evict_over_limit()
+        if evicted:
+            self._release()
+        return result
+
+    # Carrega o par (tokenizer, modelo) fora do lock do registro.
+    def _load(self, model_name, device, quantized, backend):
+        if backend == "onnx":
+            from attention_core.onnx_backend import load_onnx_model
+
+            return load_onnx_model(model_name)
+        if quantized:
+            return self._loader(model_name, quantize=True)
+        return self._loader(model_name, device=device)
+
+    # Marca a entrada como a mais recentemente usada; chamar com o lock.
+    def _touch(self, key, entry):
+        entry["last_used"] = time.time()
+        self._models.move_to_end(key)
+        return entry["tokenizer"], entry["model"]
+
+    # Modelo já residente, ou None; não carrega nem altera a ordem de uso
+    # (não conta como uso para o descarte do mais antigo).
+    def peek(self, model_name, device=None, quantized=False, backend="torch"):
+        with self._lock:
+            entry = self._models.get(self._key(model_name, device, quantized, backend))
+        return None if entry is None else entry["model"]
+
+    # Remove os modelos usados há mais tempo até respeitar o limite; chamar
+    # com o lock. Devolve se algum foi removido, para liberar a memória
+    # (`_release`) já fora do lock.
+    def _evict_over_limit(self):
+        evicted = False
+        while len(self._models) > max(self.max_models, 1):
+            self._models.popitem(last=False)
+            evicted = True
+        return evicted
+
+    def set_max_models(self, max_models):
+        with self._lock:
+            self.max_models = max_models
+            evicted = self._evict_over_limit()
+        if evicted:
+            self._release()
+
+    # `device` é o dispositivo informado por `resident()` (inclui "cpu-int8"
+    # e "onnx-cpu").
+    def evict(self, model_name, device=None):
+        with self._lock:
+            removed = self._models.pop((model_name, str(device) if device is not None else "cpu"), None)
+        if removed is not None:
+            del removed
+            self._release()
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+        self._release()
+
+    @staticmethod
+    def _release():
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    # Modelos residentes, do mais para o menos recentemente usado.
+    def resident(self):
+        with self._lock:
+            return [
+                {
+                    "model": name,
+                    "device": device,
+                    "memory_mb": entry["memory_bytes"] / 1024 ** 2,
+                    "last_used": entry["last_used"],
+                }
+                for (name, device), entry in reversed(self._models.items())
+            ]
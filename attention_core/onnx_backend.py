@@ -0,0 +1,174 @@
+# ============================================================
+# Backend ONNX Runtime para extração de atenções (CPU)
+# ============================================================
+#
+# O modelo BERT/RoBERTa é exportado uma única vez para ONNX, com as
+# probabilidades de atenção de todas as camadas como saída (tensor
+# lote × camadas × cabeças × S × S, eixos de lote e sequência dinâmicos), e
+# o grafo fica em cache no disco, um diretório por modelo:
+#
+#   <cache>/<modelo>/model.onnx
+#   <cache>/<modelo>/meta.json    entradas, camadas, cabeças e versões
+#
+# `OnnxAttentionModel` executa o grafo no ONNX Runtime (CPU) e responde como
+# o modelo PyTorch nos pontos usados pelo projeto (`model(**inputs)
+# .attentions`, `config`, `device`), de modo que `analyze_attention`, a
+# extração em lote, as tabelas e os gráficos funcionam sem mudanças.
+#
+# Requer o pacote `onnxruntime` (e `onnx` para a exportação).
+
+import json
+import os
+import re
+import threading
+
+import numpy as np
+import torch
+from torch import nn
+from transformers import AutoConfig
+from transformers import __version__ as transformers_version
+from transformers.modeling_outputs import BaseModelOutput
+
+from attention_core.attention import load_model_and_tokenizer, load_tokenizer
+
+ONNX_CACHE_DIR = os.environ.get(
+    "ATTENTION_ONNX_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "attention_onnx")
+)
+ONNX_OPSET = 17
+ATTENTIONS_OUTPUT = "attentions"
+
+
+def _import_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise RuntimeError("O backend ONNX requer o pacote 'onnxruntime'.") from e
+    return onnxruntime
+
+
+# Diretório do cache de um modelo (nome do Hugging Face ou caminho local).
+def onnx_cache_path(model_name, cache_dir=None):
+    safe_name = re.sub(r"[^\w.-]+", "_", model_name.strip("/"))
+    return os.path.join(cache_dir or ONNX_CACHE_DIR, safe_name)
+
+
+# Envolve o modelo para que o grafo tenha as entradas do tokenizer, na
+# ordem de `input_names`, e uma única saída com as atenções empilhadas.
+class _AttentionGraph(nn.Module):
+    def __init__(self, model, input_names):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        outputs = self.model(**dict(zip(self.input_names, inputs)), output_attentions=True)
+        return torch.stack(outputs.attentions, dim=1)
+
+
+# Exporta o modelo para `directory` (gravação atômica: o grafo só aparece
+# no cache depois de completo). O invólucro é exportado em modo de
+# avaliação: `torch.onnx.export` restaura o modo do invólucro ao final, e
+# o modelo recebido deve continuar em `eval` (sem dropout).
+def export_onnx(model, tokenizer, directory, model_name=None):
+    os.makedirs(directory, exist_ok=True)
+    input_names = list(tokenizer.model_input_names)
+    sample = tokenizer(["O gato come peixe.", "A casa"], padding=True, return_tensors="pt")
+    args = tuple(sample[name] for name in input_names)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes[ATTENTIONS_OUTPUT] = {0: "batch", 3: "sequence", 4: "sequence"}
+
+    # Temporários por processo/thread: processos que exportam o mesmo modelo
+    # ao mesmo tempo não gravam no mesmo arquivo.
+    path = os.path.join(directory, "model.onnx")
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            _AttentionGraph(model.to("cpu"), input_names).eval(),
+            args,
+            tmp_path,
+            input_names=input_names,
+            output_names=[ATTENTIONS_OUTPUT],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            dynamo=False,
+        )
+    os.replace(tmp_path, path)
+
+    meta = {
+        "model": model_name,
+        "input_names": input_names,
+        "num_layers": model.config.num_hidden_layers,
+        "num_heads": model.config.num_attention_heads,
+        "opset": ONNX_OPSET,
+        "torch": torch.__version__,
+        "transformers": transformers_version,
+    }
+    meta_path = os.path.join(directory, "meta.json")
+    tmp_meta_path = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_meta_path, meta_path)
+    return path
+
+
+# Metadados do grafo em cache, ou None se ausente ou exportado com outra
+# versão do transformers/opset (nesse caso é exportado de novo).
+def _cached_meta(directory):
+    try:
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.isfile(os.path.join(directory, "model.onnx")):
+        return None
+    if meta.get("transformers") != transformers_version or meta.get("opset") != ONNX_OPSET:
+        return None
+    return meta
+
+
+class OnnxAttentionModel:
+    def __init__(self, path, config, input_names, num_threads=None):
+        ort = _import_onnxruntime()
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads or torch.get_num_threads()
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.path = path
+        self.config = config
+        self.input_names = input_names
+        self.device = torch.device("cpu")
+        self.memory_bytes = os.path.getsize(path)
+
+    # Mesma interface do modelo PyTorch: entradas do tokenizer por nome e
+    # saída com `.attentions` (uma tupla de tensores lote × cabeças × S × S
+    # por camada).
+    def __call__(self, **inputs):
+        feed = {name: np.asarray(inputs[name].cpu(), dtype=np.int64) for name in self.input_names}
+        stacked = torch.from_numpy(self.session.run([ATTENTIONS_OUTPUT], feed)[0])
+        return BaseModelOutput(attentions=tuple(stacked.unbind(dim=1)))
+
+    def eval(self):
+        return self
+
+
+# Garante o grafo do modelo no cache, exportando-o se ausente ou
+# desatualizado. Devolve (diretório, metadados). Chamado uma vez no processo
+# principal antes de iniciar processos que usam o mesmo modelo.
+def prepare_onnx_cache(model_name, cache_dir=None):
+    directory = onnx_cache_path(model_name, cache_dir)
+    meta = _cached_meta(directory)
+    if meta is None:
+        tokenizer, model = load_model_and_tokenizer(model_name)
+        export_onnx(model, tokenizer, directory, model_name)
+        del model
+        meta = _cached_meta(directory)
+    return directory, meta
+
+
+# Tokenizer e modelo ONNX; exporta o grafo na primeira chamada para o
+# modelo e o reaproveita do disco nas seguintes.
+def load_onnx_model(model_name, cache_dir=None, num_threads=None):
+    directory, meta = prepare_onnx_cache(model_name, cache_dir)
+    tokenizer = load_tokenizer(model_name)
+    config = AutoConfig.from_pretrained(model_name)
+    path = os.path.join(directory, "model.onnx")
+    return tokenizer, OnnxAttentionModel(path, config, meta["input_names"], num_threads)
@@ -0,0 +1,77 @@
+# ============================================================
+# Classificação paralela de corpora CoNLL-U em fragmentos
+# ============================================================
+#
+# O fluxo CoNLL-U é dividido em fragmentos de texto nas fronteiras de
+# sentença (linhas em branco). Cada fragmento é analisado e classificado em
+# um processo do pool, e os resultados são devolvidos na ordem original do
+# arquivo. Apenas alguns fragmentos ficam em processamento ao mesmo tempo,
+# de modo que a memória continua limitada como no modo streaming.
+
+import io
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from attention_core.conllu_stream import iter_classified
+from attention_core.ud_rules import compile_rules
+
+SENTENCES_PER_SHARD = 500
+
+_worker_evaluator = None
+
+
+# Divide o fluxo em (índice da primeira sentença, texto do fragmento).
+def iter_shards(stream, sentences_per_shard=SENTENCES_PER_SHARD):
+    lines = []
+    n_sentences = 0
+    start = 0
+    in_sentence = False
+
+    for line in stream:
+        lines.append(line)
+        if line.strip():
+            in_sentence = True
+            continue
+        if in_sentence:
+            in_sentence = False
+            n_sentences += 1
+            if n_sentences - start >= sentences_per_shard:
+                yield start, "".join(lines)
+                lines = []
+                start = n_sentences
+
+    if in_sentence:
+        n_sentences += 1
+    if n_sentences > start:
+        yield start, "".join(lines)
+
+
+def _init_worker(specs):
+    global _worker_evaluator
+    _worker_evaluator = compile_rules(specs)
+
+
+def _classify_shard(shard):
+    start, text = shard
+    return list(iter_classified(io.StringIO(text), _worker_evaluator, start))
+
+
+# Mesmo contrato de `iter_classified`: gera (árvore, classificação, padrões)
+# por sentença, na ordem do arquivo, usando `workers` processos.
+def iter_classified_parallel(stream, specs, workers, sentences_per_shard=SENTENCES_PER_SHARD):
+    # "spawn" evita herdar as threads do servidor Streamlit em um fork.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(specs,),
+    ) as pool:
+        pending = deque()
+        for shard in iter_shards(stream, sentences_per_shard):
+            pending.append(pool.submit(_classify_shard, shard))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
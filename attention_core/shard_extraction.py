@@ -0,0 +1,355 @@
+# ============================================================
+# Extração de atenções em escala de corpus, com vários processos
+# ============================================================
+#
+# Extrai as atenções de todas as linhas de um `checar_tokens.csv` completo:
+#
+#     python -m attention_core.shard_extraction resultados/checar_tokens.csv \
+#         --output-dir resultados/fragmentos --workers 4 --format csv.gz --merge
+#
+# As sentenças distintas são divididas em fragmentos consecutivos de
+# `--sentences-per-shard`. Cada processo do pool carrega o modelo uma única
+# vez, retira fragmentos de uma fila compartilhada e grava cada um em um
+# arquivo próprio (`shard-00000.<formato>`). O manifesto (`manifest.json`)
+# registra os parâmetros da execução e os fragmentos concluídos; ao
+# reexecutar o mesmo comando, fragmentos já concluídos são ignorados, de
+# modo que uma execução com falha é retomada de onde parou. `--merge` junta
+# os fragmentos, na ordem das sentenças, em uma única tabela (ou `.npz`).
+# No modo completo, cada fragmento tem também o seu cubo de estatísticas
+# (`shard-00000.stats.npz`), somados na junção.
+
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from attention_core.attention_stats import AttentionStats, stats_path
+from attention_core.attention_store import STORE_FORMAT, AttentionStoreWriter, merge_stores
+from attention_core.table_writer import TABLE_FORMATS, TableWriter, iter_table_chunks, pair_table
+
+DEFAULT_MODEL = "neuralmind/bert-base-portuguese-cased"
+SENTENCES_PER_SHARD = 256
+MANIFEST_NAME = "manifest.json"
+# Parâmetros que precisam coincidir para retomar uma execução.
+RUN_PARAMETERS = ("input_hash", "model", "backend", "quantize", "aggregation", "mode", "format", "sentences_per_shard")
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+# Sentenças distintas de `checar_tokens.csv`, na ordem do arquivo, e os
+# itens de cada uma: regras (modo completo) ou pares (regra, origem,
+# destino) sem repetição (modo pares).
+def read_pattern_rows(path, mode):
+    items = {}
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            sentence_items = items.setdefault(row["sentence"], [] if mode == "full" else {})
+            if mode == "full":
+                sentence_items.append(row["rule"])
+            else:
+                sentence_items[(row["rule"], row["token_origem"], row["token_destino"])] = None
+    sentences = list(items)
+    return sentences, [list(items[sentence]) for sentence in sentences]
+
+
+def _input_hash(sentences, items):
+    digest = hashlib.sha1()
+    for sentence, sentence_items in zip(sentences, items):
+        digest.update(json.dumps([sentence, sentence_items], ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def shard_name(index, fmt):
+    return f"shard-{index:05d}.{fmt}"
+
+
+# Carregado uma vez por processo, com as threads divididas entre os
+# processos do pool.
+def _load_worker_model(options):
+    import torch
+
+    from attention_core.attention import load_model_and_tokenizer
+
+    torch.set_num_threads(options["threads"])
+    if options["backend"] == "onnx":
+        from attention_core.onnx_backend import load_onnx_model
+
+        return load_onnx_model(options["model"], num_threads=options["threads"])
+    if options["quantize"]:
+        return load_model_and_tokenizer(options["model"], quantize=True)
+    device = options["device"] or ("cuda" if torch.cuda.is_available() else "cpu")
+    return load_model_and_tokenizer(options["model"], device=device)
+
+
+# Grava um fragmento em `path` (via arquivo temporário) e devolve o número
+# de linhas (sentença, regra) ou de linhas da tabela de pares.
+def write_shard(path, options, first, sentences, items, tokenizer, model):
+    from attention_core.attention import analyze_attention_batch, analyze_pairs_batch, create_attention_df, stack_attentions
+
+    fmt, batch_size, aggregation = options["format"], options["batch_size"], options["aggregation"]
+    tmp_path = f"{path}.tmp"
+    if options["mode"] == "pairs":
+        pairs = [[tuple(pair) for pair in sentence_pairs] for sentence_pairs in items]
+        analyses = analyze_pairs_batch(sentences, pairs, tokenizer, model, batch_size, aggregation)
+        with TableWriter(tmp_path, fmt) as writer:
+            for i, (sentence, (resolved, values)) in enumerate(zip(sentences, analyses)):
+                if resolved:
+                    writer.write(pair_table(first + i + 1, sentence, resolved, values))
+    else:
+        analyses = analyze_attention_batch(sentences, tokenizer, model, batch_size, aggregation)
+        stats = AttentionStats()
+        if fmt == STORE_FORMAT:
+            writer = AttentionStoreWriter(tmp_path, options["model"], aggregation)
+        else:
+            writer = TableWriter(tmp_path, fmt)
+        with writer:
+            for sentence, rules, (tokens, offsets, attentions) in zip(sentences, items, analyses):
+                values = stack_attentions(attentions, len(tokens))
+                stats.add(sentence, values, rules)
+                if fmt == STORE_FORMAT:
+                    writer.add(sentence, tokens, values, rules)
+                    continue
+                sentence_df = create_attention_df(tokens, offsets, attentions)
+                for rule in rules:
+                    writer.write(sentence_df.assign(sentence=sentence, rule=rule))
+        stats.save(stats_path(path))
+    if writer.rows:
+        os.replace(tmp_path, path)
+    elif os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    return writer.rows
+
+
+# Laço de cada processo: carrega o modelo e processa fragmentos da fila até
+# receber None. Falhas são devolvidas ao processo principal.
+def _worker_main(options, tasks, results):
+    try:
+        tokenizer, model = _load_worker_model(options)
+    except Exception as e:
+        results.put(("startup_failed", None, f"{type(e).__name__}: {e}"))
+        return
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        index, first, sentences, items = task
+        started = time.perf_counter()
+        path = os.path.join(options["output_dir"], shard_name(index, options["format"]))
+        try:
+            rows = write_shard(path, options, first, sentences, items, tokenizer, model)
+        except Exception as e:
+            results.put(("failed", index, f"{type(e).__name__}: {e}"))
+            continue
+        results.put(("done", index, {"rows": rows, "seconds": time.perf_counter() - started, "pid": os.getpid()}))
+
+
+# Manifesto novo ou o existente, se for da mesma execução (mesma entrada e
+# parâmetros). Fragmentos marcados como concluídos sem arquivo são refeitos.
+def load_manifest(output_dir, parameters, n_sentences, restart=False):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.isfile(path) and not restart:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        different = [k for k in RUN_PARAMETERS if manifest.get(k) != parameters[k]]
+        if different:
+            raise ValueError(
+                f"{path} é de outra execução (parâmetros diferentes: {', '.join(different)}); "
+                "use outro --output-dir ou --restart."
+            )
+        for shard in manifest["shards"]:
+            if shard["status"] == "done" and shard["rows"] and not os.path.isfile(os.path.join(output_dir, shard["path"])):
+                shard["status"] = "pending"
+        return manifest
+
+    step = parameters["sentences_per_shard"]
+    shards = [
+        {
+            "index": index,
+            "first": first,
+            "count": min(step, n_sentences - first),
+            "path": shard_name(index, parameters["format"]),
+            "status": "pending",
+            "rows": 0,
+        }
+        for index, first in enumerate(range(0, n_sentences, step))
+    ]
+    return dict(parameters, n_sentences=n_sentences, shards=shards)
+
+
+# Processa os fragmentos pendentes com `workers` processos e mantém o
+# manifesto atualizado a cada fragmento concluído. Devolve o manifesto.
+def run(options, sentences, items, workers, restart=False):
+    output_dir = options["output_dir"]
+    os.makedirs(output_dir, exist_ok=True)
+    parameters = {k: options[k] for k in RUN_PARAMETERS}
+    manifest = load_manifest(output_dir, parameters, len(sentences), restart)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    _write_json(manifest_path, manifest)
+
+    pending = [shard for shard in manifest["shards"] if shard["status"] != "done"]
+    skipped = len(manifest["shards"]) - len(pending)
+    log(f"{len(manifest['shards'])} fragmentos, {skipped} já concluídos, {len(pending)} a processar com {workers} processo(s)")
+    if not pending:
+        return manifest
+
+    # O grafo ONNX é exportado aqui, uma única vez, e não em cada processo.
+    if options["backend"] == "onnx":
+        from attention_core.onnx_backend import prepare_onnx_cache
+
+        prepare_onnx_cache(options["model"])
+
+    # "spawn": cada processo importa torch/transformers do zero, sem herdar
+    # threads do processo principal.
+    context = multiprocessing.get_context("spawn")
+    tasks, results = context.Queue(), context.Queue()
+    for shard in pending:
+        first, count = shard["first"], shard["count"]
+        tasks.put((shard["index"], first, sentences[first:first + count], items[first:first + count]))
+    workers = max(1, min(workers, len(pending)))
+    for _ in range(workers):
+        tasks.put(None)
+    processes = [
+        context.Process(target=_worker_main, args=(options, tasks, results), daemon=True) for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    shards = {shard["index"]: shard for shard in manifest["shards"]}
+    start = time.perf_counter()
+    done_sentences = 0
+    waiting = len(pending)
+    try:
+        while waiting:
+            try:
+                status, index, payload = results.get(timeout=5)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    log("Todos os processos terminaram antes de concluir os fragmentos.")
+                    break
+                continue
+            if status == "startup_failed":
+                log(f"Falha ao carregar o modelo em um processo: {payload}")
+                continue
+            waiting -= 1
+            shard = shards[index]
+            if status == "failed":
+                shard["status"], shard["error"] = "failed", payload
+                log(f"Fragmento {index} falhou: {payload}")
+            else:
+                shard.update(payload, status="done")
+                shard.pop("error", None)
+                done_sentences += shard["count"]
+                elapsed = time.perf_counter() - start
+                log(f"Fragmento {index} concluído ({done_sentences} sentenças, {done_sentences / elapsed:.1f} sentenças/s)")
+            _write_json(manifest_path, manifest)
+    finally:
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+    return manifest
+
+
+# Junta os fragmentos concluídos, na ordem das sentenças, em `output_path`.
+def merge_shards(output_dir, output_path):
+    with open(os.path.join(output_dir, MANIFEST_NAME), encoding="utf-8") as f:
+        manifest = json.load(f)
+    incomplete = [shard["index"] for shard in manifest["shards"] if shard["status"] != "done"]
+    if incomplete:
+        raise ValueError(f"Fragmentos não concluídos: {incomplete[:10]}{'...' if len(incomplete) > 10 else ''}")
+
+    fmt = manifest["format"]
+    paths = [os.path.join(output_dir, shard["path"]) for shard in manifest["shards"] if shard["rows"]]
+    if manifest["mode"] == "full":
+        AttentionStats.merged(stats_path(path) for path in paths).save(stats_path(output_path))
+    if fmt == STORE_FORMAT:
+        return merge_stores(paths, output_path, manifest["model"], manifest["aggregation"])
+    with TableWriter(output_path, fmt) as writer:
+        for path in paths:
+            for chunk in iter_table_chunks(path, fmt):
+                writer.write(chunk)
+    return writer.rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m attention_core.shard_extraction",
+        description="Extrai as atenções de um checar_tokens.csv com vários processos, em fragmentos retomáveis.",
+    )
+    parser.add_argument("patterns", help="checar_tokens.csv (colunas sentence, rule, token_origem, token_destino)")
+    parser.add_argument("--output-dir", default=os.path.join("resultados", "fragmentos"), help="diretório dos fragmentos e do manifesto")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"modelo Hugging Face (padrão: {DEFAULT_MODEL})")
+    parser.add_argument("--workers", type=int, default=2, help="processos de extração (cada um carrega o modelo uma vez)")
+    parser.add_argument("--threads", type=int, default=None, help="threads do PyTorch por processo (padrão: núcleos / processos)")
+    parser.add_argument("--batch-size", type=int, default=32, help="sentenças por passagem do modelo")
+    parser.add_argument("--sentences-per-shard", type=int, default=SENTENCES_PER_SHARD, help="sentenças distintas por fragmento")
+    parser.add_argument("--format", choices=TABLE_FORMATS + (STORE_FORMAT,), default="csv.gz", help="formato dos fragmentos")
+    parser.add_argument("--mode", choices=["full", "pairs"], default="full", help="full: tabela n x n por cabeça; pairs: apenas os pares governante–dependente")
+    parser.add_argument("--aggregation", choices=["mean", "sum", "none"], default="mean", help="agregação das subpalavras em palavras")
+    parser.add_argument("--backend", choices=("torch", "onnx"), default="torch", help="backend de extração")
+    parser.add_argument("--quantize", action="store_true", help="quantização dinâmica int8 das camadas lineares (CPU)")
+    parser.add_argument("--device", default=None, help="dispositivo do PyTorch (padrão: cuda se disponível)")
+    parser.add_argument("--restart", action="store_true", help="ignora o manifesto existente e refaz todos os fragmentos")
+    parser.add_argument("--merge", action="store_true", help="junta os fragmentos ao final em uma única saída")
+    args = parser.parse_args(argv)
+    if args.mode == "pairs" and (args.format == STORE_FORMAT or args.aggregation == "none"):
+        parser.error("--mode pairs requer --format csv/csv.gz/parquet e agregação por palavra")
+    if args.backend == "onnx" and args.quantize:
+        parser.error("--quantize se aplica apenas ao backend torch")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sentences, items = read_pattern_rows(args.patterns, args.mode)
+    log(f"{len(sentences)} sentenças distintas em {args.patterns}")
+    options = {
+        "input_hash": _input_hash(sentences, items),
+        "model": args.model,
+        "backend": args.backend,
+        "quantize": args.quantize,
+        "device": args.device,
+        "aggregation": None if args.aggregation == "none" else args.aggregation,
+        "mode": args.mode,
+        "format": args.format,
+        "sentences_per_shard": args.sentences_per_shard,
+        "batch_size": args.batch_size,
+        "threads": args.threads or max(1, (os.cpu_count() or 1) // max(args.workers, 1)),
+        "output_dir": args.output_dir,
+    }
+    try:
+        manifest = run(options, sentences, items, args.workers, args.restart)
+    except ValueError as e:
+        log(str(e))
+        return 2
+
+    failed = [shard["index"] for shard in manifest["shards"] if shard["status"] != "done"]
+    if failed:
+        log(f"{len(failed)} fragmento(s) não concluído(s); reexecute o mesmo comando para retomar.")
+        return 1
+    log(f"{sum(shard['rows'] for shard in manifest['shards'])} linhas em {len(manifest['shards'])} fragmentos")
+
+    if args.merge:
+        name = "analise_atencao_pares" if args.mode == "pairs" else "analise_sentencas_todos_padroes"
+        output_path = os.path.join(args.output_dir, f"{name}.{args.format}")
+        rows = merge_shards(args.output_dir, output_path)
+        log(f"{rows} linhas em {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
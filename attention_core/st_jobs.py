@@ -0,0 +1,93 @@
+# ============================================================
+# Trabalhos de extração em segundo plano nas páginas Streamlit
+# ============================================================
+#
+# Uma única fila de trabalhos (`st.cache_resource`) por processo do
+# Streamlit. O painel de progresso é um fragmento atualizado a cada poucos
+# segundos, sem reexecutar o restante da página; quando o trabalho termina,
+# a página é reexecutada para exibir os resultados.
+
+import streamlit as st
+
+from attention_core.extraction_jobs import ACTIVE_STATES, JobManager
+from attention_core.st_models import get_model_registry
+
+STATUS_LABELS = {
+    "queued": "Na fila",
+    "running": "Em execução",
+    "done": "Concluído",
+    "interrupted": "Interrompido",
+    "failed": "Falhou",
+}
+REFRESH_SECONDS = 2
+
+
+@st.cache_resource
+def get_job_manager():
+    return JobManager()
+
+
+def _job_label(job):
+    return f"{job.id} — {STATUS_LABELS.get(job.status, job.status)} ({job.completed}/{job.total})"
+
+
+# Seleção do trabalho (padrão: o último enviado nesta sessão) e painel de
+# progresso. Devolve o trabalho selecionado, ou None se não houver nenhum.
+def job_panel(manager, default_job_id=None):
+    jobs = manager.jobs()
+    if not jobs:
+        return None
+    ids = [job.id for job in jobs]
+    labels = {job.id: _job_label(job) for job in jobs}
+    job_id = st.selectbox(
+        "Trabalho de extração:",
+        ids,
+        index=ids.index(default_job_id) if default_job_id in ids else 0,
+        format_func=labels.__getitem__,
+    )
+    _job_progress(manager, job_id)
+    return manager.get(job_id)
+
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def _job_progress(manager, job_id):
+    job = manager.get(job_id)
+    state = job.state
+    active = job.status in ACTIVE_STATES
+    st.progress(
+        job.completed / job.total if job.total else 1.0,
+        text=f"{STATUS_LABELS.get(job.status, job.status)}: {job.completed}/{job.total} sentenças",
+    )
+
+    # Taxa da execução atual; fora dela, a média de todas as execuções.
+    rate = job.rate if job.status == "running" else 0.0
+    if not rate and state["elapsed"]:
+        rate = job.completed / state["elapsed"]
+    remaining = job.total - job.completed
+    rate_col, eta_col, parts_col = st.columns(3)
+    rate_col.metric("Sentenças/s", f"{rate:.1f}")
+    eta_col.metric("Tempo restante", f"{remaining / rate:.0f} s" if rate and remaining and active else "—")
+    parts_col.metric("Checkpoints gravados", len(state["parts"]), help=job.directory)
+
+    if state["error"]:
+        st.error(state["error"])
+    if active:
+        if st.button("Cancelar", key=f"job_cancel_{job_id}", help="Interrompe após o bloco em andamento; o trabalho pode ser retomado."):
+            manager.cancel(job_id)
+    elif not job.finished:
+        if st.button("Retomar", key=f"job_resume_{job_id}", help="Continua a partir do último checkpoint gravado."):
+            with st.spinner(f"Carregando {state['model']}..."):
+                tokenizer, model = get_model_registry().get(
+                    state["model"], quantized=state["quantized"], backend=state["backend"]
+                )
+            manager.resume(job_id, tokenizer, model)
+        if st.button("Remover", key=f"job_delete_{job_id}"):
+            manager.delete(job_id)
+            st.rerun()
+
+    # Reexecuta a página inteira quando o trabalho deixa de estar ativo.
+    status_key = f"job_status_{job_id}"
+    if st.session_state.get(status_key) in ACTIVE_STATES and not active:
+        st.session_state[status_key] = job.status
+        st.rerun()
+    st.session_state[status_key] = job.status
@@ -0,0 +1,142 @@
+# ============================================================
+# Registro de modelos nas páginas Streamlit
+# ============================================================
+#
+# `st.cache_resource` garante uma única instância de ModelRegistry no
+# processo do Streamlit, compartilhada por todas as páginas e sessões. O
+# painel "Modo CPU" da barra lateral escolhe o backend (PyTorch ou ONNX
+# Runtime), ativa a quantização int8, ajusta as threads e mede o desvio das
+# atenções em relação ao PyTorch fp32.
+
+import pandas as pd
+import streamlit as st
+import torch
+
+from attention_core.attention import load_model_and_tokenizer
+from attention_core.cpu_inference import attention_drift, set_cpu_threads
+from attention_core.model_registry import ModelRegistry
+
+BACKEND_LABELS = {"torch": "PyTorch", "onnx": "ONNX Runtime (CPU)"}
+
+
+@st.cache_resource
+def get_model_registry():
+    return ModelRegistry()
+
+
+# Carrega (ou reaproveita) o modelo e exibe os painéis de modo CPU e de
+# modelos residentes. A primeira carga com o backend ONNX exporta o grafo.
+def load_shared_model(model_name, device=None):
+    registry = get_model_registry()
+    backend, quantized = cpu_mode_sidebar(device)
+    # Variante em uso, registrada com os trabalhos em segundo plano para que
+    # possam ser retomados com o mesmo modelo.
+    st.session_state["model_variant"] = {"backend": backend, "quantized": quantized}
+    with st.spinner(f"Carregando {model_name}..."):
+        tokenizer, model = registry.get(model_name, device=device, quantized=quantized, backend=backend)
+    if backend == "onnx":
+        drift_report_sidebar(registry, model_name, tokenizer, model, "onnx")
+    elif quantized:
+        drift_report_sidebar(registry, model_name, tokenizer, model, "int8")
+    model_registry_sidebar(registry)
+    return tokenizer, model
+
+
+# Aplica as threads escolhidas na barra lateral, se diferentes das em vigor.
+def _apply_cpu_threads():
+    intra_op, inter_op = st.session_state["cpu_intra_op"], st.session_state["cpu_inter_op"]
+    if (intra_op, inter_op) != (torch.get_num_threads(), torch.get_num_interop_threads()):
+        set_cpu_threads(int(intra_op), int(inter_op))
+
+
+# Opções de inferência em CPU; devolve (backend, quantizar).
+def cpu_mode_sidebar(device=None):
+    on_cpu = device is None or torch.device(device).type == "cpu"
+    with st.sidebar.expander("Modo CPU"):
+        backend = st.radio(
+            "Backend de extração:",
+            list(BACKEND_LABELS),
+            format_func=BACKEND_LABELS.__getitem__,
+            key="cpu_backend",
+            help="ONNX Runtime: grafo exportado uma vez por modelo e guardado em disco; executa na CPU.",
+        )
+        quantized = st.checkbox(
+            "Quantização int8 dinâmica",
+            value=False,
+            disabled=not on_cpu or backend != "torch",
+            key="cpu_quantized",
+            help="Camadas lineares em int8: inferência mais rápida na CPU, com pequeno desvio nas atenções.",
+        )
+        # As threads do PyTorch valem para o processo inteiro (todas as
+        # sessões e os trabalhos em segundo plano): os campos mostram os
+        # valores em vigor e só são aplicados quando o usuário os altera.
+        st.session_state["cpu_intra_op"] = torch.get_num_threads()
+        st.session_state["cpu_inter_op"] = torch.get_num_interop_threads()
+        st.number_input(
+            "Threads intra-op:", min_value=1, max_value=256, step=1, key="cpu_intra_op",
+            on_change=_apply_cpu_threads,
+            help="Vale para todo o processo: todas as sessões e os trabalhos em andamento.",
+        )
+        st.number_input(
+            "Threads inter-op:", min_value=1, max_value=256, step=1, key="cpu_inter_op",
+            on_change=_apply_cpu_threads,
+            help="Vale para todo o processo e só tem efeito antes da primeira inferência.",
+        )
+    return backend, quantized and on_cpu and backend == "torch"
+
+
+# Desvio do modelo int8 ou ONNX em relação ao PyTorch fp32 nas sentenças de
+# referência. O modelo fp32 já residente é reaproveitado; senão, é carregado
+# só para a medição, fora do registro, para não descartar o modelo em uso.
+def drift_report_sidebar(registry, model_name, tokenizer, model, variant):
+    with st.sidebar.expander("Desvio × PyTorch fp32"):
+        reports = st.session_state.setdefault("drift_reports", {})
+        if st.button("Medir desvio", key="drift_measure"):
+            with st.spinner("Comparando com o modelo fp32..."):
+                reference_model = registry.peek(model_name)
+                if reference_model is None:
+                    _, reference_model = load_model_and_tokenizer(model_name)
+                reports[model_name, variant] = attention_drift(tokenizer, reference_model, model)
+                del reference_model
+
+        report = reports.get((model_name, variant))
+        if report is None:
+            st.caption("Compara as atenções nas sentenças de referência com o modelo fp32.")
+            return
+        st.metric("Aceleração", f"{report['speedup']:.2f}×")
+        st.write(
+            f"Desvio absoluto médio: {report['mean_abs']:.2e}  \n"
+            f"Desvio absoluto máximo: {report['max_abs']:.2e}  \n"
+            f"Mesmo token mais atendido: {report['argmax_agreement']:.1%}"
+        )
+        st.dataframe(
+            pd.DataFrame({
+                "Camada": range(1, len(report["per_layer_mean_abs"]) + 1),
+                "Desvio médio": report["per_layer_mean_abs"],
+            }),
+            hide_index=True,
+        )
+
+
+def model_registry_sidebar(registry):
+    with st.sidebar.expander("Modelos em memória"):
+        max_models = st.number_input(
+            "Máximo de modelos residentes:",
+            min_value=1,
+            max_value=8,
+            value=registry.max_models,
+            step=1,
+            key="registry_max_models",
+        )
+        if max_models != registry.max_models:
+            registry.set_max_models(int(max_models))
+
+        resident = registry.resident()
+        total_mb = sum(info["memory_mb"] for info in resident)
+        st.caption(f"{len(resident)} modelo(s), {total_mb:.0f} MB em parâmetros.")
+
+        for info in resident:
+            st.write(f"**{info['model']}** ({info['device']}): {info['memory_mb']:.0f} MB")
+            if st.button("Descarregar", key=f"evict_{info['model']}_{info['device']}"):
+                registry.evict(info["model"], info["device"])
+                st.rerun()
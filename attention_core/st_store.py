@@ -0,0 +1,160 @@
+# ============================================================
+# Armazenamento compacto de atenções nas páginas Streamlit
+# ============================================================
+#
+# Leitura (com cache) de um `.npz` de `attention_store` — enviado pelo
+# usuário ou mapeado em memória a partir de um arquivo no servidor —, do
+# cubo de estatísticas (`.stats.npz`, ver `attention_stats`) e seleção de
+# sentença/regra/camadas na barra lateral.
+
+import io
+import os
+import tempfile
+
+import streamlit as st
+
+from attention_core.attention_stats import STATS_SUFFIX, AttentionStats, stats_path
+from attention_core.attention_store import STORE_FORMAT, AttentionStore
+
+
+def is_store_upload(uploaded_file):
+    return uploaded_file.name.endswith(f".{STORE_FORMAT}") and not is_stats_upload(uploaded_file)
+
+
+def is_stats_upload(uploaded_file):
+    return uploaded_file.name.endswith(STATS_SUFFIX)
+
+
+@st.cache_resource(max_entries=2)
+def _load_store(data):
+    return AttentionStore.load(io.BytesIO(data))
+
+
+def load_uploaded_store(uploaded_file):
+    return _load_store(uploaded_file.getvalue())
+
+
+# Reaberto apenas quando o arquivo muda (tamanho e mtime).
+@st.cache_resource(max_entries=4)
+def _open_store(path, size, mtime_ns):
+    return AttentionStore.open(path)
+
+
+def open_server_store(path):
+    stat = os.stat(path)
+    return _open_store(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+@st.cache_resource(max_entries=4)
+def _open_stats(path, size, mtime_ns):
+    return AttentionStats.load(path)
+
+
+@st.cache_resource(max_entries=2)
+def _load_stats(data):
+    return AttentionStats.load(io.BytesIO(data))
+
+
+def open_server_stats(path):
+    stat = os.stat(path)
+    return _open_stats(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+# Cubo calculado uma única vez para um armazenamento enviado sem
+# `.stats.npz` (gravado antes dos acumuladores), com a mesma chave de cache
+# do store.
+@st.cache_resource(max_entries=2, show_spinner="Calculando estatísticas...")
+def _uploaded_store_stats(data):
+    return AttentionStats.from_store(_load_store(data))
+
+
+# Cubo de um `.npz` no servidor: o `.stats.npz` ao lado do arquivo ou, se
+# ausente ou mais antigo que o store, calculado uma única vez e gravado ao
+# lado dele, para que as execuções seguintes não releiam as sentenças.
+# Sem permissão de escrita no diretório, o cubo calculado fica só em cache.
+def open_server_store_stats(path):
+    sibling = stats_path(path)
+    if os.path.isfile(sibling) and os.stat(sibling).st_mtime_ns >= os.stat(path).st_mtime_ns:
+        return open_server_stats(sibling)
+    stat = os.stat(path)
+    stats = _server_store_stats(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    try:
+        stats.save(sibling)
+    except OSError:
+        pass
+    return stats
+
+
+@st.cache_resource(max_entries=2, show_spinner="Calculando estatísticas...")
+def _server_store_stats(path, size, mtime_ns):
+    return AttentionStats.from_store(_open_store(path, size, mtime_ns))
+
+
+# Origem dos dados: upload (CSV ou .npz) ou `.npz` no servidor, lido sob
+# demanda sem passar pelo navegador. Devolve (arquivo enviado, store); com
+# `with_stats`, também o cubo de estatísticas: o `.stats.npz` escolhido, o
+# gravado ao lado do store no servidor (ver `open_server_store_stats`) ou,
+# para um store enviado sem ele, calculado do store.
+def data_source(upload_label, default_path="resultados/analise_sentencas_todos_padroes.npz", with_stats=False):
+    uploaded_file, store, stats = _data_source(upload_label, default_path, with_stats)
+    return (uploaded_file, store, stats) if with_stats else (uploaded_file, store)
+
+
+def _data_source(upload_label, default_path, with_stats):
+    source_option = st.sidebar.radio("Origem dos dados:", ["Upload", "Arquivo no servidor (.npz)"])
+    if source_option == "Upload":
+        uploaded_file = st.file_uploader(upload_label, type=["csv", STORE_FORMAT])
+        if uploaded_file and with_stats and is_stats_upload(uploaded_file):
+            return None, None, _load_stats(uploaded_file.getvalue())
+        if uploaded_file and is_store_upload(uploaded_file):
+            data = uploaded_file.getvalue()
+            return uploaded_file, _load_store(data), _uploaded_store_stats(data) if with_stats else None
+        return uploaded_file, None, None
+
+    path = st.sidebar.text_input("Caminho do arquivo:", default_path)
+    if not os.path.isfile(path):
+        st.error(f"Arquivo não encontrado: {path}")
+        return None, None, None
+    if path.endswith(STATS_SUFFIX):
+        if not with_stats:
+            st.error("Escolha o armazenamento de atenções (.npz), não o cubo de estatísticas.")
+            return None, None, None
+        return None, None, open_server_stats(path)
+    store = open_server_store(path)
+    return None, store, open_server_store_stats(path) if with_stats else None
+
+
+def select_layers(store):
+    return st.sidebar.slider(
+        "Selecionar intervalo de camadas:",
+        min_value=1,
+        max_value=store.num_layers,
+        value=(1, store.num_layers),
+    )
+
+
+# Sentença e regra escolhidas na barra lateral; devolve (índice, regra).
+def select_sentence_rule(store):
+    index = st.sidebar.selectbox(
+        "Escolha a sentença:", range(len(store)), format_func=store.sentences.__getitem__
+    )
+    rule = st.sidebar.selectbox("Escolha a regra:", store.rules_of(index))
+    return index, rule
+
+
+# Botão de conversão do armazenamento inteiro para a tabela longa em CSV
+# comprimido, gerada apenas quando solicitada.
+def store_csv_download(store):
+    if not st.sidebar.button("Converter para CSV"):
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "analise_sentencas_todos_padroes.csv.gz")
+        with st.spinner("Convertendo..."):
+            store.to_table(path, "csv.gz")
+        with open(path, "rb") as f:
+            st.sidebar.download_button(
+                label="Baixar CSV",
+                data=f.read(),
+                file_name="analise_sentencas_todos_padroes.csv.gz",
+                mime="application/gzip",
+            )
@@ -0,0 +1,147 @@
+# ============================================================
+# Escrita incremental de tabelas de atenção
+# ============================================================
+#
+# Cada DataFrame recebido é anexado ao arquivo de saída e descartado, de
+# modo que resultados de muitas sentenças não precisam caber em memória.
+# `attention_table` monta a tabela longa de uma sentença a partir do array
+# de atenções, sem depender do PyTorch.
+
+import gzip
+import os
+
+import numpy as np
+import pandas as pd
+
+TABLE_FORMATS = ("csv", "csv.gz", "parquet")
+
+# Colunas da tabela de pares (formato de `exemplo_analise_atencao.csv`).
+PAIR_COLUMNS = [
+    "Sentence ID", "Sentence", "Pattern", "Origin Token", "Destination Token",
+    "Layer", "Head", "Attention Weight",
+]
+
+
+# Tabela longa (Token, Layer, Head, Attended Token, Attention Value), uma
+# linha por (camada, cabeça, token, token atendido), construída com
+# operações vetorizadas sobre o array (camadas, cabeças, n, n). Token e
+# Attended Token são categóricos (os rótulos não se repetem na memória a
+# cada linha); Layer e Head são inteiros a partir de 1 (Layer a partir de
+# `first_layer` quando `values` traz apenas uma faixa de camadas).
+def attention_table(tokens, values, layer_head=True, first_layer=1):
+    n = len(tokens)
+    values = np.asarray(values, dtype=np.float32)[:, :, :n, :n]
+    num_layers, num_heads = values.shape[:2]
+    cells = n * n
+
+    positions = {}
+    codes = np.array([positions.setdefault(t, len(positions)) for t in tokens], dtype=np.int64)
+    categories = list(positions)
+    token_codes = np.tile(np.repeat(codes, n), num_layers * num_heads)
+    attended_codes = np.tile(codes, num_layers * num_heads * n)
+
+    df = pd.DataFrame({
+        "Token": pd.Categorical.from_codes(token_codes, categories),
+        "Layer": np.repeat(np.arange(first_layer, first_layer + num_layers), num_heads * cells),
+        "Head": np.tile(np.repeat(np.arange(1, num_heads + 1), cells), num_layers),
+        "Attended Token": pd.Categorical.from_codes(attended_codes, categories),
+        "Attention Value": np.round(values, 4).astype(np.float64).ravel(),
+    })
+
+    if layer_head:
+        labels = [
+            f"{layer}_{head}"
+            for layer in range(first_layer, first_layer + num_layers)
+            for head in range(1, num_heads + 1)
+        ]
+        df["Layer_Head"] = pd.Categorical.from_codes(np.repeat(np.arange(len(labels)), cells), labels)
+    return df
+
+
+# Tabela de pares de uma sentença: uma linha por (par, camada, cabeça), a
+# partir das tuplas (padrão, origem, destino) e do array (camadas,
+# cabeças, pares) de `analyze_pairs_batch`.
+def pair_table(sentence_id, sentence, pairs, values):
+    values = np.asarray(values)
+    num_layers, num_heads, num_pairs = values.shape
+    cells = num_layers * num_heads
+    patterns, origins, destinations = (np.asarray(column, dtype=object) for column in zip(*pairs)) if pairs else ([], [], [])
+
+    return pd.DataFrame({
+        "Sentence ID": [sentence_id] * (num_pairs * cells),
+        "Sentence": [sentence] * (num_pairs * cells),
+        "Pattern": np.repeat(patterns, cells),
+        "Origin Token": np.repeat(origins, cells),
+        "Destination Token": np.repeat(destinations, cells),
+        "Layer": np.tile(np.repeat(np.arange(1, num_layers + 1), num_heads), num_pairs),
+        "Head": np.tile(np.arange(1, num_heads + 1), num_layers * num_pairs),
+        "Attention Weight": values.transpose(2, 0, 1).astype(np.float64).ravel(),
+    }, columns=PAIR_COLUMNS)
+
+
+# Lê de volta, em blocos de linhas, uma tabela gravada por TableWriter.
+# Formas como "NA", "NULL" ou "nan" são tokens, não valores ausentes.
+def iter_table_chunks(path, fmt="csv", chunksize=100_000):
+    if fmt not in TABLE_FORMATS:
+        raise ValueError(f"Formato desconhecido: {fmt} (opções: {', '.join(TABLE_FORMATS)})")
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, keep_default_na=False, na_values=[])
+
+
+class TableWriter:
+    # Com `append`, as linhas são acrescentadas a um arquivo existente (o
+    # cabeçalho só é escrito se ele estiver vazio); no `.csv.gz`, cada
+    # escrita forma um novo membro gzip, lido como um único arquivo.
+    def __init__(self, path, fmt="csv", append=False):
+        if fmt not in TABLE_FORMATS:
+            raise ValueError(f"Formato desconhecido: {fmt} (opções: {', '.join(TABLE_FORMATS)})")
+        if append and fmt == "parquet":
+            raise ValueError("O formato parquet não permite acrescentar linhas a um arquivo existente.")
+        self.path = path
+        self.fmt = fmt
+        self.rows = 0
+        self._file = None
+        self._parquet = None
+        self._header = not (append and os.path.isfile(path) and os.path.getsize(path) > 0)
+
+        mode = "a" if append else "w"
+        if fmt == "csv":
+            self._file = open(path, mode, encoding="utf-8", newline="")
+        elif fmt == "csv.gz":
+            self._file = gzip.open(path, f"{mode}t", encoding="utf-8", newline="")
+        else:
+            try:
+                import pyarrow  # noqa: F401
+                import pyarrow.parquet  # noqa: F401
+            except ImportError as e:
+                raise RuntimeError("O formato parquet requer o pacote 'pyarrow'.") from e
+
+    def write(self, df):
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        else:
+            df.to_csv(self._file, header=self._header and self.rows == 0, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._parquet is not None:
+            self._parquet.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,257 @@
+# ============================================================
+# Regras gramaticais declarativas e avaliador de passagem única
+# ============================================================
+#
+# Cada regra é descrita por até três "facetas", todas no mesmo formato de
+# restrições sobre um token dependente e seu governante:
+#
+#   classify  decide se a sentença pertence à regra;
+#   pair      escolhe o primeiro par governante–dependente exibido na
+#             classificação geral (padrão: igual a `classify`);
+#   pattern   seleciona todos os pares exportados em `checar_tokens.csv`
+#             (padrão: igual a `classify`).
+#
+# Restrições aceitas em cada faceta:
+#
+#   deprel          relações aceitas para o dependente
+#   deprel_prefix   prefixo de relação (ex.: "expl" cobre "expl:pv")
+#   upos            classes aceitas para o dependente
+#   form            formas (minúsculas) aceitas para o dependente
+#   head_upos       classes aceitas para o governante
+#   head_has        relações que o governante também precisa governar
+#   by_governor     ordena pelo governante; em `pattern`, o governante vira
+#                   a origem do par
+#   dependents      (pair) relações dos filhos do governante listados como
+#                   dependente, ex.: "obj, iobj"
+#   governor_label  (pair) rótulo fixo no lugar da forma do governante
+#
+# Pares (facetas `pair` e `pattern`) exigem um governante na sentença:
+# dependentes ligados à raiz (head 0) não geram linhas de padrão. As lambdas
+# originais da página geravam, com `tokens[head - 1]` = `tokens[-1]`, um par
+# espúrio com o último token (ex.: "Adjunto adverbial" com advmod na raiz).
+#
+# `compile_rules` transforma as especificações em um avaliador que percorre
+# cada sentença uma única vez e devolve, no mesmo passo, a classificação
+# geral e todos os pares governante–dependente. Novas regras são apenas
+# novas entradas em um dicionário de especificações.
+
+SUBORDINATE_DEPRELS = ["ccomp", "advcl", "xcomp", "acl:relcl", "mark"]
+PASSIVE_DEPRELS = ["aux:pass", "nsubj:pass"]
+REFLEXIVE_FORMS = ["se", "me", "te", "nos", "vos"]
+
+RULE_FACETS = ("classify", "pair", "pattern")
+
+# =======================
+# Regras de Classificação Geral e de Extração de Padrões
+# =======================
+rule_specs = {
+    "Verbo bitransitivo": {
+        "classify": {"deprel": ["iobj"], "head_upos": ["VERB"], "head_has": ["obj"]},
+        "pair": {
+            "deprel": ["iobj"], "head_upos": ["VERB"], "head_has": ["obj"],
+            "by_governor": True, "dependents": ["obj", "iobj"],
+        },
+        "pattern": {"deprel": ["obj", "iobj"], "head_upos": ["VERB"], "by_governor": True},
+    },
+    "Verbo transitivo direto": {
+        "classify": {"deprel": ["obj"], "head_upos": ["VERB"]},
+        "pair": {"deprel": ["obj"]},
+    },
+    "Verbo transitivo indireto": {
+        "classify": {"deprel": ["iobj", "obl"], "head_upos": ["VERB"]},
+        "pair": {"deprel": ["iobj", "obl"]},
+        "pattern": {"deprel": ["iobj"], "head_upos": ["VERB"]},
+    },
+    "Oração subordinada": {
+        "classify": {"deprel": SUBORDINATE_DEPRELS},
+        "pattern": {"deprel": ["csubj"] + SUBORDINATE_DEPRELS},
+    },
+    "Voz passiva": {
+        "classify": {"deprel": PASSIVE_DEPRELS},
+    },
+    "Verbo com predicativo do sujeito": {
+        "classify": {"deprel": ["cop"], "head_upos": ["VERB"]},
+        "pair": {"deprel": ["cop"]},
+        "pattern": {"deprel": ["cop"]},
+    },
+    "Pronome reflexivo": {
+        "classify": {"deprel_prefix": "expl", "form": REFLEXIVE_FORMS},
+        "pair": {"deprel_prefix": "expl"},
+        "pattern": {"deprel_prefix": "expl"},
+    },
+    "Adjunto adverbial": {
+        "classify": {"deprel": ["advmod"], "upos": ["ADV"]},
+        "pair": {"deprel": ["advmod"], "upos": ["ADV"], "governor_label": "(advmod - livre)"},
+    },
+}
+
+
+def _optional_set(values, lower=False):
+    if not values:
+        return None
+    return {v.lower() for v in values} if lower else set(values)
+
+
+class _Matcher:
+    __slots__ = (
+        "rule", "facet", "deprels", "deprel_prefix", "upos", "forms",
+        "head_upos", "head_has", "by_governor", "dependents", "governor_label",
+        "needs_head",
+    )
+
+    def __init__(self, rule, facet, spec):
+        unknown = set(spec) - {
+            "deprel", "deprel_prefix", "upos", "form", "head_upos", "head_has",
+            "by_governor", "dependents", "governor_label",
+        }
+        if unknown:
+            raise ValueError(f"Regra '{rule}' ({facet}): restrições desconhecidas {sorted(unknown)}")
+
+        self.rule = rule
+        self.facet = facet
+        self.deprels = _optional_set(spec.get("deprel"))
+        self.deprel_prefix = spec.get("deprel_prefix") or None
+        self.upos = _optional_set(spec.get("upos"))
+        self.forms = _optional_set(spec.get("form"), lower=True)
+        self.head_upos = _optional_set(spec.get("head_upos"))
+        self.head_has = tuple(spec.get("head_has") or ())
+        self.by_governor = bool(spec.get("by_governor"))
+        self.dependents = tuple(spec.get("dependents") or ())
+        self.governor_label = spec.get("governor_label")
+        # Pares precisam da forma do governante; a classificação só consulta
+        # o governante quando há restrições sobre ele.
+        self.needs_head = bool(
+            self.head_upos or self.head_has or self.by_governor
+            or (facet != "classify" and self.governor_label is None)
+        )
+
+    def accepts_deprel(self, deprel):
+        if self.deprels is not None and deprel not in self.deprels:
+            return False
+        if self.deprel_prefix is not None and not (deprel or "").startswith(self.deprel_prefix):
+            return False
+        return True
+
+    def matches(self, t, pos, n):
+        if self.upos is not None and t.upos[pos] not in self.upos:
+            return False
+        if self.forms is not None and t.forms[pos].lower() not in self.forms:
+            return False
+        if not self.needs_head:
+            return True
+        head = t.heads[pos]
+        if not 0 < head <= n:
+            return False
+        if self.head_upos is not None and t.upos[head - 1] not in self.head_upos:
+            return False
+        return all(t.child_with(head - 1, (d,)) is not None for d in self.head_has)
+
+
+class RuleEvaluator:
+    def __init__(self, specs):
+        self.rule_names = list(specs)
+        self._matchers = []
+        for rule, spec in specs.items():
+            if "classify" not in spec:
+                raise ValueError(f"Regra '{rule}' não define a faceta 'classify'.")
+            for facet in RULE_FACETS:
+                self._matchers.append(_Matcher(rule, facet, spec.get(facet, spec["classify"])))
+        # Matchers candidatos por relação, preenchido sob demanda: o
+        # vocabulário de deprels de um treebank é pequeno.
+        self._dispatch = {}
+
+    def _matchers_for(self, deprel):
+        found = self._dispatch.get(deprel)
+        if found is None:
+            found = [m for m in self._matchers if m.accepts_deprel(deprel)]
+            self._dispatch[deprel] = found
+        return found
+
+    # Avalia todas as regras em uma única passagem pelos tokens da árvore e
+    # devolve (linhas de classificação, linhas de padrões).
+    def __call__(self, t):
+        n = len(t.ids)
+        matched = set()
+        pairs = {}
+        patterns = {rule: [] for rule in self.rule_names}
+
+        for pos, deprel in enumerate(t.deprels):
+            for m in self._matchers_for(deprel):
+                if m.facet == "classify" and m.rule in matched:
+                    continue
+                if not m.matches(t, pos, n):
+                    continue
+                if m.facet == "classify":
+                    matched.add(m.rule)
+                elif m.facet == "pair":
+                    key = t.heads[pos] if m.by_governor else pos
+                    if m.rule not in pairs or key < pairs[m.rule][0]:
+                        pairs[m.rule] = (key, pos, m)
+                else:
+                    patterns[m.rule].append((t.heads[pos] if m.by_governor else pos, pos, m))
+
+        classified = []
+        for rule in self.rule_names:
+            if rule in matched and rule in pairs:
+                _, pos, m = pairs[rule]
+                governante, dependente = self._pair_forms(t, pos, m)
+                classified.append({
+                    "sent_id": t.sent_id,
+                    "sentence": t.text,
+                    "rule": rule,
+                    "governante": governante,
+                    "dependente": dependente,
+                })
+
+        found = []
+        for rule in self.rule_names:
+            matches = patterns[rule]
+            matches.sort(key=lambda match: match[0])
+            for _, pos, m in matches:
+                found.append(self._pattern_row(t, rule, pos, m))
+
+        return classified, found
+
+    @staticmethod
+    def _pair_forms(t, pos, m):
+        head = t.heads[pos] - 1
+        if m.dependents:
+            children = (t.child_with(head, (d,)) for d in m.dependents)
+            dependente = ", ".join(t.forms[c] for c in children if c is not None)
+        else:
+            dependente = t.forms[pos]
+        governante = m.governor_label if m.governor_label is not None else t.forms[head]
+        return governante, dependente
+
+    @staticmethod
+    def _pattern_row(t, rule, pos, m):
+        head = t.heads[pos] - 1
+        origem, destino = (head, pos) if m.by_governor else (pos, head)
+        return {
+            "Sentence ID": t.sent_id,
+            "Sentence": t.text,
+            "Pattern": rule,
+            "Origin Token": t.forms[origem],
+            "Origin ID": t.ids[origem],
+            "Destination Token": t.forms[destino],
+            "Destination ID": t.ids[destino],
+        }
+
+
+def compile_rules(specs=None):
+    return RuleEvaluator(rule_specs if specs is None else specs)
+
+
+# Especificação de uma regra personalizada a partir de listas separadas
+# por vírgula (formulário da página de classificação).
+def custom_rule_spec(deprel="", upos="", head_upos="", form=""):
+    def split(text):
+        return [item.strip() for item in text.split(",") if item.strip()]
+
+    classify = {
+        "deprel": split(deprel),
+        "upos": split(upos),
+        "head_upos": split(head_upos),
+        "form": split(form),
+    }
+    return {"classify": {k: v for k, v in classify.items() if v}}
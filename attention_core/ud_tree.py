@@ -0,0 +1,65 @@
+# ============================================================
+# Representação indexada de árvores de dependência (UD)
+# ============================================================
+#
+# Cada sentença CoNLL-U é convertida uma única vez em arrays paralelos
+# (form, upos, deprel, head) e em um índice de filhos por governante, de
+# modo que as regras gramaticais consultem governantes em O(1) e
+# dependentes em O(filhos), sem varreduras aninhadas sobre a sentença.
+#
+# Posições são 0-based (posição = id - 1); o índice de filhos é indexado
+# pelo id do governante, com a raiz da sentença em `children[0]`.
+
+
+class SentenceTree:
+    __slots__ = ("sent_id", "text", "ids", "forms", "upos", "deprels", "heads", "children", "multiword")
+
+    # `multiword`: tokens multipalavra (primeiro id, último id, forma), que
+    # aparecem no texto no lugar das suas partes (ex.: "do" = "de" + "o").
+    def __init__(self, sent_id, text, ids, forms, upos, deprels, heads, multiword=()):
+        self.sent_id = sent_id
+        self.text = text
+        self.ids = ids
+        self.forms = forms
+        self.upos = upos
+        self.deprels = deprels
+        self.heads = heads
+        self.multiword = multiword
+
+        children = [[] for _ in range(len(ids) + 1)]
+        for pos, head in enumerate(heads):
+            if 0 <= head < len(children):
+                children[head].append(pos)
+        self.children = children
+
+    @classmethod
+    def from_tokenlist(cls, sentence, idx=0):
+        # Tokens multipalavra (ids "1-2") e nós vazios ("1.1") não fazem
+        # parte da árvore básica; dos multipalavra, guarda-se só a forma.
+        ids, forms, upos, deprels, heads, multiword = [], [], [], [], [], []
+        for tok in sentence:
+            if not isinstance(tok["id"], int):
+                if tok["id"][1] == "-":
+                    multiword.append((tok["id"][0], tok["id"][2], tok["form"]))
+                continue
+            ids.append(tok["id"])
+            forms.append(tok["form"])
+            upos.append(tok["upos"])
+            deprels.append(tok["deprel"])
+            heads.append(tok["head"] or 0)
+
+        return cls(
+            sentence.metadata.get("sent_id", f"sent_{idx+1}"),
+            sentence.metadata.get("text", "N/A"),
+            ids, forms, upos, deprels, heads, tuple(multiword),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Primeiro dependente de `pos` cuja relação está em `deprels`.
+    def child_with(self, pos, deprels):
+        for child in self.children[pos + 1]:
+            if self.deprels[child] in deprels:
+                return child
+        return None
@@ -0,0 +1,203 @@
+# ============================================================
+# Benchmark: avaliador compilado x lambdas originais
+# ============================================================
+#
+# Uso:
+#     python benchmarks/bench_ud_rules.py [data/pt_bosque-ud-train.conllu]
+#
+# Executa a classificação geral e a extração de padrões com as lambdas
+# originais de `1_classificar_sentencas.py` (varreduras aninhadas, uma
+# passagem por regra) e com o avaliador de passagem única compilado a partir
+# de `attention_core.ud_rules.rule_specs`, confere que as saídas são
+# idênticas e imprime o tempo de cada implementação.
+#
+# As lambdas originais são avaliadas sobre os tokens de id inteiro, como já
+# acontecia na extração de padrões; na classificação, a página aplicava-as
+# à sentença bruta, em que tokens multipalavra deslocam `tokens[head - 1]`.
+#
+# Única diferença intencional: padrões com head 0 (só possíveis no
+# "Adjunto adverbial") eram pareados com o último token da sentença e não
+# são gerados pelo avaliador; a comparação desconsidera essas linhas
+# (`without_root_pairs`).
+
+import os
+import sys
+import time
+
+from conllu import parse_incr
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from attention_core.ud_tree import SentenceTree  # noqa: E402
+from attention_core.ud_rules import compile_rules  # noqa: E402
+
+legacy_grammar_rules = {
+    "Verbo bitransitivo": lambda tokens: any(
+        tok["upos"] == "VERB" and
+        any(child["deprel"] == "obj" and child["head"] == tok["id"] for child in tokens) and
+        any(child["deprel"] == "iobj" and child["head"] == tok["id"] for child in tokens)
+        for tok in tokens
+    ),
+    "Verbo transitivo direto": lambda tokens: any(
+        tok["deprel"] == "obj" and
+        0 < tok["head"] <= len(tokens) and tokens[tok["head"] - 1]["upos"] == "VERB"
+        for tok in tokens
+    ),
+    "Verbo transitivo indireto": lambda tokens: any(
+        tok["deprel"] in {"iobj", "obl"} and
+        0 < tok["head"] <= len(tokens) and tokens[tok["head"] - 1]["upos"] == "VERB"
+        for tok in tokens
+    ),
+    "Oração subordinada": lambda tokens: any(
+        tok["deprel"] in {"ccomp", "advcl", "xcomp", "acl:relcl", "mark"}
+        for tok in tokens
+    ),
+    "Voz passiva": lambda tokens: any(
+        tok["deprel"] in {"aux:pass", "nsubj:pass"}
+        for tok in tokens
+    ),
+    "Verbo com predicativo do sujeito": lambda tokens: any(
+        tok["deprel"] == "cop" and
+        0 < tok["head"] <= len(tokens) and tokens[tok["head"] - 1]["upos"] == "VERB"
+        for tok in tokens
+    ),
+    "Pronome reflexivo": lambda tokens: any(
+        tok["deprel"].startswith("expl") and
+        tok["form"].lower() in {"se", "me", "te", "nos", "vos"}
+        for tok in tokens
+    ),
+    "Adjunto adverbial": lambda tokens: any(
+        tok["deprel"] == "advmod" and tok["upos"] == "ADV"
+        for tok in tokens
+    ),
+}
+
+legacy_first_deprels = {
+    "Verbo transitivo direto": lambda tok: tok["deprel"] == "obj",
+    "Verbo transitivo indireto": lambda tok: tok["deprel"] in {"iobj", "obl"},
+    "Oração subordinada": lambda tok: tok["deprel"] in {"ccomp", "advcl", "xcomp", "acl:relcl", "mark"},
+    "Voz passiva": lambda tok: tok["deprel"] in {"aux:pass", "nsubj:pass"},
+    "Verbo com predicativo do sujeito": lambda tok: tok["deprel"] == "cop",
+    "Pronome reflexivo": lambda tok: tok["deprel"].startswith("expl"),
+}
+
+legacy_patterns = {
+    "Verbo bitransitivo": lambda tokens: [
+        (tok["id"], tok["form"], child["id"], child["form"])
+        for tok in tokens if tok["upos"] == "VERB"
+        for child in tokens if child["head"] == tok["id"] and child["deprel"] in {"obj", "iobj"}
+    ],
+    "Verbo transitivo direto": lambda tokens: [
+        (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
+        for tok in tokens if tok["deprel"] == "obj" and tok["head"] > 0 and tokens[tok["head"] - 1]["upos"] == "VERB"
+    ],
+    "Verbo transitivo indireto": lambda tokens: [
+        (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
+        for tok in tokens if tok["deprel"] == "iobj" and tok["head"] > 0 and tokens[tok["head"] - 1]["upos"] == "VERB"
+    ],
+    "Oração subordinada": lambda tokens: [
+        (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
+        for tok in tokens if tok["deprel"] in {"csubj", "ccomp", "advcl", "xcomp", "acl:relcl", "mark"} and tok["head"] > 0
+    ],
+    "Voz passiva": lambda tokens: [
+        (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
+        for tok in tokens if tok["deprel"] in {"aux:pass", "nsubj:pass"} and tok["head"] > 0
+    ],
+    "Verbo com predicativo do sujeito": lambda tokens: [
+        (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
+        for tok in tokens if tok["deprel"] == "cop" and tok["head"] > 0
+    ],
+    "Pronome reflexivo": lambda tokens: [
+        (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
+        for tok in tokens if tok["deprel"].startswith("expl") and tok["head"] > 0
+    ],
+    "Adjunto adverbial": lambda tokens: [
+        (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
+        for tok in tokens if tok["deprel"] == "advmod" and tok["upos"] == "ADV"
+    ],
+}
+
+
+def legacy_first_pair(rule, tokens):
+    if rule == "Verbo bitransitivo":
+        for tok in tokens:
+            if tok["upos"] != "VERB":
+                continue
+            obj = next((c for c in tokens if c["deprel"] == "obj" and c["head"] == tok["id"]), None)
+            iobj = next((c for c in tokens if c["deprel"] == "iobj" and c["head"] == tok["id"]), None)
+            if obj and iobj:
+                return tok["form"], f'{obj["form"]}, {iobj["form"]}'
+        return None
+    if rule == "Adjunto adverbial":
+        adv = next((t for t in tokens if t["deprel"] == "advmod" and t["upos"] == "ADV"), None)
+        return ("(advmod - livre)", adv["form"]) if adv else None
+    dep = next((t for t in tokens if legacy_first_deprels[rule](t) and t["head"] > 0), None)
+    return (tokens[dep["head"] - 1]["form"], dep["form"]) if dep else None
+
+
+def run_legacy(sentences):
+    classified, patterns = [], []
+    for idx, sentence in enumerate(sentences):
+        text = sentence.metadata.get("text", "N/A")
+        sent_id = sentence.metadata.get("sent_id", f"sent_{idx+1}")
+        tokens = [
+            {k: tok[k] for k in ("id", "form", "upos", "deprel", "head")}
+            for tok in sentence if isinstance(tok["id"], int)
+        ]
+        for rule, cond in legacy_grammar_rules.items():
+            if cond(tokens):
+                pair = legacy_first_pair(rule, tokens)
+                if pair:
+                    classified.append((text, rule) + pair)
+        for regra, cond in legacy_patterns.items():
+            for match in cond(tokens):
+                patterns.append((sent_id, text, regra) + match)
+    return classified, patterns
+
+
+# Padrões das lambdas originais sem os pares espúrios com head 0.
+def without_root_pairs(patterns):
+    return [row for row in patterns if row[5] != 0]
+
+
+def run_compiled(sentences):
+    evaluator = compile_rules()
+    classified, patterns = [], []
+    for idx, sentence in enumerate(sentences):
+        tree = SentenceTree.from_tokenlist(sentence, idx)
+        rows, found = evaluator(tree)
+        for row in rows:
+            classified.append((row["sentence"], row["rule"], row["governante"], row["dependente"]))
+        for row in found:
+            patterns.append((
+                row["Sentence ID"], row["Sentence"], row["Pattern"],
+                row["Origin ID"], row["Origin Token"], row["Destination ID"], row["Destination Token"],
+            ))
+    return classified, patterns
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "data/pt_bosque-ud-train.conllu"
+    with open(path, encoding="utf-8") as f:
+        sentences = list(parse_incr(f))
+    n_tokens = sum(len(s) for s in sentences)
+    print(f"{len(sentences)} sentenças, {n_tokens} linhas de token")
+
+    start = time.perf_counter()
+    legacy = run_legacy(sentences)
+    t_legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = run_compiled(sentences)
+    t_compiled = time.perf_counter() - start
+
+    assert legacy[0] == compiled[0], "classificação divergente"
+    assert without_root_pairs(legacy[1]) == compiled[1], "padrões divergentes"
+
+    print(f"classificações: {len(compiled[0])}, padrões: {len(compiled[1])} (saídas idênticas)")
+    print(f"lambdas originais: {t_legacy:.3f}s")
+    print(f"avaliador único:   {t_compiled:.3f}s  ({t_legacy / t_compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
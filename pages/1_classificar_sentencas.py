@@ -1,7 +1,15 @@
 import streamlit as st
 import pandas as pd
-from conllu import parse_incr
 import io
+import os
+import tempfile
+import time
+
+from attention_core.conllu_stream import ExportWriter, iter_classified, open_conllu
+from attention_core.corpus_cache import ColumnarCorpus, CorpusCache
+from attention_core.corpus_index import QUERY_HELP, CorpusIndex
+from attention_core.parallel import iter_classified_parallel
+from attention_core.ud_rules import compile_rules, custom_rule_spec, rule_specs
 
 st.set_page_config(
     page_title="Analisador de Padrões Gramaticais — Universal Dependencies",
@@ -14,324 +22,194 @@ st.set_page_config(
 st.title('Analisador de Padrões Gramaticais — Universal Dependencies')
 
 # =======================
-# Regras de Classificação Geral
+# Regras Personalizadas
 # =======================
-grammar_rules = {
-    "Verbo bitransitivo": {
-        "conditions": lambda tokens: any(
-            tok["upos"] == "VERB" and
-            any(child["deprel"] == "obj" and child["head"] == tok["id"] for child in tokens) and
-            any(child["deprel"] == "iobj" and child["head"] == tok["id"] for child in tokens)
-            for tok in tokens
-        )
-    },
-    "Verbo transitivo direto": {
-        "conditions": lambda tokens: any(
-            tok["deprel"] == "obj" and
-            0 < tok["head"] <= len(tokens) and tokens[tok["head"] - 1]["upos"] == "VERB"
-            for tok in tokens
-        )
-    },
-    "Verbo transitivo indireto": {
-        "conditions": lambda tokens: any(
-            tok["deprel"] in {"iobj", "obl"} and
-            0 < tok["head"] <= len(tokens) and tokens[tok["head"] - 1]["upos"] == "VERB"
-            for tok in tokens
-        )
-    },
-    "Oração subordinada": {
-        "conditions": lambda tokens: any(
-            tok["deprel"] in {"ccomp", "advcl", "xcomp", "acl:relcl", "mark"}
-            for tok in tokens
-        )
-    },
-    "Voz passiva": {
-        "conditions": lambda tokens: any(
-            tok["deprel"] in {"aux:pass", "nsubj:pass"}
-            for tok in tokens
-        )
-    },
-    "Verbo com predicativo do sujeito": {
-        "conditions": lambda tokens: any(
-            tok["deprel"] == "cop" and
-            0 < tok["head"] <= len(tokens) and tokens[tok["head"] - 1]["upos"] == "VERB"
-            for tok in tokens
-        )
-    },
-    "Pronome reflexivo": {
-        "conditions": lambda tokens: any(
-            tok["deprel"].startswith("expl") and
-            tok["form"].lower() in {"se", "me", "te", "nos", "vos"}
-            for tok in tokens
-        )
-    },
-    "Adjunto adverbial": {
-        "conditions": lambda tokens: any(
-            tok["deprel"] == "advmod" and tok["upos"] == "ADV"
-            for tok in tokens
-        )
-    }
-}
+# Regras extras descritas pelas mesmas restrições declarativas de
+# `rule_specs` e avaliadas na mesma passagem que as regras padrão.
+if "custom_rules" not in st.session_state:
+    st.session_state["custom_rules"] = {}
 
-# =======================
-# Regras de Extração de Padrões
-# =======================
-grammatical_patterns = {
-    "Verbo bitransitivo": {
-        "conditions": lambda tokens: [
-            (tok["id"], tok["form"], child["id"], child["form"])
-            for tok in tokens if tok["upos"] == "VERB"
-            for child in tokens if child["head"] == tok["id"] and child["deprel"] in {"obj", "iobj"}
-        ]
-    },
-    "Verbo transitivo direto": {
-        "conditions": lambda tokens: [
-            (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
-            for tok in tokens if tok["deprel"] == "obj" and tok["head"] > 0 and tokens[tok["head"] - 1]["upos"] == "VERB"
-        ]
-    },
-    "Verbo transitivo indireto": {
-        "conditions": lambda tokens: [
-            (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
-            for tok in tokens if tok["deprel"] == "iobj" and tok["head"] > 0 and tokens[tok["head"] - 1]["upos"] == "VERB"
-        ]
-    },
-    "Oração subordinada": {
-        "conditions": lambda tokens: [
-            (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
-            for tok in tokens if tok["deprel"] in {"csubj", "ccomp", "advcl", "xcomp", "acl:relcl", "mark"} and tok["head"] > 0
-        ]
-    },
-    "Voz passiva": {
-        "conditions": lambda tokens: [
-            (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
-            for tok in tokens if tok["deprel"] in {"aux:pass", "nsubj:pass"} and tok["head"] > 0
-        ]
-    },
-    "Verbo com predicativo do sujeito": {
-        "conditions": lambda tokens: [
-            (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
-            for tok in tokens if tok["deprel"] == "cop" and tok["head"] > 0
-        ]
-    },
-    "Pronome reflexivo": {
-        "conditions": lambda tokens: [
-            (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
-            for tok in tokens if tok["deprel"].startswith("expl") and tok["head"] > 0
-        ]
-    },
-    "Adjunto adverbial": {
-        "conditions": lambda tokens: [
-            (tok["id"], tok["form"], tok["head"], tokens[tok["head"] - 1]["form"])
-            for tok in tokens if tok["deprel"] == "advmod" and tok["upos"] == "ADV"
-        ]
-    }
-}
+with st.expander("Regras personalizadas"):
+    with st.form("custom_rule_form", clear_on_submit=True):
+        rule_name = st.text_input("Nome da regra:")
+        rule_deprel = st.text_input("Relações do dependente (deprel, separadas por vírgula):")
+        rule_upos = st.text_input("Classes do dependente (upos, separadas por vírgula):")
+        rule_head_upos = st.text_input("Classes do governante (upos, separadas por vírgula):")
+        rule_form = st.text_input("Formas do dependente (separadas por vírgula):")
+
+        if st.form_submit_button("Adicionar regra"):
+            spec = custom_rule_spec(rule_deprel, rule_upos, rule_head_upos, rule_form)
+            if not rule_name.strip() or not spec["classify"]:
+                st.error("Informe o nome da regra e ao menos uma restrição.")
+            elif rule_name.strip() in rule_specs:
+                st.error("Já existe uma regra padrão com esse nome.")
+            else:
+                st.session_state["custom_rules"][rule_name.strip()] = spec
+
+    if st.session_state["custom_rules"]:
+        st.json(st.session_state["custom_rules"])
+        if st.button("Remover regras personalizadas"):
+            st.session_state["custom_rules"] = {}
+            st.rerun()
+
+active_specs = {**rule_specs, **st.session_state["custom_rules"]}
+evaluator = compile_rules(active_specs)
+
+PREVIEW_ROWS = 10
 
 # =======================
 # Upload do Arquivo
 # =======================
-uploaded_file = st.file_uploader("Faça upload de um arquivo .conllu", type=["conllu"])
+st.sidebar.header("Corpus")
+source_option = st.sidebar.radio("Origem do arquivo .conllu:", ["Upload", "Arquivo no servidor"])
+streaming = st.sidebar.checkbox(
+    "Modo streaming (memória limitada)",
+    value=False,
+    help="Processa uma sentença por vez e grava checar_tokens.csv em disco durante a leitura. "
+         "Indicado para treebanks grandes; exibe apenas uma prévia das tabelas.",
+)
+
+workers = st.sidebar.number_input(
+    "Processos paralelos:",
+    min_value=1,
+    max_value=os.cpu_count() or 1,
+    value=1,
+    step=1,
+    help="Divide o corpus em fragmentos de sentenças classificados em paralelo; "
+         "os resultados mantêm a ordem original do arquivo.",
+)
+
+
+# Classificação sentença a sentença, serial ou em um pool de processos.
+def classify_stream(stream):
+    if workers > 1:
+        return iter_classified_parallel(stream, active_specs, int(workers))
+    return iter_classified(stream, evaluator)
+
+
+# Cache de corpora analisados compartilhado entre execuções e sessões.
+@st.cache_resource
+def get_corpus_cache():
+    return CorpusCache()
 
-if uploaded_file:
-    st.success("Arquivo carregado com sucesso!")
 
-    sentences = list(parse_incr(io.StringIO(uploaded_file.getvalue().decode("utf-8"))))
+# Índice invertido de um corpus, construído uma vez por hash de conteúdo.
+@st.cache_resource(max_entries=2)
+def get_corpus_index(digest, _corpus):
+    return CorpusIndex(_corpus)
+
+
+corpus_cache = get_corpus_cache()
+if st.sidebar.button("Limpar cache de corpora"):
+    corpus_cache.clear()
+st.sidebar.caption(f"Cache de corpora: {corpus_cache.size_bytes() / 1024 ** 2:.1f} MB")
+
+corpus_source = None
+if source_option == "Upload":
+    corpus_source = st.file_uploader("Faça upload de um arquivo .conllu", type=["conllu"])
+else:
+    corpus_path = st.sidebar.text_input("Caminho do arquivo:", "data/pt_bosque-ud-train.conllu")
+    if os.path.isfile(corpus_path):
+        corpus_source = corpus_path
+    else:
+        st.error(f"Arquivo não encontrado: {corpus_path}")
+
+if corpus_source and streaming:
+    st.success("Arquivo carregado com sucesso!")
 
     # =======================
-    # Classificação Geral das Sentenças com Governante e Dependente
+    # Classificação e Exportação em Streaming
     # =======================
-    
-    sentence_rules = []
-    for sentence in sentences:
-        text = sentence.metadata.get("text", "N/A")
-        matched = False
-    
-        for rule, cond in grammar_rules.items():
-            if cond["conditions"](sentence):
-                matched = True
-    
-                # Procurar o primeiro par governante-dependente conforme o padrão definido
-                for tok in sentence:
-                    if rule == "Verbo bitransitivo" and tok["upos"] == "VERB":
-                        obj = next((child for child in sentence if child["deprel"] == "obj" and child["head"] == tok["id"]), None)
-                        iobj = next((child for child in sentence if child["deprel"] == "iobj" and child["head"] == tok["id"]), None)
-                        if obj and iobj:
-                            sentence_rules.append({
-                                "sentence": text,
-                                "rule": rule,
-                                "governante": tok["form"],
-                                "dependente": f'{obj["form"]}, {iobj["form"]}'
-                            })
-                            break
-    
-                    elif rule == "Verbo transitivo direto":
-                        obj = next((tok for tok in sentence if tok["deprel"] == "obj" and tok["head"] > 0), None)
-                        if obj:
-                            head = sentence[obj["head"] - 1]
-                            sentence_rules.append({
-                                "sentence": text,
-                                "rule": rule,
-                                "governante": head["form"],
-                                "dependente": obj["form"]
-                            })
-                            break
-    
-                    elif rule == "Verbo transitivo indireto":
-                        iobj = next((tok for tok in sentence if tok["deprel"] in {"iobj", "obl"} and tok["head"] > 0), None)
-                        if iobj:
-                            head = sentence[iobj["head"] - 1]
-                            sentence_rules.append({
-                                "sentence": text,
-                                "rule": rule,
-                                "governante": head["form"],
-                                "dependente": iobj["form"]
-                            })
-                            break
-    
-                    elif rule == "Oração subordinada":
-                        sub = next((tok for tok in sentence if tok["deprel"] in {"ccomp", "advcl", "xcomp", "acl:relcl", "mark"} and tok["head"] > 0), None)
-                        if sub:
-                            head = sentence[sub["head"] - 1]
-                            sentence_rules.append({
-                                "sentence": text,
-                                "rule": rule,
-                                "governante": head["form"],
-                                "dependente": sub["form"]
-                            })
-                            break
-    
-                    elif rule == "Voz passiva":
-                        passive = next((tok for tok in sentence if tok["deprel"] in {"aux:pass", "nsubj:pass"} and tok["head"] > 0), None)
-                        if passive:
-                            head = sentence[passive["head"] - 1]
-                            sentence_rules.append({
-                                "sentence": text,
-                                "rule": rule,
-                                "governante": head["form"],
-                                "dependente": passive["form"]
-                            })
-                            break
-    
-                    elif rule == "Verbo com predicativo do sujeito":
-                        cop = next((tok for tok in sentence if tok["deprel"] == "cop" and tok["head"] > 0), None)
-                        if cop:
-                            head = sentence[cop["head"] - 1]
-                            sentence_rules.append({
-                                "sentence": text,
-                                "rule": rule,
-                                "governante": head["form"],
-                                "dependente": cop["form"]
-                            })
-                            break
-    
-                    elif rule == "Pronome reflexivo":
-                        expl = next((tok for tok in sentence if tok["deprel"].startswith("expl") and tok["head"] > 0), None)
-                        if expl:
-                            head = sentence[expl["head"] - 1]
-                            sentence_rules.append({
-                                "sentence": text,
-                                "rule": rule,
-                                "governante": head["form"],
-                                "dependente": expl["form"]
-                            })
-                            break
-    
-                    elif rule == "Adjunto adverbial":
-                        adv = next((tok for tok in sentence if tok["deprel"] == "advmod" and tok["upos"] == "ADV"), None)
-                        if adv:
-                            sentence_rules.append({
-                                "sentence": text,
-                                "rule": rule,
-                                "governante": "(advmod - livre)",
-                                "dependente": adv["form"]
-                            })
-                            break
-    
-        if not matched:
-            sentence_rules.append({
-                "sentence": text,
-                "rule": "Não classificada",
-                "governante": "-",
-                "dependente": "-"
-            })
-    
-    df_classified = pd.DataFrame(sentence_rules)
-    df_classified = df_classified[df_classified["rule"] != "Não classificada"]
-    
+    # Cada sentença é decodificada, classificada e gravada em disco antes da
+    # próxima; apenas contadores e a prévia das tabelas ficam em memória.
+    export_text = io.TextIOWrapper(tempfile.TemporaryFile(), encoding="utf-8", newline="")
+    writer = ExportWriter(export_text)
+    preview_classified, preview_patterns = [], []
+    n_sentences = n_classified = 0
+    status = st.empty()
+
+    with open_conllu(corpus_source) as stream:
+        for tree, rows, found in classify_stream(stream):
+            n_sentences += 1
+            if rows:
+                n_classified += 1
+                writer.write_patterns(found)
+                if len(preview_classified) < PREVIEW_ROWS:
+                    preview_classified.extend(rows)
+                if len(preview_patterns) < PREVIEW_ROWS:
+                    preview_patterns.extend(found)
+            if n_sentences % 1000 == 0:
+                status.text(f"{n_sentences} sentenças processadas...")
+
+    export_text.flush()
+    export_file = export_text.detach()
+    status.text(f"{n_sentences} sentenças processadas, {n_classified} classificadas.")
+
     st.subheader("Classificação Geral com Governante e Dependente")
-    st.dataframe(df_classified.head(10))
+    st.dataframe(pd.DataFrame(preview_classified).head(PREVIEW_ROWS))
 
+    if writer.rows:
+        st.subheader("Padrões Identificados")
+        st.dataframe(pd.DataFrame(preview_patterns).head(PREVIEW_ROWS))
+        st.write(f"**Padrões exportados:** {writer.rows}")
+
+        export_file.seek(0)
+        st.download_button(
+            label="Baixar checar_tokens.csv",
+            data=export_file,
+            file_name="checar_tokens.csv",
+            mime="text/csv"
+        )
+    else:
+        st.warning("Nenhum padrão identificado. Nenhum arquivo será gerado.")
+
+elif corpus_source:
+    st.success("Arquivo carregado com sucesso!")
 
     # =======================
-    # Estruturar Sentenças para Padrões
+    # Leitura do Corpus
     # =======================
-    sentence_to_rule = dict(zip(df_classified["sentence"], df_classified["rule"]))
-
-    sentences_structured = {}
-    token_data = []
-
-    for idx, sentence in enumerate(sentences):
-        text = sentence.metadata.get("text", "N/A")
-        sent_id = sentence.metadata.get("sent_id", f"sent_{idx+1}")
-
-        if text in sentence_to_rule:
-            sentences_structured[sent_id] = {
-                "Sentence": text,
-                "Tokens": [
-                    {
-                        "id": tok["id"],
-                        "form": tok["form"],
-                        "upos": tok["upos"],
-                        "deprel": tok["deprel"],
-                        "head": tok["head"]
-                    }
-                    for tok in sentence
-                    if isinstance(tok["id"], int)
-                ]
-            }
+    # Índice de dependências construído uma única vez por sentença; todas as
+    # regras consultam esta estrutura em uma única passagem (ver
+    # attention_core/ud_rules.py). O texto é decodificado aos poucos e as
+    # TokenLists não são mantidas; corpora já analisados vêm do cache
+    # colunar (chave: hash do conteúdo).
+    digest = corpus_cache.digest(corpus_source)
+    corpus = corpus_cache.get(digest)
+    if corpus is None:
+        with open_conllu(corpus_source) as stream:
+            classified = list(classify_stream(stream))
+        corpus = ColumnarCorpus.from_trees(tree for tree, _, _ in classified)
+        corpus_cache.put(digest, corpus)
+    else:
+        classified = ((tree, *evaluator(tree)) for tree in corpus.trees())
+        st.caption(f"Corpus lido do cache ({len(corpus)} sentenças, {corpus.n_tokens} tokens).")
 
     # =======================
-    # Extração de Padrões Governante–Dependente
+    # Classificação Geral e Padrões por sent_id
     # =======================
+    # Os padrões de cada sentença saem da mesma passagem da classificação e
+    # são mantidos apenas quando a própria sentença foi classificada. A
+    # chave é o sent_id, não o texto: sentenças repetidas não colidem e não
+    # há segunda passagem pelo corpus nem cópia dos tokens.
+    sentence_rules = []
     resultados = []
-    for sent_id, sent_data in sentences_structured.items():
-        tokens = sent_data["Tokens"]
-        sentence_text = sent_data["Sentence"]
-
-        for regra, config in grammatical_patterns.items():
-            matches = config["conditions"](tokens)
-            for origem_id, origem_form, destino_id, destino_form in matches:
-                resultados.append({
-                    "Sentence ID": sent_id,
-                    "Sentence": sentence_text,
-                    "Pattern": regra,
-                    "Origin Token": origem_form,
-                    "Origin ID": origem_id,
-                    "Destination Token": destino_form,
-                    "Destination ID": destino_id
-                })
-
-    df_resultado = pd.DataFrame(resultados)
-
-    if not df_resultado.empty:
-        st.subheader("Padrões Identificados")
-        st.dataframe(df_resultado.head(10))
+    for tree, rows, found in classified:
+        if rows:
+            sentence_rules.extend(rows)
+            resultados.extend(found)
 
-        df_tokens_export = df_resultado[["Sentence", "Pattern", "Origin Token", "Destination Token"]].copy()
-        df_tokens_export["Tokens Concatenados"] = df_tokens_export.apply(
-            lambda row: [f'"{row["Origin Token"]}"', f'"{row["Destination Token"]}"'], axis=1
-        )
-        df_tokens_export = df_tokens_export.rename(columns={
-            "Sentence": "sentence",
-            "Pattern": "rule",
-            "Origin Token": "token_origem",
-            "Destination Token": "token_destino",
-            "Tokens Concatenados": "tokens_to_check"
-        })
+    df_classified = pd.DataFrame(sentence_rules)
+
+    st.subheader("Classificação Geral com Governante e Dependente")
+    st.dataframe(df_classified.head(PREVIEW_ROWS))
+
+    if resultados:
+        st.subheader("Padrões Identificados")
+        st.dataframe(pd.DataFrame(resultados[:PREVIEW_ROWS]))
 
         csv_buffer = io.StringIO()
-        df_tokens_export.to_csv(csv_buffer, index=False, encoding="utf-8")
+        ExportWriter(csv_buffer).write_patterns(resultados)
 
         st.download_button(
             label="Baixar checar_tokens.csv",
@@ -341,3 +219,38 @@ if uploaded_file:
         )
     else:
         st.warning("Nenhum padrão identificado. Nenhum arquivo será gerado.")
+
+    # =======================
+    # Consulta ao Índice do Corpus
+    # =======================
+    # Responde a partir do índice invertido (deprel, upos e pares governante
+    # -> relação), sem reavaliar as regras sobre o corpus.
+    st.subheader("Consulta ao Índice do Corpus")
+    corpus_index = get_corpus_index(digest, corpus)
+    query = st.text_input("Consulta (ex.: VERB>nsubj upos=PRON):", help=QUERY_HELP)
+
+    if query:
+        start = time.perf_counter()
+        try:
+            query_sentences, query_tokens = corpus_index.query(query)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            query_rows = corpus_index.pattern_rows(query_tokens, query)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            st.write(
+                f"**{len(query_sentences)}** sentenças, **{len(query_rows)}** pares "
+                f"governante–dependente ({elapsed_ms:.1f} ms)."
+            )
+
+            if query_rows:
+                st.dataframe(pd.DataFrame(query_rows[:100]))
+
+                query_buffer = io.StringIO()
+                ExportWriter(query_buffer).write_patterns(query_rows)
+                st.download_button(
+                    label="Baixar resultado da consulta (formato checar_tokens.csv)",
+                    data=query_buffer.getvalue(),
+                    file_name="consulta_tokens.csv",
+                    mime="text/csv"
+                )
@@ -6,11 +6,15 @@
 import streamlit as st
 import torch
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from transformers import BertTokenizerFast, BertModel
-import math
+
+from attention_core.attention import (
+    SUBWORD_AGGREGATIONS,
+    analyze_attention,
+    stack_attentions,
+)
+from attention_core.attention_plot import layer_heatmaps
+from attention_core.table_writer import attention_table
+from attention_core.st_models import load_shared_model
 
 # ------------------------------------------------------------
 # Configuração da página
@@ -29,109 +33,22 @@ device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 st.sidebar.text(f"Dispositivo: {device}")
 
 # ------------------------------------------------------------
-# Carrega modelo e tokenizador
+# Gera mapas de calor de atenção: apenas as camadas da página atual, uma
+# figura por camada, cada uma exibida assim que desenhada
 # ------------------------------------------------------------
-def load_model_and_tokenizer(model_name):
-    tokenizer = BertTokenizerFast.from_pretrained(model_name)
-    model = BertModel.from_pretrained(model_name, output_attentions=True)
-    model = model.to(device)
-    return tokenizer, model
+def plot_attn(tokens, stacked):
+    num_layers = len(stacked)
 
-# ------------------------------------------------------------
-# Analisa sentença e atenções
-# ------------------------------------------------------------
-def analyze_attention(sentence, tokenizer, model):
-    inputs = tokenizer(
-        sentence,
-        return_tensors="pt",
-        add_special_tokens=True,
-        return_offsets_mapping=True,
-    )
-    # Envia tensores relevantes ao dispositivo
-    inputs = {k: v.to(device) if k != "offset_mapping" else v for k, v in inputs.items()}
-
-    tokenized_text = tokenizer.convert_ids_to_tokens(inputs["input_ids"][0].cpu())
-    offsets = inputs["offset_mapping"][0].tolist()
-
-    filtered_tokens, filtered_offsets = [], []
-    for token, offset in zip(tokenized_text, offsets):
-        if token.startswith("##"):
-            filtered_tokens[-1] += token.replace("##", "")
-        else:
-            filtered_tokens.append(token)
-            filtered_offsets.append(offset)
-
-    with torch.no_grad():
-        outputs = model(**{k: v for k, v in inputs.items() if k != "offset_mapping"})
-        attentions = outputs.attentions  # tensores no dispositivo
-
-    return filtered_tokens, filtered_offsets, attentions
+    range_col, size_col, page_col = st.columns(3)
+    first, last = range_col.slider("Camadas:", 1, num_layers, (1, num_layers))
+    page_size = size_col.number_input("Camadas por página:", 1, num_layers, min(2, num_layers))
+    layers = list(range(first - 1, last))
+    pages = [layers[i:i + page_size] for i in range(0, len(layers), page_size)]
+    page = page_col.number_input("Página:", 1, len(pages), 1) if len(pages) > 1 else 1
+    st.caption(f"Página {page} de {len(pages)} — camadas {pages[page - 1][0] + 1} a {pages[page - 1][-1] + 1}.")
 
-# ------------------------------------------------------------
-# Gera mapas de calor de atenção
-# ------------------------------------------------------------
-def plot_attn(tokens, attns):
-    num_layers = len(attns)
-    num_heads = attns[0].size(1)
-    total_plots = num_layers * num_heads
-    cols = 3
-    rows = math.ceil(total_plots / cols)
-
-    fig, axes = plt.subplots(rows, cols, figsize=(cols * 4, rows * 4))
-    axes = axes.flatten()
-
-    data = []
-    for layer in range(num_layers):
-        for head in range(num_heads):
-            idx = layer * num_heads + head
-            ax = axes[idx]
-
-            attn = attns[layer][0, head].detach().cpu().numpy()  # move para CPU antes de numpy
-            n_tokens = len(tokens)
-            filtered_attn = attn[:n_tokens, :n_tokens]
-
-            sns.heatmap(
-                filtered_attn,
-                xticklabels=tokens,
-                yticklabels=tokens,
-                cmap="YlGnBu",
-                cbar=False,
-                annot=False,
-                ax=ax,
-            )
-            ax.set_title(f"Layer {layer + 1} | Head {head + 1}", fontsize=8)
-            ax.tick_params(axis="x", rotation=45, labelsize=6)
-            ax.tick_params(axis="y", rotation=0, labelsize=6)
-
-            for i, token in enumerate(tokens):
-                for j, attended_token in enumerate(tokens):
-                    data.append(
-                        [
-                            token,
-                            layer + 1,
-                            head + 1,
-                            attended_token,
-                            round(filtered_attn[i][j], 4),
-                        ]
-                    )
-
-    for idx in range(total_plots, len(axes)):
-        fig.delaxes(axes[idx])
-
-    plt.tight_layout()
-    st.pyplot(fig)
-
-    df = pd.DataFrame(
-        data,
-        columns=[
-            "Token",
-            "Layer",
-            "Head",
-            "Attended Token",
-            "Attention Value",
-        ],
-    )
-    return df
+    for layer in pages[page - 1]:
+        st.pyplot(layer_heatmaps(tokens, stacked[layer], layer))
 
 # ------------------------------------------------------------
 # Interface Streamlit
@@ -166,7 +83,10 @@ if uploaded_file:
         selected_model = st.sidebar.selectbox(
             "Escolha o modelo:", list(model_options.keys())
         )
-        tokenizer, model = load_model_and_tokenizer(model_options[selected_model])
+        tokenizer, model = load_shared_model(model_options[selected_model], device=device)
+        aggregation = st.sidebar.selectbox(
+            "Agregação de subpalavras:", SUBWORD_AGGREGATIONS
+        )
 
         sentence_options = df["sentence"].unique().tolist()
         selected_sentence = st.selectbox("Escolha a sentença:", sentence_options)
@@ -186,16 +106,30 @@ if uploaded_file:
         st.subheader("Tokens Governante–Dependente para a Seleção")
         st.dataframe(tokens_df.reset_index(drop=True))
 
+        # A análise fica na sessão: trocar de página ou de faixa de camadas
+        # redesenha os mapas sem executar o modelo de novo.
+        analysis_key = (model_options[selected_model], aggregation, selected_sentence)
         if st.button("Analisar Atenção da Sentença"):
             tokens, offsets, attentions = analyze_attention(
-                selected_sentence, tokenizer, model
+                selected_sentence, tokenizer, model, aggregation
             )
-
+            # Todas as camadas e cabeças em um único array (movido para a CPU uma vez)
+            stacked = stack_attentions(attentions, len(tokens))
+            st.session_state["sentence_attention"] = {
+                "key": analysis_key,
+                "tokens": tokens,
+                "stacked": stacked,
+                # Tabela longa construída de forma vetorizada a partir do mesmo array
+                "table": attention_table(tokens, stacked, layer_head=False),
+            }
+
+        analysis = st.session_state.get("sentence_attention")
+        if analysis is not None and analysis["key"] == analysis_key:
             st.subheader("Mapas de Calor de Atenção")
-            attention_df = plot_attn(tokens, attentions)
+            plot_attn(analysis["tokens"], analysis["stacked"])
 
             st.subheader("Tabela Completa de Valores de Atenção")
-            st.dataframe(attention_df)
+            st.dataframe(analysis["table"])
     else:
         st.error(
             "O CSV deve conter as colunas 'sentence', 'rule', 'token_origem', 'token_destino' e 'tokens_to_check'."
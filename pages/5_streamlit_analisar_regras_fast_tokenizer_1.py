@@ -1,7 +1,15 @@
+import os
+
 import streamlit as st
 import pandas as pd
-from transformers import BertTokenizerFast, BertModel
-import torch
+
+from attention_core.attention import SUBWORD_AGGREGATIONS, analyze_attention, create_attention_df, group_rules_by_sentence
+from attention_core.st_jobs import get_job_manager, job_panel
+from attention_core.st_models import load_shared_model
+
+PREVIEW_ROWS = 1000
+FULL_MODE = "Tabela completa (n × n)"
+PAIR_MODE = "Apenas pares governante–dependente"
 
 st.set_page_config(
     page_title="Análise de Sentenças e Padrões",
@@ -10,48 +18,6 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-def load_model_and_tokenizer(model_name):
-    tokenizer = BertTokenizerFast.from_pretrained(model_name)
-    model = BertModel.from_pretrained(model_name, output_attentions=True)
-    return tokenizer, model
-
-def analyze_attention(sentence, tokenizer, model):
-    inputs = tokenizer(sentence, return_tensors='pt', add_special_tokens=True, return_offsets_mapping=True)
-    tokenized_text = tokenizer.convert_ids_to_tokens(inputs['input_ids'][0])
-    offsets = inputs['offset_mapping'][0].tolist()
-
-    filtered_tokens = []
-    filtered_offsets = []
-
-    for token, offset in zip(tokenized_text, offsets):
-        if token.startswith("##"):  
-            filtered_tokens[-1] += token.replace("##", "")
-        else:
-            filtered_tokens.append(token)
-            filtered_offsets.append(offset)
-
-    with torch.no_grad():
-        outputs = model(**{k: v for k, v in inputs.items() if k != 'offset_mapping'})
-        attentions = outputs.attentions
-
-    return filtered_tokens, filtered_offsets, attentions
-
-def create_attention_df(tokens, offsets, attentions):
-    data = []
-    num_layers = len(attentions)
-    num_heads = attentions[0].size(1)
-
-    for layer in range(num_layers):
-        for head in range(num_heads):
-            attn = attentions[layer][0, head].detach().numpy()
-            for i, token in enumerate(tokens):
-                for j, attended_token in enumerate(tokens):
-                    data.append([token, layer + 1, head + 1, attended_token, round(attn[i][j], 4)])
-
-    df = pd.DataFrame(data, columns=['Token', 'Layer', 'Head', 'Attended Token', 'Attention Value'])
-    df["Layer_Head"] = df["Layer"].astype(str) + "_" + df["Head"].astype(str)
-    return df
-
 st.title('Análise de Atenção — Padrões das Sentenças')
 
 uploaded_file = st.file_uploader("Carregue um arquivo CSV com 'sentence', 'rule', 'tokens_to_check':", type="csv")
@@ -72,7 +38,12 @@ if uploaded_file is not None:
 
         selected_model = st.selectbox('Escolha o modelo:', list(model_options.keys()))
         model_name = model_options[selected_model]
-        tokenizer, model = load_model_and_tokenizer(model_name)
+        tokenizer, model = load_shared_model(model_name)
+        aggregation = st.selectbox(
+            "Agregação de subpalavras:",
+            SUBWORD_AGGREGATIONS,
+            help="Como as linhas das subpalavras de uma palavra são combinadas; a atenção recebida por uma palavra é sempre a soma das suas subpalavras.",
+        )
 
         sentence_options = df["sentence"].unique().tolist()
         selected_sentence = st.selectbox("Escolha a sentença:", sentence_options)
@@ -89,7 +60,7 @@ if uploaded_file is not None:
         st.write(tokens_to_check)
 
         if st.button("Analisar Sentença Selecionada"):
-            tokens, offsets, attentions = analyze_attention(selected_sentence, tokenizer, model)
+            tokens, offsets, attentions = analyze_attention(selected_sentence, tokenizer, model, aggregation)
             attention_df = create_attention_df(tokens, offsets, attentions)
             attention_df["sentence"] = selected_sentence
             attention_df["rule"] = selected_pattern
@@ -104,31 +75,173 @@ if uploaded_file is not None:
             step=1
         )
 
-        if st.button("Analisar Todas as Sentenças Selecionadas"):
-            results = []
+        batch_size = st.number_input(
+            "Sentenças por lote de inferência:",
+            min_value=1,
+            max_value=128,
+            value=16,
+            step=1,
+            help="Sentenças de comprimento semelhante são processadas juntas em uma única passagem do modelo.",
+        )
+
+        extraction_mode = st.radio(
+            "Modo de extração:",
+            [FULL_MODE, PAIR_MODE],
+            help="Pares: apenas a atenção de token_origem para token_destino em todas as camadas e cabeças, "
+                 "no formato de exemplo_analise_atencao.csv.",
+        )
 
+        checkpoint_every = st.number_input(
+            "Sentenças por checkpoint:",
+            min_value=1,
+            max_value=100000,
+            value=64,
+            step=1,
+            help="A cada bloco concluído, os resultados são gravados em disco; um trabalho interrompido é retomado a partir do último bloco.",
+        )
+
+        compress = st.checkbox(
+            "Comprimir CSV (gzip)",
+            value=False,
+            help="A tabela completa é gravada como .csv.gz à medida que os blocos são concluídos.",
+        )
+
+        if st.button("Analisar Todas as Sentenças Selecionadas"):
             selected_sentences = df["sentence"].drop_duplicates().head(num_sentences).tolist()
             subset_df = df[df["sentence"].isin(selected_sentences)]
-
-            for _, row in subset_df.iterrows():
-                sentence = row["sentence"]
-                rule = row["rule"]
-                tokens, offsets, attentions = analyze_attention(sentence, tokenizer, model)
-                attention_df = create_attention_df(tokens, offsets, attentions)
-                attention_df["sentence"] = sentence
-                attention_df["rule"] = rule
-                results.append(attention_df)
-
-            results_df = pd.concat(results, ignore_index=True)
-            st.success(f"Análise concluída! Foram processados {len(selected_sentences)} sentenças e {len(results_df['sentence'].unique())} sentenças distintas no total.")
-            st.dataframe(results_df)
-
-            csv = results_df.to_csv(index=False)
-            st.download_button(
-                label="Baixar Resultados da Análise",
-                data=csv,
-                file_name=f"analise_sentencas_todos_padroes.csv",
-                mime="text/csv",
+            if extraction_mode == PAIR_MODE:
+                if not {"token_origem", "token_destino"}.issubset(subset_df.columns):
+                    st.error("O modo de pares requer as colunas 'token_origem' e 'token_destino'.")
+                    st.stop()
+
+                # Pares (regra, origem, destino) por sentença distinta; uma
+                # passagem pelo modelo por sentença, apenas as células dos
+                # pares são extraídas.
+                pairs_by_sentence = {}
+                for sentence, rule, origem, destino in zip(
+                    subset_df["sentence"], subset_df["rule"], subset_df["token_origem"], subset_df["token_destino"]
+                ):
+                    pairs_by_sentence.setdefault(sentence, {})[(rule, str(origem), str(destino))] = None
+                unique_sentences = list(pairs_by_sentence)
+                items = [list(pairs_by_sentence[sentence]) for sentence in unique_sentences]
+            else:
+                # Uma passagem pelo modelo por sentença distinta; a tabela de
+                # atenção é replicada para cada regra da sentença.
+                rules_by_sentence = group_rules_by_sentence(zip(subset_df["sentence"], subset_df["rule"]))
+                unique_sentences = list(rules_by_sentence)
+                items = [rules_by_sentence[sentence] for sentence in unique_sentences]
+
+            job = get_job_manager().submit(
+                {
+                    "model": model_name,
+                    **st.session_state["model_variant"],
+                    "aggregation": aggregation,
+                    "mode": "pairs" if extraction_mode == PAIR_MODE else "full",
+                    "batch_size": int(batch_size),
+                    "checkpoint_every": int(checkpoint_every),
+                    "export_format": "csv.gz" if compress else "csv",
+                    "sentences": unique_sentences,
+                    "items": items,
+                },
+                tokenizer,
+                model,
             )
+            st.session_state["extraction_job"] = job.id
 else:
     st.info("Por favor, carregue um arquivo CSV para começar.")
+
+
+# Conteúdo de um arquivo de resultados, lido apenas quando o download é
+# solicitado.
+def file_contents(path):
+    def read():
+        with open(path, "rb") as f:
+            return f.read()
+    return read
+
+
+# Download da tabela completa gravada pelo trabalho.
+def table_download(label, path):
+    st.download_button(
+        label=label,
+        data=file_contents(path),
+        file_name=os.path.basename(path),
+        mime="application/gzip" if path.endswith(".gz") else "text/csv",
+        help=f"{os.path.getsize(path) / 1024 ** 2:.1f} MB",
+    )
+
+
+# A extração em lote roda em segundo plano: o painel continua disponível
+# após reruns ou uma nova conexão do navegador, mesmo sem arquivo carregado.
+st.subheader("Extração em Segundo Plano")
+job = job_panel(get_job_manager(), st.session_state.get("extraction_job"))
+if job is None:
+    st.caption("Nenhum trabalho de extração enviado.")
+elif job.finished:
+    state = job.state
+    # A tabela é gravada em disco pelo trabalho, bloco a bloco; a página
+    # mostra apenas as primeiras linhas e o download é servido a partir do
+    # arquivo.
+    table_path = job.export_path
+    preview_df = job.preview(PREVIEW_ROWS)
+    preview_caption = f"Primeiras {len(preview_df)} de {state['export_rows']} linhas."
+
+    if state["mode"] == "pairs":
+        n_requested = sum(map(len, state["items"]))
+        st.metric(
+            "Pares extraídos",
+            f"{state.get('pairs_found', 0)}/{n_requested}",
+            help="Pares cujas formas não foram encontradas no texto da sentença são omitidos.",
+        )
+        st.success(f"Análise concluída! {job.total} sentenças, {state['rows']} linhas.")
+        st.caption(preview_caption)
+        st.dataframe(preview_df)
+        table_download("Baixar Atenções dos Pares", table_path)
+    else:
+        n_rows = sum(map(len, state["items"]))
+        step = state["checkpoint_every"]
+        passes = sum(
+            -(-min(step, job.total - start) // state["batch_size"]) for start in range(0, job.total, step)
+        )
+        saved_col, batches_col = st.columns(2)
+        saved_col.metric(
+            "Codificações evitadas",
+            n_rows - job.total,
+            help=f"{n_rows} linhas (sentença, regra) para {job.total} sentenças distintas.",
+        )
+        batches_col.metric(
+            "Passagens do modelo",
+            passes,
+            help="Lotes de sentenças processados pelo modelo.",
+        )
+
+        st.success(f"Análise concluída! Foram processadas {job.total} sentenças distintas e {n_rows} linhas (sentença, regra).")
+        st.caption(preview_caption)
+        st.dataframe(preview_df)
+
+        table_download("Baixar Resultados da Análise", table_path)
+
+        # Mesmo resultado em formato compacto (float16, uma cópia por
+        # sentença), lido pelas páginas de treemap e heatmap.
+        store_path = os.path.join(job.directory, "analise_sentencas_todos_padroes.npz")
+        if not os.path.isfile(store_path):
+            job.write_store(store_path)
+        st.download_button(
+            label="Baixar Resultados Compactos (.npz)",
+            data=file_contents(store_path),
+            file_name="analise_sentencas_todos_padroes.npz",
+            mime="application/octet-stream",
+            help=f"{os.path.getsize(store_path) / 1024 ** 2:.1f} MB.",
+        )
+
+        # Cubo de médias/variâncias por regra e sentença × camada × cabeça,
+        # acumulado durante a extração; lido diretamente pela página de heatmap.
+        stats_file = os.path.join(job.directory, "analise_sentencas_todos_padroes.stats.npz")
+        if not os.path.isfile(stats_file):
+            job.stats().save(stats_file)
+        st.download_button(
+            label="Baixar Estatísticas (.stats.npz)",
+            data=file_contents(stats_file),
+            file_name="analise_sentencas_todos_padroes.stats.npz",
+            mime="application/octet-stream",
+        )
@@ -2,6 +2,13 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 
+from attention_core.st_store import (
+    data_source,
+    select_layers,
+    select_sentence_rule,
+    store_csv_download,
+)
+
 # Configuração da página
 st.set_page_config(
     page_title="Treemap Interativo",
@@ -13,13 +20,23 @@ st.set_page_config(
 # Título da página
 st.title("Treemap Interativo")
 
-# Carregar o arquivo CSV
-uploaded_file = st.file_uploader("Carregue o arquivo CSV para gerar o Treemap:", type="csv")
+# Carregar o arquivo CSV ou o armazenamento compacto (.npz) da página 5
+uploaded_file, store = data_source("Carregue o arquivo CSV (ou .npz) para gerar o Treemap:")
 
-if uploaded_file:
+if uploaded_file or store is not None:
     # Ler o arquivo CSV
     try:
-        df = pd.read_csv(uploaded_file)
+        if store is not None:
+            # Apenas a sentença/regra e as camadas escolhidas são lidas
+            st.sidebar.header("Seleção")
+            sentence_index, rule = select_sentence_rule(store)
+            layers = select_layers(store)
+            store_csv_download(store)
+            df = store.sentence_df(sentence_index, layers=layers).assign(
+                sentence=store.sentences[sentence_index], rule=rule
+            )
+        else:
+            df = pd.read_csv(uploaded_file)
         st.write("Dados carregados com sucesso!")
         st.dataframe(df)
 
@@ -63,4 +80,4 @@ if uploaded_file:
     except Exception as e:
         st.error(f"Erro ao processar o arquivo: {e}")
 else:
-    st.info("Por favor, carregue um arquivo CSV para começar.")
+    st.info("Por favor, carregue um arquivo CSV ou .npz para começar.")
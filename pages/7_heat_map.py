@@ -4,6 +4,15 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 
+from attention_core.st_store import data_source, select_layers, store_csv_download
+
+STATISTIC_LABELS = {
+    "mean": "Média",
+    "std": "Desvio padrão",
+    "max": "Máximo",
+    "count": "Número de valores",
+}
+
 # Configuração da página
 st.set_page_config(
     page_title="Heatmap de Atenção",
@@ -15,65 +24,97 @@ st.set_page_config(
 # Título da página
 st.title("Heatmap de Média de Atenção por Camada-Cabeça")
 
-# Carregar o arquivo CSV
-uploaded_file = st.file_uploader("Carregue o arquivo CSV para gerar o Heatmap:", type="csv")
+# Carregar o arquivo CSV, o armazenamento compacto (.npz) da página 5 ou o
+# cubo de estatísticas (.stats.npz) gravado junto com a extração
+uploaded_file, store, stats = data_source(
+    "Carregue o arquivo CSV (ou .npz / .stats.npz) para gerar o Heatmap:", with_stats=True
+)
 
-if uploaded_file:
+if uploaded_file or store is not None or stats is not None:
     try:
-        # Ler o arquivo CSV
-        df = pd.read_csv(uploaded_file)
-        st.write("📂 **Arquivo carregado com sucesso!**")
-        st.dataframe(df.head())
-
-        # Verificar se as colunas obrigatórias existem
-        required_columns = {"Layer_Head", "Attention Value", "Layer", "Head", "sentence", "rule"}
-        if not required_columns.issubset(df.columns):
-            st.error(f"❌ O arquivo não contém todas as colunas necessárias: {required_columns}")
-            st.stop()
-
-        # Sidebar: Configuração do Heatmap
-        st.sidebar.header("Configurações do Heatmap")
-
-        # Filtro por Regra ou Sentença
-        filter_option = st.sidebar.radio("Filtrar por:", ["Regra", "Sentença"])
-
-        if filter_option == "Regra":
-            selected_rule = st.sidebar.selectbox("Escolha uma regra:", df["rule"].dropna().unique())
-            filtered_df = df[df["rule"] == selected_rule]
+        if stats is not None:
+            st.write("📂 **Arquivo carregado com sucesso!**")
+            st.write(f"{len(stats)} sentenças, {len(stats.rules)} regras, {stats.num_layers} camadas × {stats.num_heads} cabeças.")
+            if store is not None:
+                store_csv_download(store)
+
+            st.sidebar.header("Configurações do Heatmap")
+            filter_option = st.sidebar.radio("Filtrar por:", ["Regra", "Sentença"])
+
+            if filter_option == "Regra":
+                selection = {"rule": st.sidebar.selectbox("Escolha uma regra:", stats.rules)}
+            else:
+                selection = {"sentence": st.sidebar.selectbox("Escolha uma sentença:", stats.sentences)}
+            statistic = st.sidebar.selectbox(
+                "Estatística:", list(STATISTIC_LABELS), format_func=STATISTIC_LABELS.__getitem__
+            )
+
+            # Estatística por camada e cabeça lida do cubo pré-calculado
+            # (contagem, soma, soma dos quadrados e máximo), com o mesmo
+            # critério da tabela (valores nulos são ignorados)
+            selected_layers = select_layers(stats)
+            heatmap_data = pd.DataFrame(
+                stats.statistic(statistic, layers=selected_layers, **selection),
+                index=pd.RangeIndex(selected_layers[0], selected_layers[1] + 1, name="Layer"),
+                columns=pd.RangeIndex(1, stats.num_heads + 1, name="Head"),
+            )
+            statistic_label = STATISTIC_LABELS[statistic]
         else:
-            selected_sentence = st.sidebar.selectbox("Escolha uma sentença:", df["sentence"].dropna().unique())
-            filtered_df = df[df["sentence"] == selected_sentence]
-
-        # Remover valores Attention Value = 0 para evitar distorções
-        filtered_df = filtered_df[filtered_df["Attention Value"] > 0]
-
-        # Criar colunas separadas para Layer e Head
-        filtered_df["Layer"] = filtered_df["Layer_Head"].apply(lambda x: int(x.split("_")[0]))
-        filtered_df["Head"] = filtered_df["Layer_Head"].apply(lambda x: int(x.split("_")[1]))
-
-        # Calcular média da atenção por camada e cabeça
-        heatmap_data = (
-            filtered_df.groupby(["Layer", "Head"])["Attention Value"]
-            .mean()
-            .reset_index()
-            .pivot(index="Layer", columns="Head", values="Attention Value")
-        )
-
-        # Sidebar: Escolher intervalo de camadas para exibir
-        min_layer = int(heatmap_data.index.min())
-        max_layer = int(heatmap_data.index.max())
-
-        selected_layers = st.sidebar.slider(
-            "Selecionar intervalo de camadas:",
-            min_value=min_layer,
-            max_value=max_layer,
-            value=(min_layer, max_layer)
-        )
-
-        heatmap_data = heatmap_data.loc[selected_layers[0]:selected_layers[1]]
+            # Ler o arquivo CSV
+            df = pd.read_csv(uploaded_file)
+            st.write("📂 **Arquivo carregado com sucesso!**")
+            st.dataframe(df.head())
+
+            # Verificar se as colunas obrigatórias existem
+            required_columns = {"Layer_Head", "Attention Value", "Layer", "Head", "sentence", "rule"}
+            if not required_columns.issubset(df.columns):
+                st.error(f"❌ O arquivo não contém todas as colunas necessárias: {required_columns}")
+                st.stop()
+
+            # Sidebar: Configuração do Heatmap
+            st.sidebar.header("Configurações do Heatmap")
+
+            # Filtro por Regra ou Sentença
+            filter_option = st.sidebar.radio("Filtrar por:", ["Regra", "Sentença"])
+
+            if filter_option == "Regra":
+                selected_rule = st.sidebar.selectbox("Escolha uma regra:", df["rule"].dropna().unique())
+                filtered_df = df[df["rule"] == selected_rule]
+            else:
+                selected_sentence = st.sidebar.selectbox("Escolha uma sentença:", df["sentence"].dropna().unique())
+                filtered_df = df[df["sentence"] == selected_sentence]
+
+            # Remover valores Attention Value = 0 para evitar distorções
+            filtered_df = filtered_df[filtered_df["Attention Value"] > 0]
+
+            # Criar colunas separadas para Layer e Head
+            filtered_df["Layer"] = filtered_df["Layer_Head"].apply(lambda x: int(x.split("_")[0]))
+            filtered_df["Head"] = filtered_df["Layer_Head"].apply(lambda x: int(x.split("_")[1]))
+
+            # Calcular média da atenção por camada e cabeça
+            heatmap_data = (
+                filtered_df.groupby(["Layer", "Head"])["Attention Value"]
+                .mean()
+                .reset_index()
+                .pivot(index="Layer", columns="Head", values="Attention Value")
+            )
+
+            # Sidebar: Escolher intervalo de camadas para exibir
+            min_layer = int(heatmap_data.index.min())
+            max_layer = int(heatmap_data.index.max())
+
+            selected_layers = st.sidebar.slider(
+                "Selecionar intervalo de camadas:",
+                min_value=min_layer,
+                max_value=max_layer,
+                value=(min_layer, max_layer)
+            )
+
+            heatmap_data = heatmap_data.loc[selected_layers[0]:selected_layers[1]]
+            statistic_label = STATISTIC_LABELS["mean"]
 
         # **Plotando Heatmap usando Plotly**
-        st.subheader("Mapa de Calor das Médias de Atenção por Camada-Cabeça")
+        st.subheader(f"Mapa de Calor ({statistic_label}) de Atenção por Camada-Cabeça")
 
         fig = go.Figure(data=go.Heatmap(
             z=heatmap_data.values,
@@ -84,7 +125,7 @@ if uploaded_file:
         ))
 
         fig.update_layout(
-            title="Heatmap de Média de Atenção por Camada-Cabeça",
+            title=f"Heatmap ({statistic_label}) de Atenção por Camada-Cabeça",
             xaxis_title="Cabeça de Atenção",
             yaxis_title="Camada",
             width=800,
@@ -97,4 +138,4 @@ if uploaded_file:
         st.error(f"❌ Erro ao processar o arquivo: {e}")
 
 else:
-    st.info("📥 **Por favor, carregue um arquivo CSV para começar.**")
+    st.info("📥 **Por favor, carregue um arquivo CSV, .npz ou .stats.npz para começar.**")
@@ -0,0 +1,195 @@
+# ============================================================
+# Testes da passagem limitada às primeiras camadas e do agrupamento de
+# subpalavras em palavras
+# ============================================================
+
+import pytest
+import torch
+from transformers import BertConfig, BertModel, BertTokenizerFast, DistilBertConfig, DistilBertModel
+
+from attention_core.attention import (
+    analyze_attention_batch,
+    analyze_pairs_batch,
+    forward_attentions,
+    membership_matrix,
+    merge_subwords,
+    pool_attentions,
+    supports_truncation,
+    word_index,
+)
+
+VOCAB = [
+    "[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "o", "gato", "come",
+    "peixe", "bras", "##íl", "##ia", "é", ",", ".", "##s",
+]
+
+
+# Modelo BERT mínimo, sem download, recém-criado (ganchos de captura das
+# atenções ainda não instalados).
+def tiny_model():
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=16,
+        hidden_size=32,
+        num_hidden_layers=4,
+        num_attention_heads=4,
+        intermediate_size=64,
+        output_attentions=True,
+        attn_implementation="eager",
+    )
+    return BertModel(config, add_pooling_layer=False).eval()
+
+
+def tiny_inputs():
+    input_ids = torch.tensor([[2, 5, 6, 7, 8, 3], [2, 5, 6, 3, 0, 0]])
+    return {
+        "input_ids": input_ids,
+        "attention_mask": (input_ids != 0).long(),
+        "token_type_ids": torch.zeros_like(input_ids),
+    }
+
+
+# A passagem limitada antes da primeira passagem completa não pode alterar
+# as atenções das passagens completas seguintes (cada camada com os seus
+# próprios valores, sem repetições).
+@torch.no_grad()
+def test_truncated_then_full_keeps_layers():
+    reference = tiny_model()(**tiny_inputs()).attentions
+
+    model = tiny_model()
+    truncated = forward_attentions(model, tiny_inputs(), max_layer=2)
+    full = forward_attentions(model, tiny_inputs())
+    limited = forward_attentions(model, tiny_inputs(), max_layer=2)
+
+    assert len(truncated) == 2 and len(full) == 4 and len(limited) == 2
+    for expected, actual in zip(reference, full):
+        torch.testing.assert_close(actual, expected)
+    for attentions in (truncated, limited):
+        for expected, actual in zip(reference, attentions):
+            torch.testing.assert_close(actual, expected)
+
+
+@torch.no_grad()
+def test_truncated_selects_heads():
+    model = tiny_model()
+    reference = model(**tiny_inputs()).attentions
+    attentions = forward_attentions(model, tiny_inputs(), max_layer=3, heads=[1, 3])
+
+    assert len(attentions) == 3
+    for expected, actual in zip(reference, attentions):
+        torch.testing.assert_close(actual, expected[:, [1, 3]])
+
+
+# Modelos fora do formato BERT/RoBERTa (sem `encoder.layer`) executam a
+# passagem completa e descartam as camadas excedentes.
+@torch.no_grad()
+def test_other_architectures_fall_back_to_full_pass():
+    torch.manual_seed(0)
+    config = DistilBertConfig(
+        vocab_size=16, dim=32, n_layers=3, n_heads=4, hidden_dim=64,
+        output_attentions=True, attn_implementation="eager",
+    )
+    model = DistilBertModel(config).eval()
+    inputs = {key: value for key, value in tiny_inputs().items() if key != "token_type_ids"}
+    reference = model(**inputs).attentions
+
+    assert not supports_truncation(model)
+    attentions = forward_attentions(model, inputs, max_layer=2)
+    assert len(attentions) == 2
+    for expected, actual in zip(reference, attentions):
+        torch.testing.assert_close(actual, expected)
+
+
+# Tokenizer rápido sobre o vocabulário mínimo (ids compatíveis com
+# `tiny_model`).
+def tiny_tokenizer(tmp_path):
+    vocab = tmp_path / "vocab.txt"
+    vocab.write_text("\n".join(VOCAB), encoding="utf-8")
+    return BertTokenizerFast(str(vocab), do_lower_case=False)
+
+
+# Agrupamento de referência, peça a peça: a atenção da palavra i para a
+# palavra j soma as colunas das peças de j e combina (média ou soma) as
+# linhas das peças de i.
+def pool_by_loop(attention, index, aggregation):
+    n_words = index[-1] + 1
+    pooled = torch.zeros(attention.shape[:-2] + (n_words, n_words), dtype=attention.dtype)
+    for i in range(n_words):
+        rows = [p for p, w in enumerate(index) if w == i]
+        for j in range(n_words):
+            cols = [p for p, w in enumerate(index) if w == j]
+            total = sum(attention[..., r, c] for r in rows for c in cols)
+            pooled[..., i, j] = total / len(rows) if aggregation == "mean" else total
+    return pooled
+
+
+# Sem `word_ids` (tokenizers lentos), as palavras seguem a marcação "##".
+def test_word_index_without_word_ids():
+    tokens = ["[CLS]", "bras", "##íl", "##ia", "é", "[SEP]"]
+    assert word_index(tokens) == [0, 1, 1, 1, 2, 3]
+    assert word_index(tokens, [None, 0, 0, 0, 1, None]) == [0, 1, 1, 1, 2, 3]
+
+    labels, offsets = merge_subwords(tokens, [(0, 0), (0, 4), (4, 6), (6, 8), (9, 10), (0, 0)])
+    assert labels == ["[CLS]", "brasília", "é", "[SEP]"]
+    assert offsets == [[0, 0], [0, 8], [9, 10], [0, 0]]
+
+
+def test_membership_matrix_zeroes_padding():
+    membership = membership_matrix([[0, 1, 1, 2], [0, 1, 2]], n_subwords=5)
+    expected = torch.tensor([
+        [[1, 0, 0, 0, 0], [0, 1, 1, 0, 0], [0, 0, 0, 1, 0]],
+        [[1, 0, 0, 0, 0], [0, 1, 0, 0, 0], [0, 0, 1, 0, 0]],
+    ], dtype=torch.float32)
+    torch.testing.assert_close(membership, expected)
+
+
+# Valores calculados à mão: a palavra 1 tem as peças 1 e 2.
+@pytest.mark.parametrize("aggregation, expected", [
+    ("sum", [[0.5, 0.5], [0.3, 1.7]]),
+    ("mean", [[0.5, 0.5], [0.15, 0.85]]),
+])
+def test_pool_attentions_hand_values(aggregation, expected):
+    attention = torch.tensor([[[[0.5, 0.3, 0.2], [0.1, 0.6, 0.3], [0.2, 0.2, 0.6]]]])
+    (pooled,) = pool_attentions((attention,), membership_matrix([[0, 1, 1]]), aggregation)
+    torch.testing.assert_close(pooled, torch.tensor([[expected]]))
+
+
+# Lote com padding: cada sentença agrupada de uma vez coincide com o laço
+# peça a peça sobre o seu trecho sem padding.
+@pytest.mark.parametrize("aggregation", ["mean", "sum"])
+def test_pool_attentions_matches_subword_loop(aggregation):
+    torch.manual_seed(0)
+    indices = [[0, 1, 1, 1, 2, 3], [0, 1, 2, 2]]
+    attentions = tuple(torch.softmax(torch.randn(2, 3, 6, 6), dim=-1) for _ in range(2))
+    pooled = pool_attentions(attentions, membership_matrix(indices, 6), aggregation)
+
+    for b, index in enumerate(indices):
+        n, n_words = len(index), index[-1] + 1
+        for layer, layer_pooled in zip(attentions, pooled):
+            expected = pool_by_loop(layer[b, :, :n, :n], index, aggregation)
+            torch.testing.assert_close(layer_pooled[b, :, :n_words, :n_words], expected)
+            assert not layer_pooled[b, :, n_words:].any() and not layer_pooled[b, :, :, n_words:].any()
+
+
+# Os pares extraídos sem as matrizes n x n têm os mesmos valores das
+# matrizes por palavra de `analyze_attention_batch`.
+@torch.no_grad()
+@pytest.mark.parametrize("aggregation", ["mean", "sum"])
+def test_pairs_match_pooled_tables(tmp_path, aggregation):
+    tokenizer, model = tiny_tokenizer(tmp_path), tiny_model()
+    sentences = ["o gato come peixe .", "brasília é o gato ."]
+    pairs = [
+        [("R1", "gato", "come"), ("R2", "peixe", "come")],
+        [("R3", "brasília", "gato"), ("R4", "gato", "brasília"), ("R5", "ausente", "gato")],
+    ]
+    full = analyze_attention_batch(sentences, tokenizer, model, batch_size=2, aggregation=aggregation)
+    extracted = analyze_pairs_batch(sentences, pairs, tokenizer, model, batch_size=2, aggregation=aggregation)
+
+    assert full[1][0] == ["[CLS]", "brasília", "é", "o", "gato", ".", "[SEP]"]
+    for (tokens, _, attentions), (resolved, values) in zip(full, extracted):
+        assert values.shape == (4, 4, len(resolved))
+        for p, (_, origin, destination) in enumerate(resolved):
+            o, d = tokens.index(origin), tokens.index(destination)
+            expected = torch.stack([layer[0, :, o, d] for layer in attentions])
+            torch.testing.assert_close(torch.from_numpy(values[:, :, p]), expected)
+    assert [r[0] for r in extracted[1][0]] == ["R3", "R4"]
@@ -0,0 +1,107 @@
+# ============================================================
+# Testes do armazenamento compacto de atenções (.npz)
+# ============================================================
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from attention_core.attention_store import AttentionStore, AttentionStoreWriter, merge_stores
+from attention_core.table_writer import attention_table
+
+# Sentenças, rótulos e regras de cada linha (sentença, regra); "NA" é um
+# token, não um valor ausente.
+SENTENCES = [
+    ("Ela saiu.", ["[CLS]", "Ela", "saiu", ".", "[SEP]"], ["Sujeito", "Pontuação"]),
+    ("NA viu NA.", ["[CLS]", "NA", "viu", "NA", ".", "[SEP]"], ["Sujeito"]),
+]
+
+
+# Atenções (camadas, cabeças, n, n) determinísticas para `n` tokens.
+def values_for(n, seed=0, layers=2, heads=3):
+    rng = np.random.default_rng(seed)
+    return rng.random((layers, heads, n, n)).astype(np.float16)
+
+
+# Uma exceção dentro do `with` descarta o spool sem gravar um `.npz`
+# parcial.
+def test_writer_interrupted_leaves_no_files(tmp_path):
+    path = tmp_path / "analise.npz"
+    with pytest.raises(KeyboardInterrupt):
+        with AttentionStoreWriter(str(path)) as writer:
+            writer.add("Ela saiu.", ["Ela", "saiu", "."], values_for(3), ["Sujeito"])
+            raise KeyboardInterrupt
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_writer_abort(tmp_path):
+    path = tmp_path / "analise.npz"
+    writer = AttentionStoreWriter(str(path))
+    writer.add("Ela saiu.", ["Ela", "saiu", "."], values_for(3), ["Sujeito"])
+    writer.abort()
+    writer.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def write_store(path, sentences=SENTENCES):
+    with AttentionStoreWriter(str(path), "modelo", "mean") as writer:
+        for seed, (sentence, tokens, rules) in enumerate(sentences):
+            writer.add(sentence, tokens, values_for(len(tokens), seed), rules)
+    return writer.rows
+
+
+# Gravação -> abertura mapeada em memória -> tabela longa, comparada com a
+# tabela montada diretamente das atenções de cada sentença.
+def test_round_trip_to_table(tmp_path):
+    assert write_store(tmp_path / "analise.npz") == 3
+    store = AttentionStore.open(str(tmp_path / "analise.npz"))
+
+    assert isinstance(store.attentions, np.memmap)
+    assert (store.model, store.aggregation) == ("modelo", "mean")
+    assert (len(store), store.n_rows, store.num_layers, store.num_heads) == (2, 3, 2, 3)
+    assert list(store.rows()) == [(0, "Sujeito"), (0, "Pontuação"), (1, "Sujeito")]
+    for index, (sentence, tokens, _) in enumerate(SENTENCES):
+        assert store.sentences[index] == sentence
+        assert store.sentence_tokens(index) == tokens
+        np.testing.assert_array_equal(store.sentence_attentions(index), values_for(len(tokens), index))
+        np.testing.assert_array_equal(store.sentence_attentions(index, layers=(2, 2)), values_for(len(tokens), index)[1:])
+
+    assert store.to_table(str(tmp_path / "analise.csv")) == sum(
+        2 * 3 * len(tokens) ** 2 * len(rules) for _, tokens, rules in SENTENCES
+    )
+    table = pd.read_csv(tmp_path / "analise.csv", keep_default_na=False, na_values=[])
+    expected = pd.concat([
+        attention_table(tokens, values_for(len(tokens), index)).assign(sentence=sentence, rule=rule)
+        for index, (sentence, tokens, rules) in enumerate(SENTENCES)
+        for rule in rules
+    ], ignore_index=True)
+    for column in ("Token", "Attended Token", "Layer_Head"):
+        expected[column] = expected[column].astype(str)
+    pd.testing.assert_frame_equal(table, expected, check_dtype=False)
+
+
+# Linhas (sentença, regra) repetidas são preservadas na junção, na ordem
+# dos arquivos.
+def test_merge_keeps_duplicate_rows(tmp_path):
+    write_store(tmp_path / "a.npz", [("Ela saiu.", ["Ela", "saiu", "."], ["Sujeito", "Sujeito", "Pontuação"])])
+    write_store(tmp_path / "b.npz", [("Ele voltou.", ["Ele", "voltou", "."], ["Sujeito"])])
+
+    paths = [str(tmp_path / "a.npz"), str(tmp_path / "b.npz")]
+    assert merge_stores(paths, str(tmp_path / "junto.npz"), "modelo", "mean") == 4
+    merged = AttentionStore.open(str(tmp_path / "junto.npz"))
+    assert list(merged.rows()) == [(0, "Sujeito"), (0, "Sujeito"), (0, "Pontuação"), (1, "Sujeito")]
+    assert merged.row_rules(0) == ["Sujeito", "Sujeito", "Pontuação"]
+    assert merged.rules_of(0) == ["Sujeito", "Pontuação"]
+    np.testing.assert_array_equal(merged.sentence_attentions(1), values_for(3, 0))
+
+
+def test_empty_store(tmp_path):
+    assert write_store(tmp_path / "vazio.npz", []) == 0
+    store = AttentionStore.open(str(tmp_path / "vazio.npz"))
+    assert (len(store), store.n_rows) == (0, 0)
+    assert store.to_table(str(tmp_path / "vazio.csv")) == 0
+
+    write_store(tmp_path / "a.npz", SENTENCES[:1])
+    paths = [str(tmp_path / "vazio.npz"), str(tmp_path / "a.npz")]
+    assert merge_stores(paths, str(tmp_path / "junto.npz")) == 2
+    assert len(AttentionStore.open(str(tmp_path / "junto.npz"))) == 1
@@ -0,0 +1,51 @@
+# ============================================================
+# Testes do índice invertido do corpus
+# ============================================================
+
+import pytest
+
+from attention_core.corpus_cache import ColumnarCorpus
+from attention_core.corpus_index import CorpusIndex
+from attention_core.ud_tree import SentenceTree
+
+
+# Duas sentenças: em "s1" o nsubj é PRON; em "s2" há um nsubj (NOUN) e um
+# PRON que não é nsubj, que não devem ser combinados.
+def tiny_index():
+    trees = [
+        SentenceTree(
+            "s1", "Ela come peixe .", [1, 2, 3, 4], ["Ela", "come", "peixe", "."],
+            ["PRON", "VERB", "NOUN", "PUNCT"], ["nsubj", "root", "obj", "punct"], [2, 0, 2, 2],
+        ),
+        SentenceTree(
+            "s2", "O gato viu-a .", [1, 2, 3, 4, 5], ["O", "gato", "viu", "a", "."],
+            ["DET", "NOUN", "VERB", "PRON", "PUNCT"], ["det", "nsubj", "root", "obj", "punct"], [2, 3, 0, 3, 3],
+        ),
+    ]
+    return CorpusIndex(ColumnarCorpus.from_trees(trees))
+
+
+def test_terms_must_match_the_same_token():
+    index = tiny_index()
+    sentences, tokens = index.query("deprel=nsubj upos=PRON")
+    assert sentences.tolist() == [0]
+    assert tokens.tolist() == [0]
+
+    rows = index.pattern_rows(tokens, "deprel=nsubj upos=PRON")
+    assert [(r["Sentence ID"], r["Origin Token"], r["Destination Token"]) for r in rows] == [("s1", "Ela", "come")]
+
+
+def test_single_and_governor_terms():
+    index = tiny_index()
+    assert index.query("upos=PRON")[1].tolist() == [0, 7]
+    assert index.query("VERB>nsubj")[1].tolist() == [0, 5]
+    assert index.query("VERB>nsubj upos=NOUN")[0].tolist() == [1]
+    assert index.query("deprel=inexistente")[1].tolist() == []
+
+
+def test_invalid_queries():
+    index = tiny_index()
+    with pytest.raises(ValueError):
+        index.query("")
+    with pytest.raises(ValueError):
+        index.query("nsubj")
@@ -0,0 +1,94 @@
+# ============================================================
+# Testes do avaliador de regras de passagem única
+# ============================================================
+#
+# Compara `compile_rules()` com as lambdas originais da página de
+# classificação (ver benchmarks/bench_ud_rules.py) em um pequeno corpus com
+# tokens multipalavra e um advmod ligado à raiz.
+
+import os
+import sys
+
+from conllu import parse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from bench_ud_rules import run_compiled, run_legacy, without_root_pairs  # noqa: E402
+
+CORPUS = """\
+# sent_id = s1
+# text = Ele deu o livro do irmão à Maria ontem.
+1	Ele	ele	PRON	_	_	2	nsubj	_	_
+2	deu	dar	VERB	_	_	0	root	_	_
+3	o	o	DET	_	_	4	det	_	_
+4	livro	livro	NOUN	_	_	2	obj	_	_
+5-6	do	_	_	_	_	_	_	_	_
+5	de	de	ADP	_	_	7	case	_	_
+6	o	o	DET	_	_	7	det	_	_
+7	irmão	irmão	NOUN	_	_	4	nmod	_	_
+8-9	à	_	_	_	_	_	_	_	_
+8	a	a	ADP	_	_	10	case	_	_
+9	a	o	DET	_	_	10	det	_	_
+10	Maria	Maria	PROPN	_	_	2	iobj	_	_
+11	ontem	ontem	ADV	_	_	2	advmod	_	_
+12	.	.	PUNCT	_	_	2	punct	_	_
+
+# sent_id = s2
+# text = A casa foi vendida quando ela se mudou.
+1	A	o	DET	_	_	2	det	_	_
+2	casa	casa	NOUN	_	_	4	nsubj:pass	_	_
+3	foi	ser	AUX	_	_	4	aux:pass	_	_
+4	vendida	vender	VERB	_	_	0	root	_	_
+5	quando	quando	ADV	_	_	8	mark	_	_
+6	ela	ele	PRON	_	_	8	nsubj	_	_
+7	se	se	PRON	_	_	8	expl:pv	_	_
+8	mudou	mudar	VERB	_	_	4	advcl	_	_
+9	.	.	PUNCT	_	_	4	punct	_	_
+
+# sent_id = s3
+# text = Não, obrigado.
+1	Não	não	ADV	_	_	0	advmod	_	_
+2	,	,	PUNCT	_	_	3	punct	_	_
+3	obrigado	obrigado	ADJ	_	_	1	conj	_	_
+4	.	.	PUNCT	_	_	1	punct	_	_
+
+# sent_id = s4
+# text = O tempo parece estar bom no verão.
+1	O	o	DET	_	_	2	det	_	_
+2	tempo	tempo	NOUN	_	_	3	nsubj	_	_
+3	parece	parecer	VERB	_	_	0	root	_	_
+4	estar	estar	VERB	_	_	5	cop	_	_
+5	bom	bom	ADJ	_	_	3	xcomp	_	_
+6-7	no	_	_	_	_	_	_	_	_
+6	em	em	ADP	_	_	8	case	_	_
+7	o	o	DET	_	_	8	det	_	_
+8	verão	verão	NOUN	_	_	3	obl	_	_
+9	.	.	PUNCT	_	_	3	punct	_	_
+
+"""
+
+
+def test_classification_matches_legacy_rules():
+    sentences = parse(CORPUS)
+    legacy, compiled = run_legacy(sentences)[0], run_compiled(sentences)[0]
+
+    assert compiled == legacy
+    # O cop de s4 tem governante ADJ: "Verbo com predicativo do sujeito"
+    # fica de fora da classificação, mas aparece nos padrões.
+    assert {rule for _, rule, _, _ in compiled} == {
+        "Verbo bitransitivo", "Verbo transitivo direto", "Verbo transitivo indireto",
+        "Oração subordinada", "Voz passiva", "Pronome reflexivo", "Adjunto adverbial",
+    }
+    assert ("Ele deu o livro do irmão à Maria ontem.", "Verbo bitransitivo", "deu", "livro, Maria") in compiled
+
+
+# Os padrões coincidem, exceto o par espúrio que as lambdas originais
+# geravam para o advmod ligado à raiz (head 0 -> último token).
+def test_patterns_match_legacy_rules_except_root_pairs():
+    sentences = parse(CORPUS)
+    legacy, compiled = run_legacy(sentences)[1], run_compiled(sentences)[1]
+
+    assert compiled == without_root_pairs(legacy)
+    assert [row for row in legacy if row not in compiled] == [
+        ("s3", "Não, obrigado.", "Adjunto adverbial", 1, "Não", 0, "."),
+    ]